@@ -0,0 +1,190 @@
+"""Statistics over the full history, computed as NumPy array operations.
+
+    python analytics.py --data time_records.json
+
+The records and the work intervals of every session are copied into
+arrays once by HistoryArrays.from_core(); each statistic after that is a
+single vectorized pass. NumPy is optional: nothing else in the tracker
+imports this module, and building the arrays without NumPy installed
+raises ImportError.
+"""
+import argparse
+import sys
+from datetime import date
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DAY = 86400
+EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday, Monday is 0
+
+def local_offsets(local_time, epochs):
+    """UTC offset in seconds at each epoch, from the per-day offsets of a LocalTime"""
+    days, inverse = np.unique(epochs // DAY, return_inverse=True)
+    per_day = np.array([local_time.offset(int(day) * DAY) for day in days], dtype=np.int64)
+    offsets = per_day[inverse]
+
+    # Days with a DST change have no single offset, resolve those one by one
+    changing = np.array([local_time.day_offsets[int(day)] is None for day in days], dtype=bool)
+    for i in np.flatnonzero(changing[inverse]):
+        offsets[i] = local_time.offset(int(epochs[i]))
+    return offsets
+
+class HistoryArrays:
+    """The history held as NumPy arrays, one row per recorded day"""
+
+    def __init__(self, days, worked, breaks, clock_in, clock_out, work_starts, work_ends, local_time):
+        self.days = days  # Day ordinals, ascending
+        self.worked = worked
+        self.breaks = breaks
+        self.clock_in = clock_in
+        self.clock_out = clock_out
+        self.work_starts = work_starts  # Work intervals of all sessions, epoch seconds
+        self.work_ends = work_ends
+        self.local_time = local_time
+
+    @classmethod
+    def from_core(cls, core):
+        if np is None:
+            raise ImportError("analytics needs NumPy, install it with: pip install numpy")
+        records = core.get_records()
+        count = len(records)
+        dates = sorted(records)
+        rows = [records[date_str] for date_str in dates]
+
+        def column(field):
+            return np.fromiter((row[field] for row in rows), dtype=np.int64, count=count)
+
+        work = core.session_index.work
+        return cls(
+            np.fromiter((date.fromisoformat(d).toordinal() for d in dates), dtype=np.int64, count=count),
+            column("total_time"), column("breaks"), column("clock_in"), column("clock_out"),
+            np.array(work.starts, dtype=np.int64), np.array(work.ends, dtype=np.int64),
+            core.local_time)
+
+    def __len__(self):
+        return len(self.days)
+
+    def _worked_days(self):
+        return self.worked > 0
+
+    def average_day(self):
+        """Mean and median worked seconds, and mean clock in to clock out span, over worked days"""
+        mask = self._worked_days()
+        if not mask.any():
+            return {"days": 0, "mean_worked": 0.0, "median_worked": 0.0, "mean_span": 0.0}
+        return {
+            "days": int(mask.sum()),
+            "mean_worked": float(self.worked[mask].mean()),
+            "median_worked": float(np.median(self.worked[mask])),
+            "mean_span": float((self.clock_out[mask] - self.clock_in[mask]).mean())
+        }
+
+    def clock_in_distribution(self, bin_minutes=30):
+        """Number of worked days by local clock-in time, in bins from midnight"""
+        mask = self._worked_days()
+        clock_in = self.clock_in[mask]
+        seconds_of_day = (clock_in + local_offsets(self.local_time, clock_in)) % DAY
+        bin_seconds = bin_minutes * 60
+        return np.bincount(seconds_of_day // bin_seconds, minlength=-(-DAY // bin_seconds))
+
+    def break_ratio(self):
+        """Share of the time at work spent on breaks"""
+        worked = self.worked.sum()
+        breaks = self.breaks.sum()
+        return float(breaks / (worked + breaks)) if worked + breaks else 0.0
+
+    def overtime(self, goal_seconds):
+        """Worked seconds above or below a daily goal, over worked days"""
+        mask = self._worked_days()
+        difference = self.worked[mask] - goal_seconds
+        return {
+            "total": int(difference.sum()),
+            "overtime": int(difference[difference > 0].sum()),
+            "undertime": int(-difference[difference < 0].sum()),
+            "days_over": int((difference > 0).sum()),
+            "days_under": int((difference < 0).sum())
+        }
+
+    def streaks(self, today=None):
+        """Longest run of consecutive worked days, and the run ending today or yesterday"""
+        days = self.days[self._worked_days()]
+        if not len(days):
+            return {"longest": 0, "current": 0}
+        # A run starts wherever the gap to the previous worked day is not one day
+        run_starts = np.flatnonzero(np.diff(days, prepend=days[0] - 2) != 1)
+        run_lengths = np.diff(np.append(run_starts, len(days)))
+        today = (today or date.today()).toordinal()
+        current = int(run_lengths[-1]) if days[-1] >= today - 1 else 0
+        return {"longest": int(run_lengths.max()), "current": current}
+
+    def weekday_hour_heatmap(self):
+        """Worked seconds by local weekday (rows, Monday first) and hour (columns).
+
+        Every work interval is cut at hour boundaries, so sessions spanning
+        several hours, or midnight, are spread over the cells they cover.
+        """
+        heatmap = np.zeros(7 * 24, dtype=np.int64)
+        if not len(self.work_starts):
+            return heatmap.reshape(7, 24)
+        offsets = local_offsets(self.local_time, self.work_starts)
+        starts = self.work_starts + offsets
+        ends = self.work_ends + offsets
+        first_hour = starts // 3600
+        pieces = (ends - 1) // 3600 - first_hour + 1
+
+        # One row per (interval, hour) piece
+        owner = np.repeat(np.arange(len(starts)), pieces)
+        hour = first_hour[owner] + np.arange(len(owner)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        seconds = np.minimum(ends[owner], (hour + 1) * 3600) - np.maximum(starts[owner], hour * 3600)
+        cells = (hour + EPOCH_WEEKDAY * 24) % (7 * 24)
+        heatmap += np.bincount(cells, weights=seconds, minlength=7 * 24).astype(np.int64)
+        return heatmap.reshape(7, 24)
+
+    def summary(self, goal_seconds):
+        """All scalar statistics in one dict"""
+        return {
+            "average_day": self.average_day(),
+            "break_ratio": self.break_ratio(),
+            "overtime": self.overtime(goal_seconds),
+            "streaks": self.streaks()
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print statistics over the whole history.")
+    parser.add_argument("--data", default="time_records.json",
+                        help="data file, .db/.sqlite for the SQLite backend")
+    args = parser.parse_args(argv)
+
+    from time_tracker_core import TimeTrackerCore
+    core = TimeTrackerCore(args.data)
+    try:
+        history = HistoryArrays.from_core(core)
+        goal = int(core.total_time.total_seconds())
+        stats = history.summary(goal)
+        clock_ins = history.clock_in_distribution(bin_minutes=60)
+        heatmap = history.weekday_hour_heatmap()
+    finally:
+        core.storage.close()
+
+    average = stats["average_day"]
+    print(f"Worked days:     {average['days']}")
+    print(f"Average day:     {core.format_seconds(average['mean_worked'])} worked, "
+          f"{core.format_seconds(average['mean_span'])} from clock in to clock out")
+    print(f"Break ratio:     {stats['break_ratio']:.1%}")
+    overtime = stats["overtime"]
+    print(f"Against goal:    {core.format_seconds(overtime['overtime'])} over on {overtime['days_over']} days, "
+          f"{core.format_seconds(overtime['undertime'])} under on {overtime['days_under']} days")
+    print(f"Streaks:         longest {stats['streaks']['longest']} days, "
+          f"current {stats['streaks']['current']} days")
+    print("Clock in by hour: " + " ".join(f"{hour:02d}:{count}" for hour, count in enumerate(clock_ins) if count))
+    print("Hours worked by weekday and hour:")
+    print("     " + "".join(f"{hour:>5}" for hour in range(24)))
+    for name, row in zip(("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"), heatmap):
+        print(f"{name:<5}" + "".join(f"{seconds / 3600:>5.1f}" for seconds in row))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,210 @@
+"""Benchmarks for the core and UI hot paths on synthetic histories.
+
+    python benchmark.py --sizes 1k,100k,1m --output results.json
+    python benchmark.py --compare results.json --threshold 0.2
+
+Histories are generated deterministically from --seed, so two runs on
+the same machine measure the same data. Results are written as JSON.
+With --compare, every benchmark whose median got slower than the
+baseline by more than the threshold is reported as a regression and
+the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from records import RECORD_SCHEMA, session_from_record
+from time_tracker_core import TimeTrackerCore
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+def generate_history(sessions, seed=0, start=date(1970, 1, 1)):
+    """Build a records dict with one session per day, the same for a given seed"""
+    rng = random.Random(seed)
+    records = {}
+    epoch = datetime(1970, 1, 1)
+    for i in range(sessions):
+        day = start + timedelta(days=i)
+        day_start = int((datetime(day.year, day.month, day.day) - epoch).total_seconds())
+        clock_in = day_start + rng.randint(7 * 3600, 10 * 3600)
+        breaks = rng.randint(0, 5400)
+        worked = rng.randint(3 * 3600, 10 * 3600)
+        records[day.isoformat()] = {
+            "total_time": worked,
+            "breaks": breaks,
+            "clock_in": clock_in,
+            "clock_out": clock_in + worked + breaks
+        }
+    return records
+
+def write_history(directory, records):
+    """Write records and their sessions as a data file the way the JSON backend stores them"""
+    sessions = {}
+    for date_str, record in records.items():
+        session = session_from_record(date_str, record)
+        sessions[session["id"]] = session
+    path = os.path.join(directory, "time_records.json")
+    with open(path, 'w') as f:
+        json.dump({"records": records, "sessions": sessions,
+                   "current_state": {"state": "clocked_out", "schema": RECORD_SCHEMA}}, f)
+    return path
+
+def measure(func, runs, inner=1):
+    """Time func over several runs, returning per-call statistics in ms"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for _ in range(inner):
+            func()
+        samples.append((time.perf_counter() - start) * 1000 / inner)
+    return {
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+        "mean_ms": statistics.fmean(samples),
+        "runs": runs
+    }
+
+def bench_core(label, sessions, seed, results):
+    runs = 5 if sessions <= 100_000 else 2
+    tmp = tempfile.mkdtemp()
+    try:
+        path = write_history(tmp, generate_history(sessions, seed))
+        results[f"load_data[{label}]"] = measure(lambda: TimeTrackerCore(path).storage.close(), runs)
+
+        core = TimeTrackerCore(path)
+        results[f"save_data[{label}]"] = measure(core.save_data, runs)
+
+        def clock_cycle():
+            core.clock_in()
+            core.clock_out()
+        results[f"clock_in+clock_out[{label}]"] = measure(clock_cycle, runs, inner=20)
+
+        core.clock_in()
+        results[f"calculate_current_times[{label}]"] = measure(core.calculate_current_times, runs, inner=10_000)
+        core.clock_out()
+
+        delta = timedelta(hours=7, minutes=32, seconds=10)
+        results["format_timedelta"] = measure(lambda: core.format_timedelta(delta), runs, inner=10_000)
+
+        bench_ui(label, core, runs, results)
+        core.storage.close()
+    finally:
+        shutil.rmtree(tmp)
+
+def bench_ui(label, core, runs, results):
+    """Time the history window, dialogs and theme switches, skipped without a display"""
+    try:
+        import tkinter as tk
+        from tkinter import ttk
+        from ui_components import HeatmapWindow, MinimalButton, StyleManager, WeeklySummaryWindow
+        root = tk.Tk()
+    except Exception as e:  # No tkinter or no display
+        results[f"populate_data[{label}]"] = {"skipped": str(e)}
+        return
+    try:
+        root.withdraw()
+        # Registering every theme's styles is the one-time startup cost
+        start = time.perf_counter()
+        StyleManager.setup_styles()
+        results[f"setup_styles[{label}]"] = {"median_ms": (time.perf_counter() - start) * 1000, "runs": 1}
+        
+        def open_dialog():
+            # The widgets of a TimeGoalDialog, without waiting for the grab
+            dialog = tk.Toplevel(root)
+            dialog.withdraw()
+            dialog.configure(bg=StyleManager.color("background"))
+            ttk.Label(dialog, text="Set daily time goal (hours):", style=StyleManager.style("Status.TLabel")).pack()
+            ttk.Entry(dialog).pack()
+            frame = ttk.Frame(dialog, style=StyleManager.style("Main.TFrame"))
+            frame.pack()
+            MinimalButton(frame, text="Save").pack(side=tk.LEFT)
+            MinimalButton(frame, text="Cancel").pack(side=tk.LEFT)
+            dialog.update_idletasks()
+            dialog.destroy()
+        results[f"open_dialog[{label}]"] = measure(open_dialog, runs)
+        
+        window = WeeklySummaryWindow(root, core)
+        window.window.withdraw()
+        results[f"populate_data[{label}]"] = measure(window.populate_data, runs, inner=20)
+        results[f"open_summary[{label}]"] = measure(
+            lambda: WeeklySummaryWindow(root, core).window.destroy(), runs)
+        # The first heatmap renders the year tiles, later ones reuse them
+        start = time.perf_counter()
+        HeatmapWindow(root, core).window.destroy()
+        results[f"first_heatmap[{label}]"] = {"median_ms": (time.perf_counter() - start) * 1000, "runs": 1}
+        results[f"open_heatmap[{label}]"] = measure(lambda: HeatmapWindow(root, core).window.destroy(), runs)
+        
+        def toggle_theme():
+            StyleManager.toggle_dark_mode(root, StyleManager.theme == "Light")
+            root.update_idletasks()
+        results[f"toggle_theme[{label}]"] = measure(toggle_theme, runs)
+        StyleManager.set_theme(root, "Light")
+    finally:
+        root.destroy()
+
+def compare(results, baseline, threshold):
+    """Return names of benchmarks slower than baseline by more than threshold"""
+    regressions = []
+    for name, current in sorted(results.items()):
+        before = baseline.get(name)
+        if not before or "median_ms" not in before or "median_ms" not in current:
+            continue
+        ratio = current["median_ms"] / before["median_ms"] if before["median_ms"] else 1.0
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        print(f"{name:<40}{before['median_ms']:>12.4f}{current['median_ms']:>12.4f}{ratio:>8.2f}x  {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark core and UI hot paths.")
+    parser.add_argument("--sizes", default="1k,100k,1m",
+                        help="comma separated history sizes: " + ", ".join(SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", metavar="BASELINE", help="results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed slowdown before flagging, 0.2 = 20%%")
+    args = parser.parse_args(argv)
+
+    results = {}
+    for label in args.sizes.split(","):
+        label = label.strip().lower()
+        print(f"running {label} ...", file=sys.stderr)
+        bench_core(label, SIZES[label], args.seed, results)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "time": datetime.now().isoformat(timespec="seconds")
+        },
+        "results": results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+    else:
+        json.dump(report, sys.stdout, indent=4)
+        print()
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        print(f"{'benchmark':<40}{'baseline':>12}{'current':>12}{'ratio':>9}", file=sys.stderr)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s)", file=sys.stderr)
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,56 @@
+"""Startup budget check for the headless CLI.
+
+Runs `cli.py status` in fresh interpreters and fails when the best cold
+start exceeds the budget or when anything pulls tkinter into the import
+graph. Run it before merging changes to the core's imports:
+
+    python check_startup.py --budget-ms 100
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CLI = os.path.join(HERE, "cli.py")
+
+def imports_tkinter():
+    """True when importing the CLI also imports tkinter"""
+    code = "import sys, cli; sys.exit(1 if 'tkinter' in sys.modules else 0)"
+    return subprocess.run([sys.executable, "-c", code], cwd=HERE).returncode != 0
+
+def time_status(runs):
+    """Wall times in milliseconds of `cli.py status` on a fresh data file"""
+    timings = []
+    with tempfile.TemporaryDirectory() as tmp:
+        data_file = os.path.join(tmp, "time_records.json")
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, CLI, "--data", data_file, "status"],
+                           check=True, stdout=subprocess.DEVNULL)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the CLI cold-start budget.")
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if imports_tkinter():
+        print("FAIL: importing cli pulls in tkinter")
+        return 1
+
+    timings = sorted(time_status(args.runs))
+    best, median = timings[0], timings[len(timings) // 2]
+    print(f"cli.py status: best {best:.1f} ms, median {median:.1f} ms, budget {args.budget_ms:.0f} ms")
+    if best > args.budget_ms:
+        print("FAIL: cold start is over budget")
+        return 1
+    print("OK")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
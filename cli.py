@@ -0,0 +1,199 @@
+import argparse
+import sys
+from datetime import date, timedelta
+import metrics
+from storage import open_storage
+from time_tracker_core import TimeTrackerCore
+
+# Command -> (core transition, message on success)
+TRANSITIONS = {
+    "in": ("clock_in", "Locked in"),
+    "out": ("clock_out", "Locked out"),
+    "break": ("break_in", "On break"),
+    "resume": ("break_out", "Back from break"),
+}
+
+def run_transition(core, command, tags=None):
+    method, message = TRANSITIONS[command]
+    if not core.can(method):
+        state = core.current_state.replace('_', ' ')
+        print(f"Cannot '{command}' while {state}", file=sys.stderr)
+        return 1
+    if tags:
+        getattr(core, method)(tags=tags)
+    else:
+        getattr(core, method)()
+    print(message)
+    return 0
+
+def show_status(core):
+    worked_time, time_left = core.calculate_current_times()
+    print(f"Status: {core.current_state.replace('_', ' ').title()}")
+    print(f"Worked: {core.format_timedelta(worked_time)}")
+    print(f"Left: {core.format_timedelta(time_left)}")
+    return 0
+
+def show_report(core, args):
+    today = core.get_current_time().date()
+    if args.month:
+        start = today.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    else:
+        start = today - timedelta(days=today.weekday())
+        end = start + timedelta(days=6)
+
+    records = core.get_records_between(start, end)
+    print(f"{'Date':<12}{'Total Time':>14}{'Breaks':>14}{'Clock In':>11}{'Clock Out':>11}")
+    day = start
+    while day <= end:
+        date_str = day.strftime("%Y-%m-%d")
+        record = records.get(date_str)
+        if record:
+            print(f"{date_str:<12}"
+                  f"{core.format_seconds(record['total_time']):>14}"
+                  f"{core.format_seconds(record['breaks']):>14}"
+                  f"{core.format_clock_time(record['clock_in']):>11}"
+                  f"{core.format_clock_time(record['clock_out']):>11}")
+        else:
+            print(f"{date_str:<12}{'0h 0m 0s':>14}{'0h 0m 0s':>14}{'-':>11}{'-':>11}")
+        day += timedelta(days=1)
+
+    worked, breaks = core.get_totals_between(start, end)
+    print(f"{'Total':<12}{core.format_seconds(worked):>14}{core.format_seconds(breaks):>14}")
+    return 0
+
+def export_records(core, args):
+    import transfer
+    export = transfer.export_csv if args.format == "csv" else transfer.export_jsonl
+    out_file = open(args.file, 'w', newline='') if args.file else sys.stdout
+    try:
+        count = export(core, out_file, args.start, args.end)
+    finally:
+        if args.file:
+            out_file.close()
+    print(f"Exported {count} records", file=sys.stderr)
+    return 0
+
+def import_records(core, args):
+    import transfer
+    fmt = args.format or ("csv" if args.file.endswith(".csv") else "jsonl")
+    with open(args.file, 'r', newline='') as in_file:
+        rows = transfer.read_csv(in_file) if fmt == "csv" else transfer.read_jsonl(in_file)
+        count, errors = transfer.import_rows(core, rows)
+    for number, error in errors:
+        print(f"row {number}: {error}", file=sys.stderr)
+    print(f"Imported {count} records, skipped {len(errors)}")
+    return 1 if errors else 0
+
+def set_timezone(core, args):
+    if not args.name:
+        print(core.local_time.name)
+        return 0
+    try:
+        changed = core.set_timezone(args.name)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if not changed:
+        print(f"Cannot change the timezone while {core.current_state.replace('_', ' ')}", file=sys.stderr)
+        return 1
+    print(f"Timezone set to {args.name}")
+    return 0
+
+def show_tags(core, args):
+    first, last = core.get_history_bounds()
+    start, end = args.start or first, args.end or last
+    if args.tag is None:
+        # Totals of every tag over the range
+        for tag in core.get_tags():
+            worked, breaks = core.get_tag_totals(tag, start, end)
+            if worked or breaks:
+                print(f"{tag:<24}{core.format_seconds(worked):>14}{core.format_seconds(breaks):>14}")
+        return 0
+
+    print(f"{'Date':<12}{'Clock In':>11}{'Clock Out':>11}  Tags")
+    for session in core.get_tag_sessions(args.tag, start, end):
+        day = core.local_time.local_date(session["start"]).isoformat()
+        print(f"{day:<12}"
+              f"{core.format_clock_time(session['start']):>11}"
+              f"{core.format_clock_time(session['end']):>11}  "
+              f"{', '.join(session.get('tags', ()))}")
+    worked, breaks = core.get_tag_totals(args.tag, start, end)
+    print(f"{'Total':<12}{core.format_seconds(worked):>14}{core.format_seconds(breaks):>14}")
+    return 0
+
+def sync_records(core, args):
+    import sync
+    received, sent, days = sync.sync_directory(core, args.directory)
+    print(f"Synced {days} differing days: received {received} sessions, sent {sent}")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="timetracker",
+        description="Track work time from the command line without starting the GUI.")
+    parser.add_argument("--data", default="time_records.json",
+                        help="data file (.db/.sqlite selects the SQLite backend)")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="record latencies and write them to FILE in Prometheus format")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, help_text in (("in", "lock in"), ("out", "lock out"),
+                            ("break", "start a break"), ("resume", "end the current break")):
+        transition = commands.add_parser(name, help=help_text)
+        if name != "out":
+            transition.add_argument("--tag", dest="tags", action="append",
+                                    help="label the session, e.g. a project or client (repeatable)")
+    commands.add_parser("status", help="show the current state and time worked")
+    report = commands.add_parser("report", help="show a summary of records")
+    period = report.add_mutually_exclusive_group()
+    period.add_argument("--week", action="store_true", help="current week (default)")
+    period.add_argument("--month", action="store_true", help="current month")
+    export = commands.add_parser("export", help="write records as CSV or JSON Lines")
+    export.add_argument("file", nargs="?", help="output file (default: stdout)")
+    export.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    export.add_argument("--from", dest="start", type=date.fromisoformat, help="first date, YYYY-MM-DD")
+    export.add_argument("--to", dest="end", type=date.fromisoformat, help="last date, YYYY-MM-DD")
+    load = commands.add_parser("import", help="add records from a CSV or JSON Lines file")
+    load.add_argument("file")
+    load.add_argument("--format", choices=("csv", "jsonl"),
+                      help="file format (default: from the extension)")
+    zone = commands.add_parser("timezone", help="show or set the timezone days are cut in")
+    zone.add_argument("name", nargs="?", help="IANA name, e.g. Europe/Berlin")
+    tags = commands.add_parser("tags", help="show time per tag, or the sessions of one tag")
+    tags.add_argument("tag", nargs="?")
+    tags.add_argument("--from", dest="start", type=date.fromisoformat, help="first date, YYYY-MM-DD")
+    tags.add_argument("--to", dest="end", type=date.fromisoformat, help="last date, YYYY-MM-DD")
+    merge = commands.add_parser("sync", help="merge sessions with a sync directory shared between machines")
+    merge.add_argument("directory")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+    # Durable: a command reporting success has its change fsynced
+    core = TimeTrackerCore(args.data, storage=open_storage(args.data, durable=True))
+    try:
+        if args.command in TRANSITIONS:
+            return run_transition(core, args.command, getattr(args, "tags", None))
+        if args.command == "status":
+            return show_status(core)
+        if args.command == "export":
+            return export_records(core, args)
+        if args.command == "import":
+            return import_records(core, args)
+        if args.command == "timezone":
+            return set_timezone(core, args)
+        if args.command == "tags":
+            return show_tags(core, args)
+        if args.command == "sync":
+            return sync_records(core, args)
+        return show_report(core, args)
+    finally:
+        # Every transition is already journaled, skip the full snapshot
+        core.storage.close()
+        if args.metrics:
+            metrics.registry.dump(args.metrics)
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,69 @@
+"""Clocks the core reads the current time from.
+
+Timestamps have to be wall-clock time, but durations taken from the wall
+clock go wrong whenever it is stepped, by NTP or by hand, in the middle
+of a session. A clock therefore reads the wall clock only on resync(),
+which the core calls as a session starts, and adds monotonic elapsed
+time to that reading until the next resync.
+"""
+import time
+
+try:
+    _CLOCK_BOOTTIME = time.CLOCK_BOOTTIME  # Linux, keeps counting while suspended
+except AttributeError:
+    _CLOCK_BOOTTIME = None
+
+class Clock:
+    """Wall time anchored at the last resync, advanced by elapsed time"""
+
+    def __init__(self):
+        self.resync()
+
+    def wall(self):
+        raise NotImplementedError
+
+    def elapsed(self):
+        raise NotImplementedError
+
+    def resync(self):
+        """Take a fresh wall-clock reading as the anchor"""
+        self.anchor_wall = self.wall()
+        self.anchor_elapsed = self.elapsed()
+
+    def now(self):
+        """Current time in epoch seconds"""
+        return self.anchor_wall + (self.elapsed() - self.anchor_elapsed)
+
+class SystemClock(Clock):
+    """The machine's clocks. Time spent suspended still counts, as it
+    would on the wall clock, where the platform offers such a counter."""
+
+    def wall(self):
+        return time.time()
+
+    def elapsed(self):
+        if _CLOCK_BOOTTIME is not None:
+            return time.clock_gettime(_CLOCK_BOOTTIME)
+        return time.monotonic()
+
+class VirtualClock(Clock):
+    """A clock that only moves when told to, for simulations"""
+
+    def __init__(self, start=0):
+        self.seconds = 0  # Monotonic time since creation
+        self.wall_offset = start  # Wall clock reading at creation, moved by step()
+        super().__init__()
+
+    def wall(self):
+        return self.wall_offset + self.seconds
+
+    def elapsed(self):
+        return self.seconds
+
+    def advance(self, seconds):
+        """Let time pass"""
+        self.seconds += seconds
+
+    def step(self, seconds):
+        """Set the wall clock forward or back without time passing, like an NTP step"""
+        self.wall_offset += seconds
\ No newline at end of file
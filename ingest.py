@@ -0,0 +1,350 @@
+"""Batched ingestion of timestamped clock events, e.g. from badge readers.
+
+    python ingest.py --data-dir users spool /var/spool/badges --watch 5
+    python ingest.py --data-dir users serve --port 8090
+    python ingest.py bench --events 100000
+
+An event is one JSON object:
+
+    {"id": "reader3-118842", "user": "alice", "event": "clock_in",
+     "at": 1790000000, "tags": ["site-b"]}
+
+`at` is epoch seconds or an ISO 8601 time with a UTC offset. Readers drop
+JSON Lines files into the spool directory, writing them under another
+name and renaming them to *.jsonl when complete, or send lines to the
+socket and shut down their side to get a JSON summary back.
+
+Each batch is deduplicated by event id, against itself and against the
+ids already applied, then sorted by time and replayed through each
+user's state machine. An event whose time falls before the session's
+last transition or inside a recorded session is rejected with a reason
+instead of applied. One the state machine does not allow yet, e.g. a
+clock_out that arrived a batch before its clock_in, is held and replayed
+with the user's later batches, and only rejected once it is older than
+PENDING_DAYS. Every user's events in a batch are committed with a single
+write.
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import socketserver
+import sys
+import tempfile
+import time
+from datetime import datetime
+from storage import open_storage
+from time_tracker_core import TimeTrackerCore
+
+# Lifecycle order breaks ties between events stamped the same second
+EVENTS = ("clock_in", "break_in", "break_out", "clock_out")
+RANK = {name: rank for rank, name in enumerate(EVENTS)}
+USER_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+PENDING_DAYS = 7  # How long an event waits for the events that allow it
+
+def _epoch(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return int(value)
+    if isinstance(value, str):
+        moment = datetime.fromisoformat(value.strip())
+        if moment.tzinfo is None:
+            raise ValueError(f"time has no UTC offset: {value!r}")
+        return int(moment.timestamp())
+    raise ValueError(f"not a time: {value!r}")
+
+def parse_event(raw):
+    """Turn a raw event into its checked form or raise ValueError"""
+    if not isinstance(raw, dict):
+        raise ValueError(f"not an event: {str(raw).strip()[:60]!r}")
+    if not raw.get("id"):
+        raise ValueError("missing id")
+    if not USER_ID.match(str(raw.get("user", ""))):
+        raise ValueError(f"bad or missing user: {raw.get('user')!r}")
+    if raw.get("event") not in RANK:
+        raise ValueError(f"unknown event: {raw.get('event')!r}")
+    try:
+        at = _epoch(raw["at"])
+    except KeyError:
+        raise ValueError("missing at")
+    return {"id": str(raw["id"]), "user": raw["user"], "event": raw["event"],
+            "at": at, "tags": raw.get("tags")}
+
+def check(core, event, now):
+    """Reason the event cannot be applied to the core as it stands, or None"""
+    name, at = event["event"], event["at"]
+    if not core.can(name):
+        return f"cannot {name} while {core.current_state.replace('_', ' ')}"
+    if at > now + 300:
+        return "in the future"
+    if name == "clock_in":
+        if core.overlaps_session(at, at + 1):
+            return "inside a recorded session"
+        return None
+    # The session's transitions so far, the new one may not precede them
+    last = max([int(core.clock_in_time.timestamp())]
+               + [end for _, end in core.current_breaks]
+               + ([int(core.break_start_time.timestamp())] if core.break_start_time else []))
+    if at < last:
+        return "before the session's last transition"
+    if name == "clock_out" and core.overlaps_session(last, at):
+        return "session would overlap a recorded one"
+    return None
+
+def replay(core, events, now):
+    """Apply time-sorted events to a core in one write, returning (applied,
+    rejected, blocked), where blocked holds the events the state did not allow"""
+    applied, rejected, blocked = [], [], []
+    with core.batch():
+        for event in events:
+            reason = check(core, event, now)
+            if reason:
+                (rejected if core.can(event["event"]) else blocked).append((event, reason))
+                continue
+            at = core.local_time.to_datetime(event["at"])
+            if event["event"] == "clock_out":
+                core.clock_out(at=at)
+            else:
+                getattr(core, event["event"])(tags=event["tags"], at=at)
+            applied.append(event)
+    return applied, rejected, blocked
+
+class SeenIds:
+    """Ids of events already applied, appended to a file one per line"""
+
+    def __init__(self, path):
+        self.path = path
+        self.ids = set()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.ids.update(line.rstrip('\n') for line in f)
+
+    def __contains__(self, event_id):
+        return event_id in self.ids
+
+    def add_many(self, event_ids):
+        event_ids = [event_id for event_id in event_ids if event_id not in self.ids]
+        if event_ids:
+            with open(self.path, 'a') as f:
+                f.write(''.join(event_id + '\n' for event_id in event_ids))
+            self.ids.update(event_ids)
+
+class PendingEvents:
+    """Events held until the state allows them, by user, kept in a JSON Lines file"""
+
+    def __init__(self, path):
+        self.path = path
+        self.users = {}  # User -> {event id: event}
+        self.ids = set()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.put(json.loads(line) for line in f if line.strip())
+
+    def __contains__(self, event_id):
+        return event_id in self.ids
+
+    def take(self, user_id):
+        """Remove and return a user's held events"""
+        events = self.users.pop(user_id, {})
+        self.ids.difference_update(events)
+        return list(events.values())
+
+    def put(self, events):
+        for event in events:
+            self.users.setdefault(event["user"], {})[event["id"]] = event
+            self.ids.add(event["id"])
+
+    def save(self):
+        with open(self.path + ".tmp", 'w') as f:
+            f.write(''.join(json.dumps(event) + '\n' for events in self.users.values() for event in events.values()))
+        os.replace(self.path + ".tmp", self.path)
+
+class Ingestor:
+    """Routes batches of events to one core per user in a data directory.
+
+    Ids are recorded after the user's batch is committed. Should the
+    process die in between, replaying the batch is still harmless: the
+    events it applied are now rejected by the state machine checks.
+    Held events are saved once the whole batch is through, should the
+    process die before, they are held from the previous batch's file.
+    """
+
+    def __init__(self, data_dir, seen_file=None):
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        self.seen = SeenIds(seen_file or os.path.join(data_dir, "ingested.ids"))
+        self.pending = PendingEvents(os.path.join(data_dir, "pending.jsonl"))
+        self.cores = {}
+
+    def core(self, user_id):
+        core = self.cores.get(user_id)
+        if core is None:
+            path = os.path.join(self.data_dir, f"{user_id}.json")
+            core = self.cores[user_id] = TimeTrackerCore(path, open_storage(path))
+        return core
+
+    def ingest(self, raw_events):
+        """Apply a batch of raw events, returning counts and the rejected events.
+        Events of the batch's users held for later batches count as pending."""
+        summary = {"received": 0, "duplicates": 0, "applied": 0, "pending": 0, "rejected": []}
+        by_user = {}
+        batch_ids = set()
+        for raw in raw_events:
+            summary["received"] += 1
+            try:
+                event = parse_event(raw)
+            except ValueError as e:
+                summary["rejected"].append({"event": raw, "reason": str(e)})
+                continue
+            if event["id"] in batch_ids or event["id"] in self.seen or event["id"] in self.pending:
+                summary["duplicates"] += 1
+                continue
+            batch_ids.add(event["id"])
+            by_user.setdefault(event["user"], []).append(event)
+
+        now = int(time.time())
+        for user_id, events in by_user.items():
+            # Held events get another try among the new ones, unless applied before a crash
+            events.extend(event for event in self.pending.take(user_id) if event["id"] not in self.seen)
+            events.sort(key=lambda event: (event["at"], RANK[event["event"]], event["id"]))
+            applied, rejected, blocked = replay(self.core(user_id), events, now)
+            self.seen.add_many(event["id"] for event in applied)
+            held = []
+            for event, reason in blocked:
+                if event["at"] < now - PENDING_DAYS * 86400:
+                    rejected.append((event, f"{reason}, nothing came to allow it"))
+                else:
+                    held.append(event)
+            self.pending.put(held)
+            summary["applied"] += len(applied)
+            summary["pending"] += len(held)
+            summary["rejected"].extend({"event": event, "reason": reason} for event, reason in rejected)
+        if by_user:
+            self.pending.save()
+        return summary
+
+    def close(self):
+        for core in self.cores.values():
+            core.close()
+        self.cores.clear()
+
+def _read_lines(lines, rejected):
+    for number, line in enumerate(lines, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                rejected.append({"event": line.strip()[:200], "reason": f"line {number} is not JSON"})
+
+def ingest_spool(ingestor, spool_dir):
+    """Ingest every complete *.jsonl file in the spool as one batch, then remove them.
+    Rejected events are appended to rejected.jsonl there with their reasons."""
+    names = sorted(name for name in os.listdir(spool_dir) if name.endswith(".jsonl") and name != "rejected.jsonl")
+    if not names:
+        return None
+    unreadable = []
+    events = []
+    for name in names:
+        with open(os.path.join(spool_dir, name), 'r') as f:
+            events.extend(_read_lines(f, unreadable))
+    summary = ingestor.ingest(events)
+    summary["rejected"][:0] = unreadable
+    if summary["rejected"]:
+        with open(os.path.join(spool_dir, "rejected.jsonl"), 'a') as f:
+            f.write(''.join(json.dumps(item) + '\n' for item in summary["rejected"]))
+    for name in names:
+        os.remove(os.path.join(spool_dir, name))
+    return summary
+
+class _BatchHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        rejected = []
+        summary = self.server.ingestor.ingest(_read_lines(
+            (line.decode('utf-8', 'replace') for line in self.rfile), rejected))
+        summary["rejected"][:0] = rejected
+        self.wfile.write((json.dumps(summary) + '\n').encode())
+
+def serve(ingestor, host, port):
+    """Take one batch per connection; batches are ingested one at a time"""
+    with socketserver.TCPServer((host, port), _BatchHandler) as server:
+        server.ingestor = ingestor
+        print(f"Ingesting on {host}:{server.server_address[1]}", flush=True)
+        server.serve_forever()
+
+def generate_events(count, users=10, seed=0):
+    """Shuffled badge events for whole days of work, with about 1% resent"""
+    import random
+    rng = random.Random(seed)
+    events = []
+    start = int(time.time()) // 86400 * 86400 - (count // (4 * users) + 2) * 86400
+    for user in range(users):
+        day = start
+        while len(events) < count * (user + 1) // users:
+            clock_in = day + 7 * 3600 + rng.randint(0, 7200)
+            break_in = clock_in + rng.randint(3, 5) * 3600
+            break_out = break_in + rng.randint(900, 3600)
+            clock_out = break_out + rng.randint(3, 5) * 3600
+            for name, at in zip(EVENTS, (clock_in, break_in, break_out, clock_out)):
+                events.append({"id": f"{user}-{at}-{name}", "user": f"user{user}", "event": name, "at": at})
+            day += 86400
+    del events[count:]
+    events.extend(rng.sample(events, len(events) // 100))
+    rng.shuffle(events)
+    return events
+
+def benchmark(count, users=10):
+    events = generate_events(count, users)
+    data_dir = tempfile.mkdtemp()
+    try:
+        ingestor = Ingestor(data_dir)
+        began = time.perf_counter()
+        summary = ingestor.ingest(events)
+        elapsed = time.perf_counter() - began
+        ingestor.close()
+    finally:
+        shutil.rmtree(data_dir)
+    print(f"{len(events)} events for {users} users in {elapsed:.2f}s "
+          f"({len(events) / elapsed:.0f} events/s): {summary['applied']} applied, "
+          f"{summary['duplicates']} duplicates, {summary['pending']} pending, {len(summary['rejected'])} rejected")
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest batches of timestamped clock events.")
+    parser.add_argument("--data-dir", default="users", help="one data file per user, as for the service")
+    commands = parser.add_subparsers(dest="command", required=True)
+    spool = commands.add_parser("spool", help="ingest the *.jsonl files of a spool directory")
+    spool.add_argument("directory")
+    spool.add_argument("--watch", type=float, metavar="SECONDS", help="keep polling at this interval")
+    server = commands.add_parser("serve", help="take batches on a local socket")
+    server.add_argument("--host", default="127.0.0.1")
+    server.add_argument("--port", type=int, default=8090)
+    bench = commands.add_parser("bench", help="time a batch of generated events")
+    bench.add_argument("--events", type=int, default=100000)
+    bench.add_argument("--users", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        benchmark(args.events, args.users)
+        return 0
+
+    ingestor = Ingestor(args.data_dir)
+    try:
+        if args.command == "serve":
+            serve(ingestor, args.host, args.port)
+        while args.command == "spool":
+            summary = ingest_spool(ingestor, args.directory)
+            if summary:
+                print(f"{summary['received']} received, {summary['applied']} applied, "
+                      f"{summary['duplicates']} duplicates, {summary['pending']} pending, "
+                      f"{len(summary['rejected'])} rejected", flush=True)
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ingestor.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,202 @@
+import json
+import os
+import tempfile
+import time
+import metrics
+
+class EventJournal:
+    """Append-only log of state transitions on top of a JSON snapshot.
+
+    Every transition is written as one JSON line to the journal file.
+    After `compact_every` events the caller writes a fresh snapshot and
+    the journal is truncated, so a button press only costs a small append.
+    Callers sharing the files between processes must hold a lock around
+    reads and writes. With durable=True every append is fsynced before
+    it returns.
+    """
+
+    def __init__(self, snapshot_file, journal_file, compact_every=200, durable=False):
+        self.snapshot_file = snapshot_file
+        self.journal_file = journal_file
+        self.compact_every = compact_every
+        self.durable = durable
+        self.pending = 0  # Events written since the last snapshot
+
+    def read(self, repair=True):
+        """Return the last snapshot and the events journaled after it"""
+        snapshot = {}
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r') as f:
+                snapshot = json.load(f)
+
+        events, _ = self.read_from(0, repair)
+        self.pending = len(events)
+        return snapshot, events
+
+    def read_from(self, offset, repair=True):
+        """Read journal lines from a byte offset, dropping a torn last line.
+
+        Returns the events and the offset just past the last good line.
+        With repair=False the damaged tail is skipped but left in the file.
+        """
+        if not os.path.exists(self.journal_file):
+            return [], 0
+
+        events = []
+        good_bytes = offset
+        with open(self.journal_file, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Incomplete write, the process died mid-append
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    break
+                good_bytes += len(line)
+
+        # Cut the damaged tail so the next append starts on a clean line
+        if repair and good_bytes != os.path.getsize(self.journal_file):
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(good_bytes)
+        return events, good_bytes
+
+    def signature(self):
+        """Cheap fingerprint of both files, changing whenever either is written"""
+        try:
+            st = os.stat(self.snapshot_file)
+            snapshot_sig = (st.st_ino, st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            snapshot_sig = None
+        try:
+            journal_size = os.path.getsize(self.journal_file)
+        except FileNotFoundError:
+            journal_size = 0
+        return snapshot_sig, journal_size
+
+    def append(self, event):
+        """Append a single event to the journal"""
+        self.append_many([event])
+
+    def append_many(self, events):
+        """Append a batch of events with a single write"""
+        if not events:
+            return
+        start = time.perf_counter()
+        data = ''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in events)
+        with open(self.journal_file, 'a') as f:
+            f.write(data)
+            if self.durable:
+                f.flush()
+                os.fsync(f.fileno())
+        self.pending += len(events)
+        
+        if metrics.registry.enabled:
+            metrics.observe("write_seconds", time.perf_counter() - start, kind="journal")
+            metrics.observe("write_bytes", len(data), kind="journal")
+
+    @property
+    def needs_compaction(self):
+        return self.pending >= self.compact_every
+
+    def compact(self, snapshot):
+        """Write a full snapshot and start an empty journal"""
+        tmp_file = self.write_snapshot(snapshot)
+        self.install_snapshot(tmp_file, self.signature()[1])
+
+    def write_snapshot(self, snapshot):
+        """Serialize a snapshot to an fsynced temp file beside the real one.
+
+        This is the slow part of compaction and touches neither data
+        file, so it can run without holding the lock.
+        """
+        start = time.perf_counter()
+        fd, tmp_file = _temp_file_like(self.snapshot_file)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(snapshot, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+                size = f.tell()
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+        
+        if metrics.registry.enabled:
+            metrics.observe("write_seconds", time.perf_counter() - start, kind="snapshot")
+            metrics.observe("write_bytes", size, kind="snapshot")
+        return tmp_file
+
+    def install_snapshot(self, tmp_file, offset):
+        """Rename a written snapshot into place, covering the journal up to offset.
+
+        The snapshot is renamed over the old one, so a crash leaves either
+        the old or the new snapshot, never a truncated one. Journal lines
+        past offset were appended while the snapshot was being written and
+        are kept.
+        """
+        tail = b''
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'rb') as f:
+                f.seek(offset)
+                tail = f.read()
+        try:
+            os.replace(tmp_file, self.snapshot_file)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+        directory = os.path.dirname(os.path.abspath(self.snapshot_file))
+        _fsync_directory(directory)
+
+        # Replaying events already in the snapshot is harmless, so a crash
+        # before the journal is swapped too loses nothing
+        if tail:
+            fd, tmp_journal = _temp_file_like(self.journal_file)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_journal, self.journal_file)
+        elif os.path.exists(self.journal_file):
+            with open(self.journal_file, 'w'):
+                pass
+        self.pending = tail.count(b'\n')
+
+    def sync(self):
+        """Force journaled events to disk"""
+        if os.path.exists(self.journal_file):
+            with open(self.journal_file, 'a') as f:
+                os.fsync(f.fileno())
+
+def _temp_file_like(path):
+    """Temp file beside path, with the permissions of path or, when it does
+    not exist, those a new file gets. mkstemp alone would leave 0600 behind
+    the rename and lock out other readers."""
+    fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    if hasattr(os, 'fchmod'):  # Not on older Windows Pythons, where modes hardly apply
+        try:
+            os.fchmod(fd, mode)
+        except BaseException:
+            os.close(fd)
+            os.remove(tmp_file)
+            raise
+    return fd, tmp_file
+
+def _fsync_directory(directory):
+    """Make a rename durable, where the platform allows opening directories"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # Windows
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
\ No newline at end of file
@@ -0,0 +1,120 @@
+"""Local load test for service.py.
+
+Starts the service in a subprocess on a temporary data directory (or
+targets --port of one already running), then drives it from many
+keep-alive connections. Each simulated user walks through clock in,
+break, resume and clock out with status reads in between. Prints
+requests per second and latency percentiles.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# One working day per cycle, with status reads mixed in
+CYCLE = [("POST", "clock_in"), ("GET", "status"), ("POST", "break_in"),
+         ("POST", "break_out"), ("GET", "status"), ("POST", "clock_out")]
+
+async def run_connection(host, port, user_ids, requests, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for i in range(requests):
+            user_id = user_ids[i % len(user_ids)]
+            method, action = CYCLE[(i // len(user_ids)) % len(CYCLE)]
+            request = (f"{method} /users/{user_id}/{action} HTTP/1.1\r\n"
+                       f"Host: {host}\r\nContent-Length: 0\r\n\r\n")
+            start = time.perf_counter()
+            writer.write(request.encode())
+            await writer.drain()
+
+            status_line = await reader.readline()
+            if not status_line.startswith(b'HTTP/1.1 200'):
+                errors.append(status_line)
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+
+async def run_load(host, port, users, connections, requests_per_connection):
+    # Each connection owns a disjoint slice of users so their cycles stay valid
+    user_ids = [f"user{n}" for n in range(users)]
+    slices = [user_ids[c::connections] or [f"extra{c}"] for c in range(connections)]
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*(run_connection(host, port, slices[c], requests_per_connection,
+                                          latencies, errors)
+                           for c in range(connections)))
+    return time.perf_counter() - start, latencies, errors
+
+def wait_for_port(host, port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"service did not start on {host}:{port}")
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the tracking service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, help="use a running service instead of starting one")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--connections", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=200, help="requests per connection")
+    args = parser.parse_args(argv)
+
+    server = None
+    tmp = None
+    port = args.port
+    if port is None:
+        tmp = tempfile.TemporaryDirectory()
+        port = free_port()
+        server = subprocess.Popen([sys.executable, os.path.join(HERE, "service.py"),
+                                   "--host", args.host, "--port", str(port),
+                                   "--data-dir", tmp.name], stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(args.host, port)
+        elapsed, latencies, errors = asyncio.run(
+            run_load(args.host, port, args.users, args.connections, args.requests))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            tmp.cleanup()
+
+    latencies.sort()
+    print(f"{len(latencies)} requests over {args.connections} connections "
+          f"for {args.users} users in {elapsed:.2f} s, {len(errors)} non-200 responses")
+    print(f"throughput: {len(latencies) / elapsed:.0f} req/s")
+    print(f"latency: p50 {percentile(latencies, 0.50) * 1000:.2f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms, "
+          f"max {latencies[-1] * 1000:.2f} ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -1,5 +1,11 @@
-from time_tracker import TimeTracker
+import sys
 
 if __name__ == "__main__":
+    # Any arguments mean a headless command, which must not load tkinter
+    if len(sys.argv) > 1:
+        from cli import main
+        sys.exit(main())
+
+    from time_tracker import TimeTracker
     app = TimeTracker()
     app.run()
\ No newline at end of file
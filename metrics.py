@@ -0,0 +1,109 @@
+"""Opt-in latency and size histograms, exported in Prometheus text format.
+
+Metrics are off unless TIMETRACKER_METRICS=1 is set or enable() is called.
+While off, instrumented code pays one attribute check per call and
+records nothing.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+# Metric name -> (help text, bucket bounds)
+METRICS = {
+    "operation_seconds": ("Latency of core operations", LATENCY_BUCKETS),
+    "write_seconds": ("Latency of storage writes", LATENCY_BUCKETS),
+    "write_bytes": ("Bytes written per storage write", BYTES_BUCKETS),
+    "tick_lateness_seconds": ("How late display ticks fire after their target", LATENCY_BUCKETS),
+}
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}  # (name, labels) -> Histogram
+        self.lock = threading.Lock()
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(METRICS[name][1])
+            histogram.observe(value)
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+
+    def render(self):
+        """All histograms in Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            items = sorted(self.histograms.items())
+        seen = set()
+        for (name, labels), histogram in items:
+            full_name = f"timetracker_{name}"
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {full_name} {METRICS[name][0]}")
+                lines.append(f"# TYPE {full_name} histogram")
+
+            label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{full_name}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+            lines.append(f'{full_name}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+            suffix = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{full_name}_sum{suffix} {histogram.sum:.6f}")
+            lines.append(f"{full_name}_count{suffix} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            f.write(self.render())
+
+registry = MetricsRegistry(enabled=os.environ.get("TIMETRACKER_METRICS") == "1")
+
+def enable():
+    registry.enabled = True
+
+def disable():
+    registry.enabled = False
+
+def observe(name, value, **labels):
+    registry.observe(name, value, **labels)
+
+def timed(name, **labels):
+    """Decorator recording the call latency into a histogram when enabled"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                registry.observe(name, time.perf_counter() - start, **labels)
+        return wrapper
+    return decorate
\ No newline at end of file
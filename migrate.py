@@ -0,0 +1,45 @@
+import argparse
+import os
+import sys
+from storage import open_storage
+
+def migrate(source_file, target_file):
+    """Copy all records, sessions, tombstones and the current state from one backend to another"""
+    source = open_storage(source_file)
+    target = open_storage(target_file)
+    try:
+        records, state = source.load()
+        target.replace_all(records, state, source.load_sessions())
+        tombstones = source.load_tombstones()
+        if len(tombstones):
+            target.append({'event': 'migrate', 'state': state,
+                           'tombstones': {t["id"]: t for t in tombstones.values()}})
+            target.checkpoint(state)
+        return len(records)
+    finally:
+        source.close()
+        target.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Move time records between storage backends. "
+                    "The backend is picked from the file extension "
+                    "(.db/.sqlite for SQLite, a .shards directory for monthly "
+                    "shards, anything else for JSON).")
+    parser.add_argument("source", help="existing data file, e.g. time_records.json")
+    parser.add_argument("target", help="new data file, e.g. time_records.db")
+    parser.add_argument("--force", action="store_true",
+                        help="overwrite the target if it already exists")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.source):
+        parser.error(f"{args.source} does not exist")
+    if os.path.exists(args.target) and not args.force:
+        parser.error(f"{args.target} already exists, use --force to overwrite it")
+
+    count = migrate(args.source, args.target)
+    print(f"Migrated {count} records from {args.source} to {args.target}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,206 @@
+"""Payroll totals for many users' data files, computed in a process pool.
+
+    python payroll.py /srv/timetracker/users --month 2026-09 --output sept.csv
+
+Every JSON data file found under the given paths is one user: the file
+name, or the directory name for a time_records.json, becomes the user
+id. Users on the SQLite or sharded backends are not covered: .db files
+are not searched, and .shards directories, tag indexes and sync
+directories are skipped, as their JSON files are not data files.
+Workers read each snapshot and its journal without taking locks or
+repairing anything, and send back one small row per file, so memory
+stays flat however many files there are. Rows are written in file order
+as soon as their chunk finishes, and a file that cannot be read is
+reported on stderr and skipped rather than stopping the run.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from journal import EventJournal
+from records import parse_duration
+
+FIELDS = ("user", "days", "worked_seconds", "break_seconds", "worked_hours", "open_session", "file")
+
+def _data_dir(directory):
+    """Whether a directory's JSON files may be data files"""
+    name = os.path.basename(os.path.normpath(directory))
+    return not name.endswith(".shards") and name != "tags"
+
+def find_files(paths):
+    """Yield data files under the given files and directories, sorted per directory"""
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        if not _data_dir(path):
+            continue
+        for directory, subdirs, files in os.walk(path):
+            # Month shards, tag indexes and sync directories hold no snapshots
+            subdirs[:] = sorted(name for name in subdirs if _data_dir(name))
+            if "tree.json" in files:
+                continue
+            for name in sorted(files):
+                if name.endswith(".json"):
+                    yield os.path.join(directory, name)
+
+def user_id(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    if name == "time_records":
+        return os.path.basename(os.path.dirname(os.path.abspath(path)))
+    return name
+
+def _seconds(value):
+    # Version 1 files kept durations as "7h 32m 10s"
+    return parse_duration(value) if isinstance(value, str) else int(value)
+
+def summarize_file(path, start_str, end_str):
+    """Worked and break totals of one data file for the dates in range"""
+    journal_file = os.path.splitext(path)[0] + ".journal"
+    snapshot, events = EventJournal(path, journal_file).read(repair=False)
+    if not isinstance(snapshot, dict) or not isinstance(snapshot.get("records"), dict):
+        raise ValueError("not a time records file")
+
+    records = {date_str: record for date_str, record in snapshot.get("records", {}).items()
+               if start_str <= date_str <= end_str}
+    state = snapshot.get("current_state", {})
+    for event in events:
+        records.update((date_str, record) for date_str, record in event.get("records", {}).items()
+                       if start_str <= date_str <= end_str)
+        state = event.get("state", state)
+
+    days = worked = breaks = 0
+    for record in records.values():
+        days += 1
+        worked += _seconds(record["total_time"])
+        breaks += _seconds(record["breaks"])
+    return {
+        "user": user_id(path),
+        "days": days,
+        "worked_seconds": worked,
+        "break_seconds": breaks,
+        "worked_hours": round(worked / 3600, 2),
+        "open_session": state.get("state", "clocked_out") != "clocked_out",
+        "file": path,
+    }
+
+def summarize_chunk(paths, start_str, end_str):
+    """Summarize a chunk of files in a worker, turning failures into error rows"""
+    rows = []
+    for path in paths:
+        try:
+            rows.append(summarize_file(path, start_str, end_str))
+        except Exception as e:
+            rows.append({"file": path, "error": f"{type(e).__name__}: {e}"})
+    return rows
+
+def _chunks(paths, size):
+    chunk = []
+    for path in paths:
+        chunk.append(path)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def summarize(paths, start_date, end_date, workers=None, chunksize=64):
+    """Yield a row per file, in order, keeping only a few chunks in flight"""
+    start_str, end_str = start_date.isoformat(), end_date.isoformat()
+    chunks = _chunks(paths, chunksize)
+    if workers == 1:
+        for chunk in chunks:
+            yield from summarize_chunk(chunk, start_str, end_str)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as pool:
+        # A bounded window keeps pending results from piling up in memory
+        window = 4 * workers
+        pending = []
+        for chunk in chunks:
+            pending.append(pool.submit(summarize_chunk, chunk, start_str, end_str))
+            if len(pending) >= window:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+class CsvWriter:
+    def __init__(self, out_file):
+        self.writer = csv.writer(out_file)
+        self.writer.writerow(FIELDS)
+
+    def write(self, row):
+        self.writer.writerow([row[field] for field in FIELDS])
+
+    def close(self):
+        pass
+
+class JsonWriter:
+    """A JSON array written one element at a time"""
+
+    def __init__(self, out_file):
+        self.out_file = out_file
+        self.count = 0
+        out_file.write("[")
+
+    def write(self, row):
+        self.out_file.write((",\n" if self.count else "\n") + json.dumps(row))
+        self.count += 1
+
+    def close(self):
+        self.out_file.write("\n]\n")
+
+def _month(text):
+    start = date.fromisoformat(text + "-01")
+    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Total worked time per user over many data files.")
+    parser.add_argument("paths", nargs="+", help="JSON data files or directories searched for them; "
+                             "SQLite and sharded users are not covered")
+    parser.add_argument("--month", type=_month, help="pay period YYYY-MM (default: last month)")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat, help="first date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, help="last date, YYYY-MM-DD")
+    parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    parser.add_argument("--output", help="write the report here (default: stdout)")
+    parser.add_argument("--workers", type=int, help="worker processes, 1 to run inline (default: CPU count)")
+    parser.add_argument("--chunksize", type=int, default=64, help="files handed to a worker at a time")
+    args = parser.parse_args(argv)
+
+    if args.start or args.end:
+        if not (args.start and args.end) or args.month:
+            parser.error("give both --from and --to, or --month")
+        start, end = args.start, args.end
+    else:
+        start, end = args.month or _month((date.today().replace(day=1) - timedelta(days=1)).strftime("%Y-%m"))
+
+    out_file = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        writer = (CsvWriter if args.format == "csv" else JsonWriter)(out_file)
+        began = time.perf_counter()
+        count = failed = 0
+        for row in summarize(find_files(args.paths), start, end, args.workers, args.chunksize):
+            count += 1
+            if "error" in row:
+                failed += 1
+                print(f"skipped {row['file']}: {row['error']}", file=sys.stderr)
+            else:
+                writer.write(row)
+        writer.close()
+    finally:
+        if args.output:
+            out_file.close()
+
+    elapsed = time.perf_counter() - began
+    print(f"{count} files {start} to {end} in {elapsed:.2f}s "
+          f"({count / elapsed if elapsed else 0:.0f} files/s), {failed} failed", file=sys.stderr)
+    return 1 if failed == count and count else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,779 @@
+import hashlib
+import json
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping, MutableMapping
+from datetime import date, datetime, timedelta
+from timezones import DAY, EPOCH_ORDINAL
+
+RECORD_FIELDS = ("total_time", "breaks", "clock_in", "clock_out")
+
+# Version 1 stored formatted strings, version 2 stores integer seconds,
+# version 3 adds the sessions the daily records are summed from
+RECORD_SCHEMA = 3
+
+def parse_duration(text):
+    """Parse a legacy "7h 32m 10s" duration string into seconds"""
+    seconds = 0
+    for part in text.split():
+        value, unit = int(part[:-1]), part[-1]
+        seconds += value * {'h': 3600, 'm': 60, 's': 1}[unit]
+    return seconds
+
+def upgrade_record(date_str, record, tz):
+    """Convert a version 1 record of strings into integer seconds.
+
+    Legacy clock times only kept hours and minutes in the local timezone,
+    so they are anchored to the record date. A clock out earlier than the
+    clock in belongs to the next day.
+    """
+    if not isinstance(record.get("total_time"), str):
+        return record
+
+    def to_epoch(clock_str, day):
+        local = datetime.strptime(f"{day} {clock_str}", "%Y-%m-%d %H:%M")
+        return int(tz.localize(local).timestamp())
+
+    clock_in = to_epoch(record["clock_in"], date_str)
+    clock_out = to_epoch(record["clock_out"], date_str)
+    if clock_out < clock_in:
+        next_day = (date.fromisoformat(date_str) + timedelta(days=1)).isoformat()
+        clock_out = to_epoch(record["clock_out"], next_day)
+
+    return {
+        "total_time": parse_duration(record["total_time"]),
+        "breaks": parse_duration(record["breaks"]),
+        "clock_in": clock_in,
+        "clock_out": clock_out
+    }
+
+class DayRecord(Mapping):
+    """One day's totals in slots, read like the record dict it stands for"""
+
+    __slots__ = RECORD_FIELDS
+
+    def __init__(self, total_time, breaks, clock_in, clock_out):
+        self.total_time = total_time
+        self.breaks = breaks
+        self.clock_in = clock_in
+        self.clock_out = clock_out
+
+    def __getitem__(self, field):
+        if field not in RECORD_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __iter__(self):
+        return iter(RECORD_FIELDS)
+
+    def __len__(self):
+        return len(RECORD_FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+class RecordTable(MutableMapping):
+    """Daily records held in typed columns sorted by date.
+
+    Behaves as a dict of date string to record, but a day costs five
+    array slots instead of a dict and a key string. Reads build DayRecord
+    views on demand. Records still in the version 1 string format are
+    kept aside as dicts until the core upgrades them.
+    """
+
+    def __init__(self, records=None):
+        self.days = array('l')  # Day ordinals, ascending
+        self.columns = {field: array('q') for field in RECORD_FIELDS}
+        self.legacy = {}
+        if records:
+            self.update(records)
+
+    def _find(self, date_str):
+        """(ordinal, row, whether the row holds that day)"""
+        try:
+            day = date.fromisoformat(date_str).toordinal()
+        except (TypeError, ValueError):
+            raise KeyError(date_str)
+        row = bisect_left(self.days, day)
+        return day, row, row < len(self.days) and self.days[row] == day
+
+    def _row(self, row):
+        return DayRecord(*(self.columns[field][row] for field in RECORD_FIELDS))
+
+    def __getitem__(self, date_str):
+        if self.legacy and date_str in self.legacy:
+            return self.legacy[date_str]
+        _, row, found = self._find(date_str)
+        if not found:
+            raise KeyError(date_str)
+        return self._row(row)
+
+    def __setitem__(self, date_str, record):
+        if isinstance(record["total_time"], str):
+            if date_str in self:
+                del self[date_str]
+            self.legacy[date_str] = record
+            return
+        self.legacy.pop(date_str, None)
+        day, row, found = self._find(date_str)
+        if found:
+            for field, column in self.columns.items():
+                column[row] = record[field]
+        else:
+            self.days.insert(row, day)
+            for field, column in self.columns.items():
+                column.insert(row, record[field])
+
+    def __delitem__(self, date_str):
+        if date_str in self.legacy:
+            del self.legacy[date_str]
+            return
+        _, row, found = self._find(date_str)
+        if not found:
+            raise KeyError(date_str)
+        del self.days[row]
+        for column in self.columns.values():
+            del column[row]
+
+    def __contains__(self, date_str):
+        if date_str in self.legacy:
+            return True
+        try:
+            return self._find(date_str)[2]
+        except KeyError:
+            return False
+
+    def __iter__(self):
+        dates = (date.fromordinal(day).isoformat() for day in self.days)
+        if self.legacy:
+            return iter(sorted([*dates, *self.legacy]))
+        return dates
+
+    def __len__(self):
+        return len(self.days) + len(self.legacy)
+
+    def items(self):
+        if self.legacy:
+            return ((date_str, self[date_str]) for date_str in self)
+        return ((date.fromordinal(self.days[row]).isoformat(), self._row(row))
+                for row in range(len(self.days)))
+
+    def values(self):
+        return (record for _, record in self.items())
+
+    def clear(self):
+        self.days = array('l')
+        self.columns = {field: array('q') for field in RECORD_FIELDS}
+        self.legacy = {}
+
+    def update(self, records=(), **kwargs):
+        """Store many records, re-sorting once when they do not simply append"""
+        rows = {}
+        for date_str, record in (records.items() if hasattr(records, 'items') else records):
+            if isinstance(record["total_time"], str):
+                self[date_str] = record
+            else:
+                self.legacy.pop(date_str, None)
+                rows[date.fromisoformat(date_str).toordinal()] = tuple(record[f] for f in RECORD_FIELDS)
+        for date_str, record in kwargs.items():
+            self[date_str] = record
+        if len(rows) < 64:
+            for day, values in rows.items():
+                self[date.fromordinal(day).isoformat()] = dict(zip(RECORD_FIELDS, values))
+            return
+
+        # Merge existing rows with the new ones, new values winning
+        merged = dict(zip(self.days, zip(*self.columns.values())))
+        merged.update(rows)
+        days = sorted(merged)
+        self.days = array('l', days)
+        for i, field in enumerate(RECORD_FIELDS):
+            self.columns[field] = array('q', (merged[day][i] for day in days))
+
+    def between(self, start_str, end_str):
+        """Records in a date range, sliced out by binary search"""
+        lo = bisect_left(self.days, date.fromisoformat(start_str).toordinal())
+        hi = bisect_right(self.days, date.fromisoformat(end_str).toordinal())
+        result = {date.fromordinal(self.days[row]).isoformat(): self._row(row) for row in range(lo, hi)}
+        for date_str, record in self.legacy.items():
+            if start_str <= date_str <= end_str:
+                result[date_str] = record
+        return result
+
+    def to_dict(self):
+        """Plain dict of record dicts, for serializing"""
+        result = dict(self.legacy)
+        dates = (date.fromordinal(day).isoformat() for day in self.days)
+        for date_str, values in zip(dates, zip(*self.columns.values())):
+            result[date_str] = dict(zip(RECORD_FIELDS, values))
+        return result
+
+    def copy(self):
+        """Independent copy, cheap since the columns are flat arrays"""
+        table = RecordTable()
+        table.days = array('l', self.days)
+        table.columns = {field: array('q', column) for field, column in self.columns.items()}
+        table.legacy = dict(self.legacy)
+        return table
+
+class RecordColumns:
+    """Column-oriented copy of the history, sorted by date.
+
+    Dates are day ordinals and durations are seconds held in typed
+    arrays, so reports can slice and sum without touching the record
+    dicts or parsing anything.
+    """
+
+    def __init__(self, days=None, worked=None, breaks=None):
+        self.days = days if days is not None else array('l')
+        self.worked = worked if worked is not None else array('q')
+        self.breaks = breaks if breaks is not None else array('q')
+
+    @classmethod
+    def from_records(cls, records):
+        if isinstance(records, RecordTable) and not records.legacy:
+            return cls(array('l', records.days), array('q', records.columns["total_time"]),
+                       array('q', records.columns["breaks"]))
+        columns = cls()
+        for date_str in sorted(records):
+            record = records[date_str]
+            columns.days.append(date.fromisoformat(date_str).toordinal())
+            columns.worked.append(record["total_time"])
+            columns.breaks.append(record["breaks"])
+        return columns
+
+    def __len__(self):
+        return len(self.days)
+
+    def _bounds(self, start_date, end_date):
+        lo = bisect_left(self.days, start_date.toordinal())
+        hi = bisect_right(self.days, end_date.toordinal())
+        return lo, hi
+
+    def between(self, start_date, end_date):
+        """Columns for dates from start_date to end_date inclusive"""
+        lo, hi = self._bounds(start_date, end_date)
+        return RecordColumns(self.days[lo:hi], self.worked[lo:hi], self.breaks[lo:hi])
+
+    def totals(self):
+        """Total (worked, break) seconds over all rows"""
+        return sum(self.worked), sum(self.breaks)
+
+    def totals_between(self, start_date, end_date):
+        """Total (worked, break) seconds for a date range"""
+        lo, hi = self._bounds(start_date, end_date)
+        return sum(self.worked[lo:hi]), sum(self.breaks[lo:hi])
+
+    def dates(self):
+        """Row dates as date objects"""
+        return (date.fromordinal(day) for day in self.days)
+
+class FenwickTree:
+    """Binary indexed tree over integer values for prefix sums in O(log n)"""
+
+    def __init__(self, values):
+        # Linear-time build: push each node's sum up to its parent once
+        self.tree = array('q', [0])
+        self.tree.extend(values)
+        size = len(self.tree)
+        for i in range(1, size):
+            parent = i + (i & -i)
+            if parent < size:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, index, delta):
+        """Add delta to the value at index"""
+        i = index + 1
+        size = len(self.tree)
+        while i < size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, count):
+        """Sum of the first count values"""
+        total = 0
+        i = min(count, len(self.tree) - 1)
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+class DailyTotalsIndex:
+    """Worked and break seconds per day, answering range sums in O(log n).
+
+    Days are slots counted from the earliest recorded day. The slot
+    arrays grow by doubling when a later day arrives and are rebuilt
+    when an earlier one does, so updates stay incremental in practice.
+    """
+
+    def __init__(self):
+        self.base = None  # Ordinal of slot 0
+        self.last = None  # Ordinal of the latest day set
+        self.worked = array('q')
+        self.breaks = array('q')
+        self.worked_tree = FenwickTree(self.worked)
+        self.breaks_tree = FenwickTree(self.breaks)
+
+    @classmethod
+    def from_records(cls, records):
+        index = cls()
+        if isinstance(records, RecordTable) and not records.legacy:
+            days = list(zip(records.days, records.columns["total_time"], records.columns["breaks"]))
+        else:
+            days = [(date.fromisoformat(date_str).toordinal(), record["total_time"], record["breaks"])
+                    for date_str, record in records.items()]
+        if days:
+            first = min(day for day, _, _ in days)
+            last = max(day for day, _, _ in days)
+            index._resize(first, last - first + 1)
+            index.last = last
+            for day, worked, breaks in days:
+                slot = day - first
+                index.worked[slot] = worked
+                index.breaks[slot] = breaks
+            index._rebuild()
+        return index
+
+    def _resize(self, base, size):
+        """Re-anchor the slot arrays at base with room for size days"""
+        worked = array('q', [0]) * size
+        breaks = array('q', [0]) * size
+        if self.base is not None:
+            shift = self.base - base
+            worked[shift:shift + len(self.worked)] = self.worked
+            breaks[shift:shift + len(self.breaks)] = self.breaks
+        self.base = base
+        self.worked = worked
+        self.breaks = breaks
+
+    def _rebuild(self):
+        self.worked_tree = FenwickTree(self.worked)
+        self.breaks_tree = FenwickTree(self.breaks)
+
+    def set_day(self, day, worked_seconds, break_seconds):
+        """Store the totals of one day, replacing any previous value"""
+        ordinal = day.toordinal()
+        if self.base is None:
+            self._resize(ordinal, 64)
+            self._rebuild()
+        elif ordinal < self.base or ordinal - self.base >= len(self.worked):
+            first = min(self.base, ordinal)
+            last = max(self.base + len(self.worked) - 1, ordinal)
+            self._resize(first, 2 * (last - first + 1))
+            self._rebuild()
+
+        self.last = ordinal if self.last is None else max(self.last, ordinal)
+        slot = ordinal - self.base
+        self.worked_tree.add(slot, worked_seconds - self.worked[slot])
+        self.breaks_tree.add(slot, break_seconds - self.breaks[slot])
+        self.worked[slot] = worked_seconds
+        self.breaks[slot] = break_seconds
+
+    def first_date(self):
+        """Earliest day that has ever held a value, or None"""
+        return date.fromordinal(self.base) if self.base is not None else None
+
+    def last_date(self):
+        """Latest day that has ever held a value, or None"""
+        return date.fromordinal(self.last) if self.last is not None else None
+
+    def totals_between(self, start_date, end_date):
+        """Total (worked, break) seconds from start_date to end_date inclusive"""
+        if self.base is None:
+            return 0, 0
+        lo = max(start_date.toordinal() - self.base, 0)
+        hi = end_date.toordinal() - self.base + 1
+        if hi <= lo:
+            return 0, 0
+        worked = self.worked_tree.prefix_sum(hi) - self.worked_tree.prefix_sum(lo)
+        breaks = self.breaks_tree.prefix_sum(hi) - self.breaks_tree.prefix_sum(lo)
+        return worked, breaks
+
+class IntervalIndex:
+    """[start, end) intervals sorted by start, with prefix sums of their union.
+
+    Starts and ends live in typed arrays, so "seconds covered between T1
+    and T2" and "intervals overlapping [T1, T2)" are binary searches plus
+    a prefix sum difference. Intervals may overlap, time covered twice
+    counts once. Appending in time order is O(1); an insertion in the
+    middle rebuilds the prefix sums after it.
+    """
+
+    def __init__(self):
+        self.starts = array('q')
+        self.ends = array('q')
+        self.reach = array('q')  # reach[i] = latest end among the first i + 1 intervals
+        self.prefix = array('q', [0])  # prefix[i] = time covered by the first i intervals
+        self.owners = []  # Session id of each interval
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _rebuild_prefix(self, pos):
+        del self.prefix[pos + 1:]
+        del self.reach[pos:]
+        total = self.prefix[pos]
+        reach = self.reach[pos - 1] if pos else None
+        for i in range(pos, len(self.starts)):
+            start, end = self.starts[i], self.ends[i]
+            if reach is None or start >= reach:
+                total += end - start
+                reach = end
+            elif end > reach:
+                total += end - reach  # Only the part past the earlier intervals
+                reach = end
+            self.reach.append(reach)
+            self.prefix.append(total)
+
+    def add(self, start, end, owner):
+        if end <= start:
+            return
+        pos = bisect_right(self.starts, start)
+        self.starts.insert(pos, start)
+        self.ends.insert(pos, end)
+        self.owners.insert(pos, owner)
+        if pos == len(self.starts) - 1 and (not pos or self.reach[-1] <= start):
+            self.reach.append(end)
+            self.prefix.append(self.prefix[-1] + end - start)
+        else:
+            self._rebuild_prefix(pos)
+
+    def add_many(self, intervals):
+        """Add (start, end, owner) intervals, re-sorting once instead of per insert"""
+        intervals = [interval for interval in intervals if interval[1] > interval[0]]
+        if len(intervals) < 16:
+            for start, end, owner in intervals:
+                self.add(start, end, owner)
+            return
+        merged = sorted(list(zip(self.starts, self.ends, self.owners)) + intervals)
+        self.starts = array('q', (interval[0] for interval in merged))
+        self.ends = array('q', (interval[1] for interval in merged))
+        self.owners = [interval[2] for interval in merged]
+        self._rebuild_prefix(0)
+
+    def remove_owner(self, owner, start, end):
+        """Remove the intervals of one owner lying within [start, end)"""
+        lo = bisect_left(self.starts, start)
+        hi = bisect_left(self.starts, end)
+        keep = [i for i in range(lo, hi) if self.owners[i] != owner]
+        if len(keep) == hi - lo:
+            return
+        for name in ('starts', 'ends'):
+            column = getattr(self, name)
+            column[lo:hi] = array('q', (column[i] for i in keep))
+        self.owners[lo:hi] = [self.owners[i] for i in keep]
+        self._rebuild_prefix(lo)
+
+    def _covered_before(self, t):
+        """Seconds covered before t"""
+        j = bisect_left(self.starts, t)
+        if not j:
+            return 0
+        # The intervals begun before t cover one stretch past it at most
+        return self.prefix[j] - max(0, self.reach[j - 1] - t)
+
+    def total_between(self, t1, t2):
+        """Seconds covered by intervals within [t1, t2)"""
+        if t2 <= t1:
+            return 0
+        return self._covered_before(t2) - self._covered_before(t1)
+
+    def overlapping(self, t1, t2):
+        """(start, end, owner) of every interval overlapping [t1, t2), by start"""
+        # Intervals before i end by t1 at the latest, reach only grows
+        i, j = bisect_right(self.reach, t1), bisect_left(self.starts, t2)
+        return [(self.starts[k], self.ends[k], self.owners[k]) for k in range(i, j) if self.ends[k] > t1]
+
+def clip_session(session, start, end, session_id):
+    """The part of a session within [start, end), as a session of its own"""
+    part = {
+        "id": session_id,
+        "start": max(session["start"], start),
+        "end": min(session["end"], end),
+        "breaks": [[max(b_start, start), min(b_end, end)] for b_start, b_end in session.get("breaks", [])
+                   if b_start < end and b_end > start]
+    }
+    if session.get("tags"):
+        part["tags"] = list(session["tags"])
+    return part
+
+def work_intervals(session):
+    """Split a session into the [start, end) intervals worked between breaks"""
+    intervals = []
+    cursor = session["start"]
+    for break_start, break_end in sorted(session.get("breaks", [])):
+        if break_start > cursor:
+            intervals.append((cursor, break_start))
+        cursor = max(cursor, break_end)
+    if session["end"] > cursor:
+        intervals.append((cursor, session["end"]))
+    return intervals
+
+def session_from_record(date_str, record, session_id=None):
+    """Build a session for a day that only has totals.
+
+    Where the breaks fell is unknown, so they are placed after the work.
+    """
+    start = record["clock_in"]
+    work_end = start + record["total_time"]
+    end = work_end + record["breaks"]
+    return {
+        "id": session_id or f"day-{date_str}",
+        "start": start,
+        "end": end,
+        "breaks": [[work_end, end]] if record["breaks"] else []
+    }
+
+class SessionIndex:
+    """Work and break intervals of every session, indexed by time.
+
+    Daily records are sums over this index, so several sessions on one
+    day add up and a session crossing midnight counts towards both days.
+    """
+
+    def __init__(self):
+        self.work = IntervalIndex()
+        self.breaks = IntervalIndex()
+        self.presence = IntervalIndex()  # Session spans, one second at least
+        self.spans = {}  # Session id -> (start, end)
+
+    @classmethod
+    def from_sessions(cls, sessions):
+        index = cls()
+        index.add(sessions.values())
+        return index
+
+    def add(self, sessions):
+        """Index sessions, replacing any already indexed under the same id"""
+        work = []
+        breaks = []
+        presence = []
+        for session in sessions:
+            session_id = session["id"]
+            if session_id in self.spans:
+                self.remove(session_id)
+            self.spans[session_id] = (session["start"], session["end"])
+            work.extend((start, end, session_id) for start, end in work_intervals(session))
+            breaks.extend((start, end, session_id) for start, end in session.get("breaks", []))
+            presence.append((session["start"], max(session["end"], session["start"] + 1), session_id))
+        self.work.add_many(work)
+        self.breaks.add_many(breaks)
+        self.presence.add_many(presence)
+
+    def remove(self, session_id):
+        span = self.spans.pop(session_id, None)
+        if span:
+            self.work.remove_owner(session_id, *span)
+            self.breaks.remove_owner(session_id, *span)
+            self.presence.remove_owner(session_id, span[0], span[0] + 1)
+
+    def worked_between(self, start, end):
+        """Seconds worked within [start, end)"""
+        return self.work.total_between(start, end)
+
+    def sessions_between(self, start, end):
+        """Ids of sessions with work overlapping [start, end), in time order"""
+        ids = {}
+        for _, _, session_id in self.work.overlapping(start, end):
+            ids[session_id] = None
+        return list(ids)
+
+    def sessions_touching(self, start, end):
+        """Ids of sessions overlapping [start, end), with work or not, in time order"""
+        return [session_id for _, _, session_id in self.presence.overlapping(start, end)]
+
+    def day_record(self, start, end):
+        """Sum the sessions within [start, end) into a daily record, None if
+        no session is there. A day spent on a break still gets a record."""
+        present = self.presence.overlapping(start, end)
+        if not present:
+            return None
+        return {
+            "total_time": self.work.total_between(start, end),
+            "breaks": self.breaks.total_between(start, end),
+            "clock_in": max(start, present[0][0]),
+            "clock_out": min(end, max(self.spans[session_id][1] for _, _, session_id in present))
+        }
+
+def session_digest(session):
+    """Hash of a session's canonical JSON, equal on every machine"""
+    return hashlib.blake2b(json.dumps(session, sort_keys=True, separators=(',', ':')).encode(),
+                           digest_size=16).hexdigest()
+
+def tombstone(session):
+    """What is kept of a removed session, so that other replicas remove it too"""
+    return {"id": session["id"], "start": session["start"], "end": session["end"], "removed": True}
+
+def preferred(a, b):
+    """Which of two conflicting sessions every replica keeps: a removal,
+    else the one ending later, ties broken by the canonical JSON"""
+    key_a = (bool(a.get("removed")), a["end"], json.dumps(a, sort_keys=True))
+    key_b = (bool(b.get("removed")), b["end"], json.dumps(b, sort_keys=True))
+    return a if key_a >= key_b else b
+
+def combine_digests(parts):
+    """Hash of an ordered sequence of strings"""
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part.encode())
+        h.update(b'\n')
+    return h.hexdigest()
+
+def session_day(start):
+    """UTC date a session began on as YYYY-MM-DD, the same in every timezone"""
+    return date.fromordinal(EPOCH_ORDINAL + start // DAY).isoformat()
+
+class SessionHashTree:
+    """Hashes of the sessions begun on each UTC day, month and year.
+
+    Two replicas holding the same sessions have the same hashes, so the
+    days they disagree on are found by comparing years, then the months of
+    differing years, then the days of differing months. A change only marks
+    its day, the hashes above it are recomputed on the next read.
+    """
+
+    def __init__(self):
+        self.day_sessions = {}  # Day -> {session id: digest}
+        self.session_days = {}  # Session id -> day
+        self.keys = {"": set()}  # "", year or month -> keys one level down
+        self.hashes = {}  # Year, month or day -> hash
+        self.dirty = set()  # Days changed since hashes were last computed
+
+    @classmethod
+    def from_sessions(cls, sessions):
+        tree = cls()
+        tree.add(sessions.values())
+        return tree
+
+    def add(self, sessions):
+        """Hash sessions, replacing any already held under the same id"""
+        for session in sessions:
+            session_id = session["id"]
+            self.remove(session_id)
+            day = session_day(session["start"])
+            self.day_sessions.setdefault(day, {})[session_id] = session_digest(session)
+            self.session_days[session_id] = day
+            self.dirty.add(day)
+
+    def remove(self, session_id):
+        day = self.session_days.pop(session_id, None)
+        if day is not None:
+            day_sessions = self.day_sessions[day]
+            del day_sessions[session_id]
+            if not day_sessions:
+                del self.day_sessions[day]
+            self.dirty.add(day)
+
+    def _update(self):
+        if not self.dirty:
+            return
+        days, self.dirty = self.dirty, set()
+        months = set()
+        for day in days:
+            month, year = day[:7], day[:4]
+            digests = self.day_sessions.get(day)
+            if digests:
+                self.hashes[day] = combine_digests(sorted(digests.values()))
+                self.keys.setdefault(year, set()).add(month)
+                self.keys.setdefault(month, set()).add(day)
+                self.keys[""].add(year)
+            else:
+                self.hashes.pop(day, None)
+                self.keys.get(month, set()).discard(day)
+            months.add(month)
+        years = set()
+        for month in months:
+            self._rehash(month, month[:4])
+            years.add(month[:4])
+        for year in years:
+            self._rehash(year, "")
+
+    def _rehash(self, key, parent):
+        children = self.keys.get(key)
+        if children:
+            self.hashes[key] = combine_digests(f"{child} {self.hashes[child]}" for child in sorted(children))
+        else:
+            self.hashes.pop(key, None)
+            self.keys.pop(key, None)
+            self.keys.get(parent, set()).discard(key)
+
+    def root(self):
+        """Hash over every session"""
+        return combine_digests(f"{year} {digest}" for year, digest in sorted(self.children("").items()))
+
+    def children(self, key):
+        """{key: hash} one level below "" (years), a year (months) or a month (days)"""
+        self._update()
+        return {child: self.hashes[child] for child in self.keys.get(key, ())}
+
+    def session_ids(self, days):
+        """Ids of the sessions begun on the given days"""
+        return [session_id for day in days for session_id in self.day_sessions.get(day, ())]
+
+def normalize_tags(tags):
+    """Sorted unique tags from comma separated strings, or an iterable of them"""
+    if isinstance(tags, str):
+        tags = [tags]
+    return sorted({tag.strip() for text in tags or () for tag in text.split(',') if tag.strip()})
+
+def tag_entry(session):
+    """What a tag index keeps per session: [start, end, worked, break seconds]"""
+    worked = sum(end - start for start, end in work_intervals(session))
+    breaks = sum(end - start for start, end in session.get("breaks", []))
+    return [session["start"], session["end"], worked, breaks]
+
+class TagIndex:
+    """Inverted index from tag to the sessions carrying it.
+
+    Entries hold each session's span and totals, so a tag's totals only
+    need the sessions themselves where a range cuts through them.
+    """
+
+    def __init__(self):
+        self.tags = {}  # Tag -> {session id: tag_entry()}
+        self.session_tags = {}  # Session id -> its tags
+
+    @classmethod
+    def from_sessions(cls, sessions):
+        index = cls()
+        index.add(sessions.values())
+        return index
+
+    def clear(self):
+        self.tags.clear()
+        self.session_tags.clear()
+
+    def load(self, tags):
+        """Take over a stored to_dict(), sparing a pass over the sessions"""
+        for tag, entries in tags.items():
+            self.tags[tag] = entries
+            for session_id in entries:
+                self.session_tags.setdefault(session_id, []).append(tag)
+
+    def add(self, sessions):
+        """Index the tags of sessions, replacing any indexed under the same id"""
+        for session in sessions:
+            self.remove(session["id"])
+            tags = session.get("tags")
+            if tags:
+                entry = tag_entry(session)
+                for tag in tags:
+                    self.tags.setdefault(tag, {})[session["id"]] = entry
+                self.session_tags[session["id"]] = list(tags)
+
+    def remove(self, session_id):
+        for tag in self.session_tags.pop(session_id, ()):
+            entries = self.tags[tag]
+            entries.pop(session_id, None)
+            if not entries:
+                del self.tags[tag]
+
+    def sessions(self, tag):
+        """{session id: [start, end, worked, breaks]} of the sessions with a tag"""
+        return self.tags.get(tag, {})
+
+    def names(self):
+        return sorted(self.tags)
+
+    def to_dict(self):
+        return {tag: dict(entries) for tag, entries in self.tags.items()}
\ No newline at end of file
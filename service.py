@@ -0,0 +1,213 @@
+"""HTTP/JSON tracking service hosting one TimeTrackerCore per user.
+
+    POST /users/<id>/clock_in | clock_out | break_in | break_out
+    GET  /users/<id>/status
+    GET  /metrics
+
+Each user's core lives in memory for the life of the process. Transitions
+of one user run one at a time under that user's lock, while different
+users never wait on each other. Events are buffered and written in
+batches every flush interval instead of once per request.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import sys
+import metrics
+from storage import BufferedStorage, JsonStorage
+from time_tracker_core import TimeTrackerCore
+
+USER_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 409: "Conflict"}
+
+class TrackingService:
+    def __init__(self, data_dir, flush_interval=0.5, max_parallel_flushes=32):
+        self.data_dir = data_dir
+        self.flush_interval = flush_interval
+        self.cores = {}
+        self.locks = {}
+        self.dirty = set()  # Users with buffered events
+        self.flush_slots = asyncio.Semaphore(max_parallel_flushes)
+        os.makedirs(data_dir, exist_ok=True)
+
+    def _lock(self, user_id):
+        lock = self.locks.get(user_id)
+        if lock is None:
+            lock = self.locks[user_id] = asyncio.Lock()
+        return lock
+
+    def _open_core(self, user_id):
+        path = os.path.join(self.data_dir, f"{user_id}.json")
+        # The service is the only writer of its data directory
+        return TimeTrackerCore(storage=BufferedStorage(JsonStorage(path), shared=False))
+
+    async def _get_core(self, user_id):
+        """Get a user's core, loading it off the event loop on first use"""
+        core = self.cores.get(user_id)
+        if core is None:
+            loop = asyncio.get_running_loop()
+            core = await loop.run_in_executor(None, self._open_core, user_id)
+            self.cores[user_id] = core
+        return core
+
+    def _status(self, core):
+        worked_time, time_left = core.calculate_current_times()
+        return {
+            "state": core.current_state,
+            "worked_seconds": int(worked_time.total_seconds()),
+            "time_left_seconds": int(time_left.total_seconds())
+        }
+
+    async def transition(self, user_id, name):
+        async with self._lock(user_id):
+            core = await self._get_core(user_id)
+            if not core.can(name):
+                return 409, {"error": f"cannot {name} while {core.current_state}",
+                             **self._status(core)}
+            getattr(core, name)()
+            self.dirty.add(user_id)
+            return 200, self._status(core)
+
+    async def status(self, user_id):
+        async with self._lock(user_id):
+            core = await self._get_core(user_id)
+        return 200, self._status(core)
+
+    async def _flush_user(self, user_id):
+        async with self.flush_slots, self._lock(user_id):
+            storage = self.cores[user_id].storage
+            loop = asyncio.get_running_loop()
+            try:
+                await loop.run_in_executor(None, storage.flush)
+            except Exception:
+                self.dirty.add(user_id)  # The events are still buffered, try again next time
+                raise
+
+    async def flush(self):
+        """Persist the buffered events of every user that has any. Every
+        user is attempted, then the first failure is raised."""
+        users, self.dirty = self.dirty, set()
+        if users:
+            results = await asyncio.gather(*(self._flush_user(user_id) for user_id in users),
+                                           return_exceptions=True)
+            errors = [result for result in results if isinstance(result, Exception)]
+            if errors:
+                raise errors[0]
+
+    async def flush_forever(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Flush failed, retrying: {e}", file=sys.stderr)
+
+    async def route(self, method, path):
+        if path == "/metrics" and method == "GET":
+            return 200, metrics.registry.render()
+        parts = path.strip('/').split('/')
+        if len(parts) != 3 or parts[0] != "users" or not USER_ID.match(parts[1]):
+            return 404, {"error": "not found"}
+        user_id, action = parts[1], parts[2]
+
+        if action == "status":
+            if method != "GET":
+                return 405, {"error": "use GET"}
+            return await self.status(user_id)
+        if action in TimeTrackerCore.TRANSITIONS:
+            if method != "POST":
+                return 405, {"error": "use POST"}
+            return await self.transition(user_id, action)
+        return 404, {"error": "not found"}
+
+    async def handle_client(self, reader, writer):
+        """Serve HTTP/1.1 requests on one keep-alive connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "bad request line"}, False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length', 0))
+                if length:
+                    await reader.readexactly(length)  # Bodies are not used
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                code, body = await self.route(method, path)
+                await self._respond(writer, code, body, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, code, body, keep_alive):
+        if isinstance(body, str):
+            payload, content_type = body.encode(), "text/plain; version=0.0.4"
+        else:
+            payload, content_type = json.dumps(body).encode(), "application/json"
+        head = (f"HTTP/1.1 {code} {REASONS[code]}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode() + payload)
+        await writer.drain()
+
+    async def serve(self, host, port, ready=None):
+        server = await asyncio.start_server(self.handle_client, host, port, backlog=1024)
+        flusher = asyncio.create_task(self.flush_forever())
+        try:
+            # Stop cleanly on SIGTERM so buffered events are flushed
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except NotImplementedError:
+            pass  # Not available on Windows
+        if ready is not None:
+            ready.set_result(server.sockets[0].getsockname()[1])
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            flusher.cancel()
+            await self.flush()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the multi-user tracking service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--data-dir", default="users")
+    parser.add_argument("--flush-interval", type=float, default=0.5,
+                        help="seconds between batched writes")
+    parser.add_argument("--metrics", action="store_true",
+                        help="record latency histograms, served on /metrics")
+    args = parser.parse_args(argv)
+    if args.metrics:
+        metrics.enable()
+
+    service = TrackingService(args.data_dir, args.flush_interval)
+    print(f"Serving on http://{args.host}:{args.port}", flush=True)
+    try:
+        asyncio.run(service.serve(args.host, args.port))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,190 @@
+"""Accelerated simulation of the state machine on a virtual clock.
+
+    python simulate.py --days 1000000 --seed 1
+
+A core on a VirtualClock and in-memory storage works through the given
+number of virtual days: an idle gap, clock in, a few breaks, clock out.
+Sessions run across midnight, illegal transitions are tried along the
+way, and the wall clock is stepped mid-session like an NTP correction.
+Every transition is checked against the harness's own bookkeeping:
+
+- a transition succeeds exactly when the state allows it
+- worked time shown while clocked in is the elapsed time minus breaks
+- a session spans the elapsed time however the wall clock was stepped,
+  and its worked plus break time equals that span
+- the records of the days it touched grow by its worked and break time
+- the totals over the history equal the sum of every session
+
+Before that, a version 1 record running past midnight is upgraded and
+must book the hours after midnight to the next day, and only there.
+
+The core starts a fresh history every --history days, so memory stays
+flat however many days are simulated. Prints events per second.
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import date, timedelta
+from clock import VirtualClock
+from storage import MemoryStorage
+from time_tracker_core import TimeTrackerCore
+
+START = 946684800  # 2000-01-01 00:00 UTC
+
+class InvariantError(AssertionError):
+    pass
+
+def check(condition, message):
+    if not condition:
+        raise InvariantError(message)
+
+class Simulation:
+    def __init__(self, seed=0, history=3650):
+        self.rng = random.Random(seed)
+        self.clock = VirtualClock(START)
+        self.history = history
+        self.events = 0
+        self.days = 0
+        self.new_core()
+
+    def new_core(self):
+        self.core = TimeTrackerCore(storage=MemoryStorage(), clock=self.clock)
+        self.worked = self.breaks = 0  # Totals of every session so far
+
+    def transition(self, name):
+        """Take a transition, checking it succeeds exactly when the state allows it"""
+        state = self.core.current_state
+        allowed = self.core.can(name)
+        self.events += 1
+        check(getattr(self.core, name)() == allowed, f"{name} from {state} returned the wrong result")
+        if not allowed:
+            check(self.core.current_state == state, f"refused {name} changed the state")
+
+    def try_illegal(self):
+        """Attempt a transition the current state does not allow"""
+        names = [name for name in self.core.TRANSITIONS if not self.core.can(name)]
+        self.transition(self.rng.choice(names))
+
+    def day_totals(self, start, end):
+        worked = breaks = 0
+        for day in self.core.local_time.days_spanned(start, end):
+            record = self.core.time_records.get(day.isoformat())
+            if record:
+                worked += record["total_time"]
+                breaks += record["breaks"]
+        return worked, breaks
+
+    def run_day(self):
+        rng = self.rng
+        self.clock.advance(rng.randint(8 * 3600, 16 * 3600))
+        if rng.random() < 0.05:
+            self.try_illegal()
+        self.transition("clock_in")
+        session_elapsed = 0
+        session_breaks = 0
+
+        for _ in range(rng.randint(0, 3)):
+            work = rng.randint(1800, 3 * 3600)
+            self.clock.advance(work)
+            session_elapsed += work
+            if rng.random() < 0.02:
+                self.clock.step(rng.randint(-7200, 7200))
+            worked, _ = self.core.calculate_current_times()
+            check(worked == timedelta(seconds=session_elapsed - session_breaks),
+                  f"worked {worked} shown while clocked in, expected {session_elapsed - session_breaks}s")
+
+            self.transition("break_in")
+            if rng.random() < 0.05:
+                self.try_illegal()
+            pause = rng.randint(300, 3600)
+            self.clock.advance(pause)
+            session_elapsed += pause
+            session_breaks += pause
+            self.transition("break_out")
+
+        work = rng.randint(1800, 4 * 3600)
+        self.clock.advance(work)
+        session_elapsed += work
+        start = int(self.core.clock_in_time.timestamp())
+        end = start + session_elapsed
+        before = self.day_totals(start, end)
+        sessions_before = len(self.core.sessions)
+        self.transition("clock_out")
+
+        check(len(self.core.sessions) == sessions_before + 1, "clock_out did not record one session")
+        session = next(reversed(self.core.sessions.values()))  # The one just added
+        span = session["end"] - session["start"]
+        session_break = sum(b_end - b_start for b_start, b_end in session["breaks"])
+        check(span == session_elapsed, f"session spans {span}s, {session_elapsed}s elapsed")
+        check(session_break == session_breaks, f"session has {session_break}s of breaks, {session_breaks}s taken")
+        check(all(session["start"] <= b_start <= b_end <= session["end"] for b_start, b_end in session["breaks"]),
+              "break outside its session")
+
+        after = self.day_totals(start, end)
+        check((after[0] - before[0]) + (after[1] - before[1]) == span,
+              "worked plus break time recorded is not the session span")
+        check(after[0] - before[0] == span - session_break,
+              f"records grew by {after[0] - before[0]}s worked, session worked {span - session_break}s")
+        check(after[1] - before[1] == session_break,
+              f"records grew by {after[1] - before[1]}s of breaks, session took {session_break}s")
+        self.worked += span - session_break
+        self.breaks += session_break
+        self.days += 1
+
+    def check_totals(self):
+        first, last = self.core.get_history_bounds()
+        totals = self.core.get_totals_between(first, last)
+        check(totals == (self.worked, self.breaks),
+              f"history totals {totals}, sessions add up to {(self.worked, self.breaks)}")
+
+    def run(self, days):
+        for day in range(1, days + 1):
+            self.run_day()
+            if day % self.history == 0 or day == days:
+                self.check_totals()
+                self.new_core()
+
+def check_upgrade():
+    """Upgrade a version 1 record from 22:00 to 01:00 UTC, then work an hour the next day"""
+    storage = MemoryStorage()
+    storage.records.update({"2025-01-07": {"total_time": "3h 0m 0s", "breaks": "0h 0m 0s",
+                                           "clock_in": "22:00", "clock_out": "01:00"}})
+    storage.state = {"state": "clocked_out", "timezone": "UTC"}
+    clock = VirtualClock(1736326800)  # 2025-01-08 09:00 UTC
+    core = TimeTrackerCore(storage=storage, clock=clock)
+    worked = {date_str: record["total_time"] for date_str, record in core.time_records.items()}
+    check(worked == {"2025-01-07": 7200, "2025-01-08": 3600},
+          f"overnight legacy record upgraded to {worked}, expected 2h and 1h")
+    core.clock_in()
+    clock.advance(3600)
+    core.clock_out()
+    totals = core.get_totals_between(date(2025, 1, 7), date(2025, 1, 8))
+    check(totals == (4 * 3600, 0), f"totals {totals} after the upgrade, expected 4h worked")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate the state machine over many virtual days.")
+    parser.add_argument("--days", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history", type=int, default=3650, help="days kept before starting a fresh history")
+    args = parser.parse_args(argv)
+
+    simulation = Simulation(args.seed, args.history)
+    try:
+        check_upgrade()
+    except InvariantError as e:
+        print(f"Upgrade invariant broken: {e}", file=sys.stderr)
+        return 1
+    began = time.perf_counter()
+    try:
+        simulation.run(args.days)
+    except InvariantError as e:
+        print(f"Invariant broken on day {simulation.days + 1}: {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - began
+    print(f"{simulation.days} days, {simulation.events} events in {elapsed:.2f}s "
+          f"({simulation.events / elapsed:.0f} events/s, {simulation.days / elapsed:.0f} days/s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
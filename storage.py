@@ -0,0 +1,1343 @@
+import json
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from collections.abc import Mapping
+from contextlib import contextmanager
+from datetime import date
+from journal import EventJournal
+from metrics import timed
+from records import RecordTable, TagIndex, session_day, tag_entry
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+class FileLock:
+    """Advisory lock on a side file, shared by every process using the data.
+
+    Re-entrant within a process, so nested storage calls made while the
+    core already holds the lock do not deadlock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+        self.depth = 0
+        self.thread_lock = threading.RLock()
+
+    def acquire(self):
+        self.thread_lock.acquire()
+        if self.depth == 0:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if fcntl:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                else:
+                    msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            except BaseException:
+                os.close(fd)
+                self.thread_lock.release()
+                raise
+            self.fd = fd
+        self.depth += 1
+
+    def release(self):
+        self.depth -= 1
+        if self.depth == 0:
+            if fcntl:
+                fcntl.flock(self.fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self.fd, 0, os.SEEK_SET)
+                msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+            os.close(self.fd)
+            self.fd = None
+        self.thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+class Storage:
+    """Interface between TimeTrackerCore and the place its data lives.
+
+    A backend owns the records and sessions mappings it returns from
+    load() and load_sessions() and keeps them current as transition events
+    are appended, so the core never writes either directly.
+    """
+
+    def load(self):
+        """Return (records, state) where records maps date string to record"""
+        raise NotImplementedError
+
+    def load_sessions(self):
+        """Return the mapping of session id to session, valid after load()"""
+        raise NotImplementedError
+
+    def load_tags(self):
+        """Return the tag index, with sessions(tag) and names(), valid after load()"""
+        raise NotImplementedError
+
+    def load_tombstones(self):
+        """Return the mapping of session id to the tombstone left by its
+        removal, which sync passes on to other replicas, valid after load()"""
+        raise NotImplementedError
+
+    def append(self, event):
+        """Persist one state transition and any records it produced"""
+        self.apply(event)
+        self.write([event])
+
+    def apply(self, event):
+        """Make an event visible to readers without persisting it"""
+        pass
+
+    def write(self, events):
+        """Persist a batch of already applied events in one write"""
+        raise NotImplementedError
+
+    def checkpoint(self, state):
+        """Persist the given state and consolidate pending writes"""
+        raise NotImplementedError
+
+    def sync(self):
+        """Force everything written so far to disk, so it survives a power loss"""
+        pass
+
+    def replace_all(self, records, state, sessions):
+        """Overwrite everything stored with the given records, state and sessions"""
+        raise NotImplementedError
+
+    def get_records_between(self, start_date, end_date):
+        """Return records for dates from start_date to end_date inclusive"""
+        raise NotImplementedError
+
+    @contextmanager
+    def lock(self):
+        """Hold the inter-process lock around a read-modify-write"""
+        yield
+
+    def changed(self):
+        """Cheap check whether another process wrote since our last access"""
+        return False
+
+    def date_bounds(self):
+        """(first, last) date strings with a record, None for backends that
+        leave it to the core's totals index or when there are no records"""
+        return None
+
+    def sessions_overlapping(self, start, end):
+        """Sessions overlapping [start, end) in epoch seconds, or None for
+        backends that leave it to the core's session index"""
+        return None
+
+    def refresh(self):
+        """Pick up writes made by other processes since our last access.
+
+        Returns None when nothing changed, otherwise (state, records,
+        sessions) where records holds the changed days and sessions the
+        changed sessions, None for removed ones. Both are None when
+        anything may have changed.
+        """
+        return None
+
+    def close(self):
+        """Release any resources held by the backend"""
+        pass
+
+class JsonStorage(Storage):
+    """Records kept in memory, persisted as a JSON snapshot plus journal.
+
+    With durable=True each journal write is fsynced before returning.
+    """
+
+    def __init__(self, data_file="time_records.json", journal_file=None, durable=False):
+        self.data_file = data_file
+        self.journal_file = journal_file or os.path.splitext(data_file)[0] + ".journal"
+        self.journal = EventJournal(self.data_file, self.journal_file, durable=durable)
+        self.file_lock = FileLock(self.data_file + ".lock")
+        self.mutex = threading.RLock()  # Guards the records against a snapshot copy on another thread
+        self.records = RecordTable()
+        self.sessions = {}
+        self.tags = TagIndex()
+        self.tombstones = {}
+        self.state = {}
+        self.signature = None  # File signature as of our last read or write
+        self.journal_offset = 0  # Journal bytes already applied
+
+    def load(self):
+        with self.file_lock:
+            data, events = self.journal.read()
+            self._track_files()
+
+        # Update in place, the core holds references to these dicts
+        with self.mutex:
+            self.records.clear()
+            self.records.update(data.get('records', {}))
+            self.sessions.clear()
+            self.sessions.update(data.get('sessions', {}))
+            self.tags.clear()
+            if 'tags' in data:
+                self.tags.load(data['tags'])
+            else:
+                self.tags.add(self.sessions.values())  # Saved before tags were indexed
+            self.tombstones.clear()
+            self.tombstones.update(data.get('tombstones', {}))
+            self.state = data.get('current_state', {})
+
+            # Replay transitions recorded after the snapshot
+            for event in events:
+                self.apply(event)
+        return self.records, self.state
+
+    def load_sessions(self):
+        return self.sessions
+
+    def load_tags(self):
+        return self.tags
+
+    def load_tombstones(self):
+        return self.tombstones
+
+    def _track_files(self):
+        self.signature = self.journal.signature()
+        self.journal_offset = self.signature[1]
+
+    def lock(self):
+        return self.file_lock
+
+    def changed(self):
+        with self.file_lock:
+            return self.journal.signature() != self.signature
+
+    def refresh(self):
+        with self.file_lock:
+            signature = self.journal.signature()
+            if signature == self.signature:
+                return None
+
+            # Another process only appended, replay just the new lines
+            if signature[0] == self.signature[0] and signature[1] > self.journal_offset:
+                events, self.journal_offset = self.journal.read_from(self.journal_offset)
+                self.journal.pending += len(events)
+                self.signature = self.journal.signature()
+                changed = {}
+                changed_sessions = {}
+                for event in events:
+                    self.apply(event)
+                    changed.update(event.get('records', {}))
+                    changed_sessions.update(dict.fromkeys(event.get('removed_sessions', [])))
+                    changed_sessions.update(dict.fromkeys(event.get('tombstones', {})))
+                    changed_sessions.update(event.get('sessions', {}))
+                return self.state, changed, changed_sessions
+
+            # The snapshot was rewritten, start over
+            self.load()
+            return self.state, None, None
+
+    def apply(self, event):
+        with self.mutex:
+            self.records.update(event.get('records', {}))
+            for session_id in event.get('removed_sessions', []):
+                self.sessions.pop(session_id, None)
+                self.tags.remove(session_id)
+            self.sessions.update(event.get('sessions', {}))
+            self.tags.add(event.get('sessions', {}).values())
+            self.tombstones.update(event.get('tombstones', {}))
+            self.state = event['state']
+
+    def write(self, events):
+        with self.file_lock:
+            # Lines another process appended first stay unread for refresh()
+            up_to_date = self.journal.signature() == self.signature
+            self.journal.append_many(events)
+            if up_to_date:
+                self._track_files()
+        if self.journal.needs_compaction and not self.changed():
+            self.checkpoint(self.state)
+
+    def _snapshot(self):
+        # Shallow copies suffice, events replace sessions rather than edit them
+        with self.mutex:
+            return {
+                'records': self.records.copy(),
+                'sessions': dict(self.sessions),
+                'tags': self.tags.to_dict(),
+                'tombstones': dict(self.tombstones),
+                'current_state': self.state
+            }
+
+    def checkpoint(self, state):
+        # The snapshot is serialized between two short locked sections, so
+        # a checkpoint on a writer thread does not stall transitions. A
+        # caller already holding the lock keeps it throughout.
+        with self.file_lock:
+            with self.mutex:
+                self.state = state
+            signature = self.journal.signature()
+            if signature != self.signature:
+                # Our view misses another process's writes, so a snapshot of
+                # it would drop them. Journal the state and compact later.
+                self.journal.append({'event': 'checkpoint', 'state': state})
+                return
+            snapshot = self._snapshot()
+        snapshot['records'] = snapshot['records'].to_dict()
+        tmp_file = self.journal.write_snapshot(snapshot)
+        with self.file_lock:
+            if self.journal.signature()[0] == signature[0]:
+                self.journal.install_snapshot(tmp_file, signature[1])
+                self._track_files()
+                if self.journal.pending:
+                    # Lines appended while writing were kept, replay them on refresh()
+                    self.signature = (self.signature[0], 0)
+                    self.journal_offset = 0
+            else:
+                # Another process compacted meanwhile, ours may miss its writes
+                os.remove(tmp_file)
+                self.journal.append({'event': 'checkpoint', 'state': state})
+
+    def sync(self):
+        self.journal.sync()
+
+    def replace_all(self, records, state, sessions):
+        # Update in place, the core holds references to these mappings
+        for current, new in ((self.records, records), (self.sessions, sessions)):
+            if new is not current:
+                new = dict(new)
+                current.clear()
+                current.update(new)
+        self.tags.clear()
+        self.tags.add(self.sessions.values())
+        self.checkpoint(state)
+
+    def get_records_between(self, start_date, end_date):
+        return self.records.between(start_date.strftime("%Y-%m-%d"),
+                                    end_date.strftime("%Y-%m-%d"))
+
+class SqliteRecords(Mapping):
+    """Read-only view of the records table that fetches rows on demand"""
+
+    COLUMNS = ("total_time", "breaks", "clock_in", "clock_out")
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _row_to_record(self, row):
+        return dict(zip(self.COLUMNS, row))
+
+    def __getitem__(self, date_str):
+        row = self.conn.execute(
+            "SELECT total_time, breaks, clock_in, clock_out FROM records WHERE date = ?",
+            (date_str,)).fetchone()
+        if row is None:
+            raise KeyError(date_str)
+        return self._row_to_record(row)
+
+    def __contains__(self, date_str):
+        return self.conn.execute(
+            "SELECT 1 FROM records WHERE date = ?", (date_str,)).fetchone() is not None
+
+    def __iter__(self):
+        for (date_str,) in self.conn.execute("SELECT date FROM records ORDER BY date"):
+            yield date_str
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def items(self):
+        for row in self.conn.execute(
+                "SELECT date, total_time, breaks, clock_in, clock_out FROM records ORDER BY date"):
+            yield row[0], self._row_to_record(row[1:])
+
+    def between(self, start_str, end_str):
+        """Rows in a date range, answered from the primary key index"""
+        rows = self.conn.execute(
+            "SELECT date, total_time, breaks, clock_in, clock_out FROM records "
+            "WHERE date BETWEEN ? AND ? ORDER BY date",
+            (start_str, end_str))
+        return {row[0]: self._row_to_record(row[1:]) for row in rows}
+
+class SqliteSessions(Mapping):
+    """Read-only view of the sessions table that fetches rows on demand"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _row_to_session(self, row):
+        session = {"id": row[0], "start": row[1], "end": row[2], "breaks": json.loads(row[3])}
+        if row[4]:
+            session["tags"] = json.loads(row[4])
+        return session
+
+    def __getitem__(self, session_id):
+        row = self.conn.execute(
+            "SELECT id, start_time, end_time, breaks, tags FROM sessions WHERE id = ?",
+            (session_id,)).fetchone()
+        if row is None:
+            raise KeyError(session_id)
+        return self._row_to_session(row)
+
+    def __iter__(self):
+        for (session_id,) in self.conn.execute("SELECT id FROM sessions ORDER BY start_time"):
+            yield session_id
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def values(self):
+        for row in self.conn.execute(
+                "SELECT id, start_time, end_time, breaks, tags FROM sessions ORDER BY start_time"):
+            yield self._row_to_session(row)
+
+class SqliteTombstones(Mapping):
+    """Read-only view of the tombstones table"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _row_to_tombstone(self, row):
+        return {"id": row[0], "start": row[1], "end": row[2], "removed": True}
+
+    def __getitem__(self, session_id):
+        row = self.conn.execute(
+            "SELECT id, start_time, end_time FROM tombstones WHERE id = ?", (session_id,)).fetchone()
+        if row is None:
+            raise KeyError(session_id)
+        return self._row_to_tombstone(row)
+
+    def __iter__(self):
+        for (session_id,) in self.conn.execute("SELECT id FROM tombstones"):
+            yield session_id
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM tombstones").fetchone()[0]
+
+    def values(self):
+        for row in self.conn.execute("SELECT id, start_time, end_time FROM tombstones"):
+            yield self._row_to_tombstone(row)
+
+class SqliteTags:
+    """Read-only view of the session_tags table, the inverted index from tag to sessions"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def sessions(self, tag):
+        """{session id: [start, end, worked, breaks]} of the sessions with a tag"""
+        rows = self.conn.execute(
+            "SELECT session_id, start_time, end_time, worked, breaks FROM session_tags WHERE tag = ?",
+            (tag,))
+        return {row[0]: list(row[1:]) for row in rows}
+
+    def names(self):
+        return [tag for (tag,) in self.conn.execute("SELECT DISTINCT tag FROM session_tags ORDER BY tag")]
+
+class SqliteStorage(Storage):
+    """Records kept in an SQLite database, one row per session date.
+
+    The date primary key doubles as the session date index, so single
+    days and ranges are read and written without touching the rest of
+    the history. The database runs in WAL mode so appends stay cheap;
+    durable=True syncs every commit instead of only checkpoints.
+    """
+
+    def __init__(self, data_file="time_records.db", durable=False):
+        import sqlite3  # Only paid for by users of this backend
+        self.data_file = data_file
+        # Shared with a BackgroundStorage writer thread, SQLite serializes access
+        self.conn = sqlite3.connect(data_file, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=" + ("FULL" if durable else "NORMAL"))
+        with self.conn:
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                "date TEXT PRIMARY KEY, total_time, breaks, clock_in, clock_out"
+                ") WITHOUT ROWID")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, start_time INTEGER, end_time INTEGER, breaks TEXT)")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS sessions_start ON sessions (start_time)")
+            if "tags" not in [row[1] for row in self.conn.execute("PRAGMA table_info(sessions)")]:
+                self.conn.execute("ALTER TABLE sessions ADD COLUMN tags TEXT")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS session_tags ("
+                "tag TEXT, session_id TEXT, start_time INTEGER, end_time INTEGER, worked INTEGER, breaks INTEGER, "
+                "PRIMARY KEY (tag, session_id)) WITHOUT ROWID")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS session_tags_session ON session_tags (session_id)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS tombstones ("
+                "id TEXT PRIMARY KEY, start_time INTEGER, end_time INTEGER) WITHOUT ROWID")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT)")
+        self.records = SqliteRecords(self.conn)
+        self.sessions = SqliteSessions(self.conn)
+        self.tags = SqliteTags(self.conn)
+        self.tombstones = SqliteTombstones(self.conn)
+        self.file_lock = FileLock(self.data_file + ".lock")
+        self.data_version = None
+
+    def _data_version(self):
+        # Changes only when another connection commits
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def load(self):
+        row = self.conn.execute(
+            "SELECT value FROM state WHERE key = 'current_state'").fetchone()
+        state = json.loads(row[0]) if row else {}
+        self.data_version = self._data_version()
+        return self.records, state
+
+    def load_sessions(self):
+        return self.sessions
+
+    def load_tags(self):
+        return self.tags
+
+    def load_tombstones(self):
+        return self.tombstones
+
+    def lock(self):
+        # SQLite locks only single statements, this spans read-modify-write
+        return self.file_lock
+
+    def changed(self):
+        return self._data_version() != self.data_version
+
+    def refresh(self):
+        if not self.changed():
+            return None
+        _, state = self.load()
+        return state, None, None
+
+    def _write_records(self, records):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO records (date, total_time, breaks, clock_in, clock_out) "
+            "VALUES (?, ?, ?, ?, ?)",
+            ((date_str, r["total_time"], r["breaks"], r["clock_in"], r["clock_out"])
+             for date_str, r in records.items()))
+
+    def _remove_sessions(self, session_ids):
+        for table, column in (("sessions", "id"), ("session_tags", "session_id")):
+            self.conn.executemany(f"DELETE FROM {table} WHERE {column} = ?",
+                                  ((session_id,) for session_id in session_ids))
+
+    def _write_sessions(self, sessions):
+        sessions = list(sessions)
+        # A replaced session may have lost tags
+        self.conn.executemany("DELETE FROM session_tags WHERE session_id = ?",
+                              ((s["id"],) for s in sessions))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO sessions (id, start_time, end_time, breaks, tags) "
+            "VALUES (?, ?, ?, ?, ?)",
+            ((s["id"], s["start"], s["end"], json.dumps(s.get("breaks", [])),
+              json.dumps(s["tags"]) if s.get("tags") else None)
+             for s in sessions))
+        self.conn.executemany(
+            "INSERT INTO session_tags (tag, session_id, start_time, end_time, worked, breaks) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            ((tag, s["id"], *tag_entry(s)) for s in sessions for tag in s.get("tags", ())))
+
+    def _write_tombstones(self, tombstones):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO tombstones (id, start_time, end_time) VALUES (?, ?, ?)",
+            ((t["id"], t["start"], t["end"]) for t in tombstones))
+
+    def _write_state(self, state):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO state (key, value) VALUES ('current_state', ?)",
+            (json.dumps(state),))
+
+    @timed("write_seconds", kind="sqlite")
+    def write(self, events):
+        if not events:
+            return
+        with self.conn:
+            for event in events:
+                self._remove_sessions(event.get('removed_sessions', []))
+                self._write_sessions(event.get('sessions', {}).values())
+                self._write_tombstones(event.get('tombstones', {}).values())
+                self._write_records(event.get('records', {}))
+            self._write_state(events[-1]['state'])
+
+    def checkpoint(self, state):
+        with self.conn:
+            self._write_state(state)
+        self.conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def sync(self):
+        self.conn.execute("PRAGMA wal_checkpoint(FULL)")
+
+    def replace_all(self, records, state, sessions):
+        # Materialize first, the arguments may be views of these tables
+        records = dict(records.items())
+        sessions = list(sessions.values())
+        with self.conn:
+            self.conn.execute("DELETE FROM records")
+            self.conn.execute("DELETE FROM sessions")
+            self.conn.execute("DELETE FROM session_tags")
+            self._write_records(records)
+            self._write_sessions(sessions)
+            self._write_state(state)
+
+    def get_records_between(self, start_date, end_date):
+        return self.records.between(start_date.strftime("%Y-%m-%d"),
+                                    end_date.strftime("%Y-%m-%d"))
+
+    def close(self):
+        self.conn.close()
+
+class ShardedRecords(Mapping):
+    """Read-only view of the records of every shard, read a month at a time"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def __getitem__(self, date_str):
+        return self.storage._shard(date_str[:7])["records"][date_str]
+
+    def __contains__(self, date_str):
+        return date_str in self.storage._shard(date_str[:7])["records"]
+
+    def __iter__(self):
+        for month in self.storage._month_list():
+            yield from sorted(self.storage._shard(month)["records"])
+
+    def __len__(self):
+        return sum(len(self.storage._shard(month)["records"]) for month in self.storage._month_list())
+
+    def items(self):
+        for month in self.storage._month_list():
+            records = self.storage._shard(month)["records"]
+            for date_str in sorted(records):
+                yield date_str, records[date_str]
+
+    def between(self, start_str, end_str):
+        """Records in a date range, reading only the shards of its months"""
+        found = {}
+        for month in self.storage._month_list(start_str[:7], end_str[:7]):
+            for date_str, record in self.storage._shard(month)["records"].items():
+                if start_str <= date_str <= end_str:
+                    found[date_str] = record
+        return dict(sorted(found.items()))
+
+class ShardedSessions(Mapping):
+    """Read-only view of the sessions of every shard"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def __getitem__(self, session_id):
+        month = self.storage._session_month(session_id)
+        if month is None:
+            raise KeyError(session_id)
+        return self.storage._shard(month)["sessions"][session_id]
+
+    def __iter__(self):
+        for month in self.storage._month_list():
+            yield from list(self.storage._shard(month)["sessions"])
+
+    def __len__(self):
+        return sum(len(self.storage._shard(month)["sessions"]) for month in self.storage._month_list())
+
+    def values(self):
+        for month in self.storage._month_list():
+            yield from list(self.storage._shard(month)["sessions"].values())
+
+class ShardedTombstones(Mapping):
+    """Read-only view of a sharded store's tombstones, all in one file"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def __getitem__(self, session_id):
+        return self.storage._tombstones()[session_id]
+
+    def __iter__(self):
+        return iter(list(self.storage._tombstones()))
+
+    def __len__(self):
+        return len(self.storage._tombstones())
+
+    def values(self):
+        return list(self.storage._tombstones().values())
+
+class ShardedTags:
+    """Read-only view of a sharded store's tag index, one file per tag"""
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    def sessions(self, tag):
+        """{session id: [start, end, worked, breaks]} of the sessions with a tag"""
+        return self.storage._tag(tag)
+
+    def names(self):
+        return self.storage._tag_names()
+
+class ShardedStorage(Storage):
+    """Records and sessions split into one JSON file per month, beside a small state file.
+
+        state.json        current state and the longest session's length
+        YYYY-MM.json      {"records": {date: record}, "sessions": {id: session}}
+        YYYY-MM.json.gz   the same, for months over a year old
+        tags/<tag>.json   {session id: [start, end, worked, breaks]}, the
+                          inverted index of one tag
+        tombstones.json   {session id: tombstone} of removed sessions
+
+    Loading reads only the state file. A shard is read the first time its
+    month is needed, and the least recently used shards are dropped again,
+    so startup time and memory do not grow with the history. Records go to
+    the shard of their date, sessions to that of the UTC day they began.
+    Old shards are compressed at checkpoints. With durable=True every
+    write is fsynced before returning.
+    """
+
+    MAX_CACHED_SHARDS = 24
+    ARCHIVE_AFTER_MONTHS = 12
+    SHARD_NAME = re.compile(r'^(\d{4}-\d{2})\.json(\.gz)?$')
+
+    def __init__(self, data_dir="time_records.shards", durable=False):
+        self.data_dir = data_dir
+        self.durable = durable
+        os.makedirs(data_dir, exist_ok=True)
+        self.state_file = os.path.join(data_dir, "state.json")
+        self.file_lock = FileLock(os.path.join(data_dir, ".lock"))
+        self.mutex = threading.RLock()  # Guards the shard cache against the writer thread
+        self.shards = OrderedDict()  # Month -> shard, least recently used first
+        self.dirty = set()  # Months with applied events not yet written
+        self.months = None  # Sorted months that have a shard, listed on first use
+        self.session_months = {}  # Session id -> month, for the shards read so far
+        self.unsynced = set()  # Files written since the last sync()
+        self.tags_dir = os.path.join(data_dir, "tags")
+        self.tag_cache = {}  # Tag -> its index entries, once read
+        self.dirty_tags = set()  # Tags with applied changes not yet written
+        self.tombstone_file = os.path.join(data_dir, "tombstones.json")
+        self.tombstone_cache = None  # Contents of the tombstone file, once read
+        self.dirty_tombstones = False
+        self.state = {}
+        self.longest_session = 0  # Bounds how far back a session can reach
+        self.signature = None
+        self.records = ShardedRecords(self)
+        self.sessions = ShardedSessions(self)
+        self.tags = ShardedTags(self)
+        self.tombstones = ShardedTombstones(self)
+
+    def _signature(self):
+        # Every write replaces the state file last
+        try:
+            stat = os.stat(self.state_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def load(self):
+        with self.file_lock:
+            try:
+                with open(self.state_file, 'r') as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                data = {}
+            self.signature = self._signature()
+        with self.mutex:
+            self.shards.clear()
+            self.dirty.clear()
+            self.months = None
+            self.session_months.clear()
+            self.tag_cache.clear()
+            self.dirty_tags.clear()
+            self.tombstone_cache = None
+            self.dirty_tombstones = False
+            self.state = data.get('current_state', {})
+            self.longest_session = data.get('longest_session', 0)
+        return self.records, self.state
+
+    def load_sessions(self):
+        return self.sessions
+
+    def load_tags(self):
+        return self.tags
+
+    def load_tombstones(self):
+        return self.tombstones
+
+    def lock(self):
+        return self.file_lock
+
+    def changed(self):
+        with self.file_lock:
+            return self._signature() != self.signature
+
+    def refresh(self):
+        with self.file_lock:
+            if self._signature() == self.signature:
+                return None
+            # Shards other processes rewrote are read again when needed
+            self.load()
+            return self.state, None, None
+
+    def _month_list(self, first=None, last=None):
+        """Sorted months with a shard, optionally only those from first to last"""
+        with self.mutex:
+            if self.months is None:
+                months = set()
+                for name in os.listdir(self.data_dir):
+                    match = self.SHARD_NAME.match(name)
+                    if match:
+                        months.add(match.group(1))
+                months.update(self.shards)
+                self.months = sorted(months)
+            if first is None:
+                return list(self.months)
+            return self.months[bisect_left(self.months, first):bisect_right(self.months, last)]
+
+    def _is_archived(self, month):
+        today = date.today()
+        year, number = divmod(today.year * 12 + today.month - 1 - self.ARCHIVE_AFTER_MONTHS, 12)
+        return month < f"{year:04d}-{number + 1:02d}"
+
+    def _shard_path(self, month, archived):
+        return os.path.join(self.data_dir, f"{month}.json.gz" if archived else f"{month}.json")
+
+    def _read_shard(self, month):
+        import gzip  # Only needed for archived months
+        for archived in (False, True):
+            try:
+                with (gzip.open if archived else open)(self._shard_path(month, archived), 'rt') as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                pass
+        return {"records": {}, "sessions": {}}
+
+    def _shard(self, month):
+        """A month's shard, read on first use and kept while recently used"""
+        with self.mutex:
+            shard = self.shards.get(month)
+            if shard is not None:
+                self.shards.move_to_end(month)
+                return shard
+            shard = self.shards[month] = self._read_shard(month)
+            for session_id in shard["sessions"]:
+                self.session_months[session_id] = month
+
+            # Drop the least recently used shards, unwritten ones stay
+            excess = len(self.shards) - self.MAX_CACHED_SHARDS
+            for old in list(self.shards):
+                if excess <= 0:
+                    break
+                if old not in self.dirty and old != month:
+                    del self.shards[old]
+                    excess -= 1
+            return shard
+
+    def _session_month(self, session_id):
+        """Month of the shard holding a session, searching every shard if unseen"""
+        with self.mutex:
+            month = self.session_months.get(session_id)
+            if month is None:
+                for candidate in self._month_list():
+                    if session_id in self._shard(candidate)["sessions"]:
+                        return candidate
+            return month
+
+    def _tag_path(self, tag):
+        from urllib.parse import quote  # Tags may hold characters unfit for file names
+        return os.path.join(self.tags_dir, quote(tag, safe='') + ".json")
+
+    def _tag(self, tag):
+        """Index entries of a tag, read on first use"""
+        with self.mutex:
+            entries = self.tag_cache.get(tag)
+            if entries is None:
+                try:
+                    with open(self._tag_path(tag), 'r') as f:
+                        entries = json.load(f)
+                except FileNotFoundError:
+                    entries = {}
+                self.tag_cache[tag] = entries
+                # Their months are known from the start, spare a search
+                for session_id, entry in entries.items():
+                    self.session_months.setdefault(session_id, session_day(entry[0])[:7])
+            return entries
+
+    def _tag_names(self):
+        from urllib.parse import unquote
+        with self.mutex:
+            names = set(self.tag_cache)
+            if os.path.isdir(self.tags_dir):
+                names.update(unquote(name[:-5]) for name in os.listdir(self.tags_dir) if name.endswith(".json"))
+            return sorted(tag for tag in names if self._tag(tag))
+
+    def _tombstones(self):
+        """Tombstones of removed sessions, read on first use"""
+        with self.mutex:
+            if self.tombstone_cache is None:
+                try:
+                    with open(self.tombstone_file, 'r') as f:
+                        self.tombstone_cache = json.load(f)
+                except FileNotFoundError:
+                    self.tombstone_cache = {}
+            return self.tombstone_cache
+
+    def _untag(self, session):
+        for tag in session.get("tags", ()) if session else ():
+            self._tag(tag).pop(session["id"], None)
+            self.dirty_tags.add(tag)
+
+    def _add_month(self, month):
+        if self.months is not None and month not in self.months:
+            insort(self.months, month)
+
+    def apply(self, event):
+        with self.mutex:
+            for date_str, record in event.get('records', {}).items():
+                month = date_str[:7]
+                self._shard(month)["records"][date_str] = dict(record)
+                self.dirty.add(month)
+                self._add_month(month)
+            for session_id in event.get('removed_sessions', []):
+                month = self._session_month(session_id)
+                if month is not None:
+                    self._untag(self._shard(month)["sessions"].pop(session_id, None))
+                    self.session_months.pop(session_id, None)
+                    self.dirty.add(month)
+            for session_id, session in event.get('sessions', {}).items():
+                # Only sessions already read can be replaced, new ones are unseen
+                old_month = self.session_months.get(session_id)
+                if old_month is not None:
+                    self._untag(self._shard(old_month)["sessions"].pop(session_id, None))
+                    self.dirty.add(old_month)
+                month = session_day(session["start"])[:7]
+                self._shard(month)["sessions"][session_id] = session
+                for tag in session.get("tags", ()):
+                    self._tag(tag)[session_id] = tag_entry(session)
+                    self.dirty_tags.add(tag)
+                self.session_months[session_id] = month
+                self.longest_session = max(self.longest_session, session["end"] - session["start"])
+                self.dirty.add(month)
+                self._add_month(month)
+            if event.get('tombstones'):
+                self._tombstones().update(event['tombstones'])
+                self.dirty_tombstones = True
+            self.state = event['state']
+
+    def _write_file(self, path, data, compress=False):
+        import gzip
+        tmp_file = path + ".tmp"
+        with (gzip.open if compress else open)(tmp_file, 'wt') as f:
+            json.dump(data, f, separators=(',', ':'))
+        if self.durable:
+            with open(tmp_file, 'rb') as f:
+                os.fsync(f.fileno())
+        os.replace(tmp_file, path)
+        self.unsynced.add(path)
+
+    def _write_shard(self, month, shard):
+        archived = self._is_archived(month)
+        self._write_file(self._shard_path(month, archived), shard, compress=archived)
+        stale = self._shard_path(month, not archived)
+        if os.path.exists(stale):
+            os.remove(stale)
+
+    def _write_tag(self, tag, entries):
+        os.makedirs(self.tags_dir, exist_ok=True)
+        if entries:
+            self._write_file(self._tag_path(tag), entries)
+        elif os.path.exists(self._tag_path(tag)):
+            os.remove(self._tag_path(tag))
+
+    def _write_state(self, state):
+        self._write_file(self.state_file, {'current_state': state, 'longest_session': self.longest_session})
+
+    @timed("write_seconds", kind="sharded")
+    def write(self, events):
+        if not events:
+            return
+        with self.file_lock, self.mutex:
+            up_to_date = self._signature() == self.signature
+            if not up_to_date:
+                # Another process rewrote shards since we read them. Read the
+                # months these events touch again and replay the events on top.
+                months = set(self.dirty)
+                months.update(date_str[:7] for event in events for date_str in event.get('records', {}))
+                months.update(session_day(session["start"])[:7]
+                              for event in events for session in event.get('sessions', {}).values())
+                months.update(self.session_months.get(session_id)
+                              for event in events for session_id in event.get('removed_sessions', []))
+                for month in months:
+                    self.shards.pop(month, None)
+                for tag in self.dirty_tags:
+                    self.tag_cache.pop(tag, None)
+                if self.dirty_tombstones:
+                    self.tombstone_cache = None
+                for event in events:
+                    self.apply(event)
+            for month in sorted(self.dirty):
+                self._write_shard(month, self._shard(month))
+            self.dirty.clear()
+            for tag in sorted(self.dirty_tags):
+                self._write_tag(tag, self._tag(tag))
+            self.dirty_tags.clear()
+            if self.dirty_tombstones:
+                self._write_file(self.tombstone_file, self._tombstones())
+                self.dirty_tombstones = False
+            self._write_state(events[-1]['state'])
+            if up_to_date:
+                self.signature = self._signature()
+
+    def checkpoint(self, state):
+        with self.file_lock, self.mutex:
+            up_to_date = self._signature() == self.signature
+            self.state = state
+            self._write_state(state)
+            if up_to_date:
+                self.signature = self._signature()
+
+            # Compress the shards of months that passed the archive age
+            for month in self._month_list():
+                if not self._is_archived(month):
+                    break
+                if month not in self.dirty and os.path.exists(self._shard_path(month, False)):
+                    self._write_shard(month, self._read_shard(month))
+
+    def sync(self):
+        with self.mutex:
+            paths, self.unsynced = self.unsynced, set()
+        for path in paths:
+            try:
+                with open(path, 'rb') as f:
+                    os.fsync(f.fileno())
+            except FileNotFoundError:
+                pass  # Replaced by its compressed copy since
+
+    def replace_all(self, records, state, sessions):
+        # Materialize first, the arguments may be views of this storage
+        shards = {}
+        for date_str, record in records.items():
+            shards.setdefault(date_str[:7], {"records": {}, "sessions": {}})["records"][date_str] = dict(record)
+        longest = 0
+        sessions = list(sessions.values())
+        for session in sessions:
+            month = session_day(session["start"])[:7]
+            shards.setdefault(month, {"records": {}, "sessions": {}})["sessions"][session["id"]] = session
+            longest = max(longest, session["end"] - session["start"])
+        tags = TagIndex()
+        tags.add(sessions)
+        with self.file_lock, self.mutex:
+            for name in os.listdir(self.data_dir):
+                match = self.SHARD_NAME.match(name)
+                if match and match.group(1) not in shards:
+                    os.remove(os.path.join(self.data_dir, name))
+            for month, shard in shards.items():
+                self._write_shard(month, shard)
+            if os.path.isdir(self.tags_dir):
+                for name in os.listdir(self.tags_dir):
+                    os.remove(os.path.join(self.tags_dir, name))
+            for tag, entries in tags.tags.items():
+                self._write_tag(tag, entries)
+            self.longest_session = longest
+            self._write_state(state)
+            self.sync()
+            self.load()
+
+    def get_records_between(self, start_date, end_date):
+        return self.records.between(start_date.strftime("%Y-%m-%d"),
+                                    end_date.strftime("%Y-%m-%d"))
+
+    def date_bounds(self):
+        with self.mutex:
+            dates = []
+            for months in (self._month_list(), self._month_list()[::-1]):
+                for month in months:
+                    records = self._shard(month)["records"]
+                    if records:
+                        dates.append(min(records) if not dates else max(records))
+                        break
+            return (dates[0], dates[1]) if dates else None
+
+    def sessions_overlapping(self, start, end):
+        with self.mutex:
+            first = session_day(max(start - self.longest_session, 0))[:7]
+            found = []
+            for month in self._month_list(first, session_day(end)[:7]):
+                found.extend(s for s in self._shard(month)["sessions"].values()
+                             if s["start"] < end and s["end"] > start)
+            return found
+
+class MemoryStorage(Storage):
+    """Records kept only in memory, for simulations and throwaway cores"""
+
+    def __init__(self):
+        self.records = RecordTable()
+        self.sessions = {}
+        self.tags = TagIndex()
+        self.tombstones = {}
+        self.state = {}
+
+    def load(self):
+        return self.records, self.state
+
+    def load_sessions(self):
+        return self.sessions
+
+    def load_tags(self):
+        return self.tags
+
+    def load_tombstones(self):
+        return self.tombstones
+
+    def apply(self, event):
+        self.records.update(event.get('records', {}))
+        for session_id in event.get('removed_sessions', []):
+            self.sessions.pop(session_id, None)
+            self.tags.remove(session_id)
+        self.sessions.update(event.get('sessions', {}))
+        self.tags.add(event.get('sessions', {}).values())
+        self.tombstones.update(event.get('tombstones', {}))
+        self.state = event['state']
+
+    def write(self, events):
+        pass
+
+    def checkpoint(self, state):
+        self.state = state
+
+    def replace_all(self, records, state, sessions):
+        for current, new in ((self.records, records), (self.sessions, sessions)):
+            if new is not current:
+                new = dict(new)
+                current.clear()
+                current.update(new)
+        self.tags.clear()
+        self.tags.add(self.sessions.values())
+        self.state = state
+
+    def get_records_between(self, start_date, end_date):
+        return self.records.between(start_date.strftime("%Y-%m-%d"),
+                                    end_date.strftime("%Y-%m-%d"))
+
+class BufferedStorage(Storage):
+    """Wraps a backend and holds events in memory until flush() is called.
+
+    Events are applied to the wrapped backend right away, so the records
+    mapping stays current for in-memory backends, while persistence is
+    batched into one write per flush. Pass shared=False when this process
+    is the only writer, which skips locking and change detection.
+    """
+
+    def __init__(self, storage, shared=True):
+        self.storage = storage
+        self.shared = shared
+        self.pending = []
+
+    def load(self):
+        return self.storage.load()
+
+    def load_sessions(self):
+        return self.storage.load_sessions()
+
+    def load_tags(self):
+        return self.storage.load_tags()
+
+    def load_tombstones(self):
+        return self.storage.load_tombstones()
+
+    def apply(self, event):
+        self.storage.apply(event)
+
+    def write(self, events):
+        self.pending.extend(events)
+
+    def flush(self):
+        """Write all buffered events, returning how many there were"""
+        events, self.pending = self.pending, []
+        try:
+            self.storage.write(events)
+        except BaseException:
+            self.pending[:0] = events  # Keep them for the next attempt
+            raise
+        return len(events)
+
+    def checkpoint(self, state):
+        self.flush()
+        self.storage.checkpoint(state)
+
+    def sync(self):
+        self.flush()
+        self.storage.sync()
+
+    def replace_all(self, records, state, sessions):
+        self.flush()  # Sessions may only be in our buffered events so far
+        self.storage.replace_all(records, state, sessions)
+
+    def get_records_between(self, start_date, end_date):
+        return self.storage.get_records_between(start_date, end_date)
+
+    def date_bounds(self):
+        return self.storage.date_bounds()
+
+    def sessions_overlapping(self, start, end):
+        return self.storage.sessions_overlapping(start, end)
+
+    def lock(self):
+        return self.storage.lock() if self.shared else super().lock()
+
+    def refresh(self):
+        if not self.shared:
+            return None
+        with self.storage.lock():
+            if not self.storage.changed():
+                return None
+            # Our own buffered events must reach disk before reloading
+            self.flush()
+            return self.storage.refresh()
+
+    def close(self):
+        self.flush()
+        self.storage.close()
+
+class BackgroundStorage(BufferedStorage):
+    """Wraps a backend and persists events from a writer thread.
+
+    Callers only apply events in memory and wake the writer, which waits
+    `delay` seconds so a burst of transitions lands in one write. Whatever
+    it wrote is fsynced at most every `sync_interval` seconds, which bounds
+    what a power loss can take; a killed process loses at most `delay`.
+    Checkpoints are also taken on the writer. close() drains everything.
+    """
+
+    def __init__(self, storage, delay=0.05, sync_interval=30.0, shared=True):
+        super().__init__(storage, shared)
+        self.delay = delay
+        self.sync_interval = sync_interval
+        self.condition = threading.Condition()
+        self.state = None  # Latest state seen, the one a checkpoint writes
+        self.checkpoint_requested = False
+        self.unsynced = False  # Written but not yet fsynced
+        self.last_sync = 0.0
+        self.closing = False
+        self.error = None  # Last write failure, raised again by close()
+        self.thread = threading.Thread(target=self._run, name="storage-writer", daemon=True)
+        self.thread.start()
+
+    def apply(self, event):
+        self.storage.apply(event)
+        self.state = event['state']
+
+    def write(self, events):
+        with self.condition:
+            self.pending.extend(events)
+            self.condition.notify()
+
+    def checkpoint(self, state):
+        with self.condition:
+            self.state = state
+            self.checkpoint_requested = True
+            self.condition.notify()
+
+    def flush(self):
+        # The backend lock orders our writes against the writer thread's
+        with self.storage.lock():
+            with self.condition:
+                events, self.pending = self.pending, []
+            try:
+                self.storage.write(events)
+            except BaseException:
+                with self.condition:
+                    self.pending[:0] = events  # Keep them for the next attempt
+                raise
+            if events:
+                self.unsynced = True
+            return len(events)
+
+    def sync(self):
+        self.flush()
+        # The fsync runs outside the backend lock, transitions need not wait on the disk
+        self.unsynced = False
+        try:
+            self.storage.sync()
+        except BaseException:
+            self.unsynced = True
+            raise
+        self.last_sync = time.monotonic()
+
+    def get_records_between(self, start_date, end_date):
+        if self.pending:
+            self.flush()  # Backends without an in-memory view read from disk
+        return self.storage.get_records_between(start_date, end_date)
+
+    def _sync_due_in(self):
+        """Seconds until unsynced writes must be fsynced, None if there are none"""
+        if not self.unsynced:
+            return None
+        return self.last_sync + self.sync_interval - time.monotonic()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not (self.pending or self.checkpoint_requested or self.closing):
+                    due_in = self._sync_due_in()
+                    if due_in is not None and due_in <= 0:
+                        break
+                    self.condition.wait(due_in)
+                closing = self.closing
+            if not closing and self.pending:
+                time.sleep(self.delay)  # Let a burst of transitions pile up
+
+            try:
+                self._persist()
+                self.error = None
+            except Exception as e:
+                self.error = e
+                print(f"Background write failed: {e}", file=sys.stderr)
+                if not closing:
+                    time.sleep(1.0)  # Retry later rather than spin
+            if closing:
+                return
+
+    def _persist(self):
+        with self.condition:
+            checkpoint, self.checkpoint_requested = self.checkpoint_requested, False
+        try:
+            self.flush()
+            if checkpoint:
+                self.storage.checkpoint(self.state)
+        except BaseException:
+            if checkpoint:
+                with self.condition:
+                    self.checkpoint_requested = True  # Ask again on the next attempt
+            raise
+        due_in = self._sync_due_in()
+        if checkpoint or (due_in is not None and due_in <= 0):
+            self.sync()
+
+    def close(self):
+        with self.condition:
+            self.closing = True
+            self.condition.notify()
+        self.thread.join()
+        try:
+            self.sync()  # Anything that arrived after the writer's last pass
+        finally:
+            self.storage.close()
+        if self.error:
+            raise self.error
+
+def open_storage(data_file, durable=False):
+    """Pick a backend from the data file extension, a directory holds shards"""
+    extension = os.path.splitext(data_file)[1]
+    if extension in (".db", ".sqlite", ".sqlite3"):
+        return SqliteStorage(data_file, durable)
+    if extension == ".shards" or os.path.isdir(data_file):
+        return ShardedStorage(data_file, durable)
+    return JsonStorage(data_file, durable=durable)
\ No newline at end of file
@@ -0,0 +1,200 @@
+"""Merge the sessions of two replicas by comparing hash trees.
+
+    python cli.py --data time_records.json sync /mnt/shared/timetracker
+
+Each replica hashes the sessions begun on every UTC day, then every
+month and year (records.SessionHashTree). Syncing compares the year
+hashes, descends only into years and months whose hashes differ, and
+exchanges just the sessions of the days that differ, so two replicas
+that mostly agree compare and copy very little.
+
+Conflicts resolve the same way on both sides: the result is the union of
+the sessions by id, and where both have a session under one id with
+different contents, the version ending later wins, ties broken by the
+canonical JSON. A session removed on one replica, e.g. replaced by an
+edit, leaves a tombstone under its id, which wins over any version and
+is synced like a session, so the removal reaches the other replica.
+Where two different sessions overlap in time, the replica taking them
+in keeps the one it prefers the same way and tombstones the other; the
+next round of the same sync passes that on.
+
+A replica is a TimeTrackerCore (CoreReplica) or a directory, e.g. on a
+shared drive, holding one file of sessions and day hashes per month
+(DirectoryReplica). Desktop and laptop each sync with the same directory.
+"""
+import json
+import os
+from records import combine_digests, preferred, session_day, session_digest
+from storage import FileLock
+
+class CoreReplica:
+    """The sessions of a TimeTrackerCore"""
+
+    def __init__(self, core):
+        self.core = core
+
+    def root(self):
+        return self.core.hash_tree.root()
+
+    def children(self, key):
+        return self.core.hash_tree.children(key)
+
+    def sessions(self, days):
+        """Sessions and tombstones of the given days"""
+        found = []
+        for session_id in self.core.hash_tree.session_ids(days):
+            session = self.core.sessions.get(session_id)
+            found.append(session if session is not None else self.core.tombstones[session_id])
+        return found
+
+    def put(self, sessions):
+        self.core.merge_sessions(sessions)
+
+class DirectoryReplica:
+    """Sessions kept in a directory, one JSON file per month.
+
+        tree.json      {"years": {year: hash}, "months": {month: hash}}
+        YYYY-MM.json   {"days": {day: hash}, "sessions": {day: [session, ...]}}
+
+    Tombstones are kept among the sessions of their day.
+
+    Month files are read only when their month is compared or exchanged.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.tree = self._read("tree.json") or {"years": {}, "months": {}}
+        self.months = {}  # Month -> contents of its file, once read
+        self.session_days = {}  # Session id -> day, for the months read
+
+    def _read(self, name):
+        try:
+            with open(os.path.join(self.path, name), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _write(self, name, data):
+        path = os.path.join(self.path, name)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def _month(self, month):
+        if month not in self.months:
+            data = self.months[month] = self._read(f"{month}.json") or {"days": {}, "sessions": {}}
+            for day, day_sessions in data["sessions"].items():
+                self.session_days.update((session["id"], day) for session in day_sessions)
+        return self.months[month]
+
+    def root(self):
+        return combine_digests(f"{year} {digest}" for year, digest in sorted(self.tree["years"].items()))
+
+    def children(self, key):
+        if not key:
+            return dict(self.tree["years"])
+        if len(key) == 4:
+            return {month: digest for month, digest in self.tree["months"].items() if month.startswith(key)}
+        return dict(self._month(key)["days"])
+
+    def sessions(self, days):
+        return [session for day in days for session in self._month(day[:7])["sessions"].get(day, ())]
+
+    def put(self, sessions):
+        """Add or replace sessions, then rehash the days, months and years they touched"""
+        touched = set()
+        for session in sessions:
+            # A replaced version was read by sessions(), possibly on another day
+            old_day = self.session_days.get(session["id"])
+            if old_day is not None:
+                day_sessions = self.months[old_day[:7]]["sessions"][old_day]
+                day_sessions[:] = [s for s in day_sessions if s["id"] != session["id"]]
+                touched.add(old_day)
+            day = session_day(session["start"])
+            self._month(day[:7])["sessions"].setdefault(day, []).append(session)
+            self.session_days[session["id"]] = day
+            touched.add(day)
+
+        for day in touched:
+            data = self._month(day[:7])
+            digests = sorted(session_digest(s) for s in data["sessions"].get(day, ()))
+            if digests:
+                data["days"][day] = combine_digests(digests)
+            else:
+                data["days"].pop(day, None)
+                data["sessions"].pop(day, None)
+
+        for month in {day[:7] for day in touched}:
+            days = self.months[month]["days"]
+            self._write(f"{month}.json", self.months[month])
+            if days:
+                self.tree["months"][month] = combine_digests(f"{day} {days[day]}" for day in sorted(days))
+            else:
+                self.tree["months"].pop(month, None)
+        for year in {day[:4] for day in touched}:
+            months = {month: digest for month, digest in self.tree["months"].items() if month.startswith(year)}
+            if months:
+                self.tree["years"][year] = combine_digests(f"{month} {months[month]}" for month in sorted(months))
+            else:
+                self.tree["years"].pop(year, None)
+        self._write("tree.json", self.tree)
+
+def diff_days(local, remote):
+    """Days whose sessions differ, comparing only below differing hashes"""
+    if local.root() == remote.root():
+        return []
+    days = []
+    keys = [""]
+    while keys:
+        key = keys.pop()
+        mine, theirs = local.children(key), remote.children(key)
+        for child in mine.keys() | theirs.keys():
+            if mine.get(child) != theirs.get(child):
+                if len(child) == 10:
+                    days.append(child)
+                else:
+                    keys.append(child)
+    return sorted(days)
+
+def _exchange(local, remote, days):
+    """Merge the sessions of the given days both ways, returning (received, sent)"""
+    mine = {session["id"]: session for session in local.sessions(days)}
+    theirs = {session["id"]: session for session in remote.sessions(days)}
+
+    merged = dict(mine)
+    for session_id, session in theirs.items():
+        merged[session_id] = preferred(merged[session_id], session) if session_id in merged else session
+    received = [s for session_id, s in merged.items() if mine.get(session_id) != s]
+    sent = [s for session_id, s in merged.items() if theirs.get(session_id) != s]
+    if received:
+        local.put(received)
+    if sent:
+        remote.put(sent)
+    return len(received), len(sent)
+
+def sync(local, remote, rounds=4):
+    """Make both replicas hold the merged sessions, returning (received, sent, days compared).
+
+    Overlaps the local side resolves while taking sessions in change it
+    again, so the exchange repeats until both sides agree.
+    """
+    received = sent = compared = 0
+    for _ in range(rounds):
+        days = diff_days(local, remote)
+        if not days:
+            break
+        got, gave = _exchange(local, remote, days)
+        received += got
+        sent += gave
+        compared += len(days)
+    return received, sent, compared
+
+def sync_directory(core, path):
+    """Sync a core with a directory replica, under the directory's lock"""
+    os.makedirs(path, exist_ok=True)
+    # Machines sharing the directory take turns
+    with FileLock(os.path.join(path, "sync.lock")):
+        return sync(CoreReplica(core), DirectoryReplica(path))
\ No newline at end of file
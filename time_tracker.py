@@ -1,6 +1,9 @@
+import os
 import tkinter as tk
-from tkinter import ttk
-from ui_components import MinimalButton, StyleManager, WeeklySummaryWindow, TimeGoalDialog
+from tkinter import messagebox, ttk
+import metrics
+from ui_components import HeatmapWindow, MinimalButton, MetricsPanel, StyleManager, TickScheduler, WeeklySummaryWindow, TimeGoalDialog
+from storage import BackgroundStorage, open_storage
 from time_tracker_core import TimeTrackerCore
 
 class ConfirmationDialog:
@@ -16,7 +19,7 @@ class ConfirmationDialog:
         x = (screen_width - window_width) // 2
         y = (screen_height - window_height) // 2
         self.dialog.geometry(f"{window_width}x{window_height}+{x}+{y}")
-        self.dialog.configure(bg='white')
+        self.dialog.configure(bg=StyleManager.color("background"))
         
         # Make dialog modal
         self.dialog.transient(parent)
@@ -25,11 +28,11 @@ class ConfirmationDialog:
         # Create message
         message = ttk.Label(self.dialog,
                           text="Are you sure you want to lock out?",
-                          style="Status.TLabel")
+                          style=StyleManager.style("Status.TLabel"))
         message.pack(pady=30)
         
         # Button frame
-        button_frame = ttk.Frame(self.dialog, style="Main.TFrame")
+        button_frame = ttk.Frame(self.dialog, style=StyleManager.style("Main.TFrame"))
         button_frame.pack(pady=20)
         
         # Yes button
@@ -62,19 +65,36 @@ class TimeTracker:
         screen_width = self.root.winfo_screenwidth()
         screen_height = self.root.winfo_screenheight()
         self.root.geometry(f"{screen_width}x{screen_height}")
-        self.root.configure(bg='white')
+        self.root.configure(bg=StyleManager.color("background"))
         
         # Initialize styles
         StyleManager.setup_styles()
         
-        # Initialize core functionality
-        self.core = TimeTrackerCore()
+        # A history split into monthly shards (see migrate.py) loads lazily
+        data_file = "time_records.shards" if os.path.isdir("time_records.shards") else "time_records.json"
+        
+        # Initialize core functionality, persisting from a writer thread
+        # so a slow disk never blocks a button press
+        self.core = TimeTrackerCore(data_file, storage=BackgroundStorage(open_storage(data_file)))
         
         # Dark mode flag
         self.dark_mode = False
         
+        # Last text set on each label, so unchanged labels are not reconfigured
+        self.label_texts = {}
+        
         self.setup_ui()
+        
+        # The display only changes while clocked in
+        self.ticker = TickScheduler(self.root, self.update_time_display)
         self.update_time_display()
+        self.ticker.set_active(self.core.current_state == "clocked_in")
+        
+        # Pick up changes made by other windows or the CLI when refocused
+        self.root.bind('<FocusIn>', self.on_focus, add='+')
+        
+        # Debug panel with latency histograms
+        self.root.bind('<Control-Shift-M>', lambda e: MetricsPanel(self.root))
         
         # Bind window closing event
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -82,17 +102,17 @@ class TimeTracker:
     def setup_ui(self):
         """Initialize the user interface"""
         # Main container
-        self.main_container = ttk.Frame(self.root, style="Main.TFrame")
+        self.main_container = ttk.Frame(self.root, style=StyleManager.style("Main.TFrame"))
         self.main_container.pack(fill=tk.BOTH, expand=True, padx=60, pady=60)
         
         # Top section
-        top_frame = ttk.Frame(self.main_container, style="Main.TFrame")
+        top_frame = ttk.Frame(self.main_container, style=StyleManager.style("Main.TFrame"))
         top_frame.pack(fill=tk.X, pady=(0, 40))
         
         # Title
         title_label = ttk.Label(top_frame,
                                text="Time Tracker",
-                               style="Title.TLabel")
+                               style=StyleManager.style("Title.TLabel"))
         title_label.pack()
         
         # Dark mode toggle button
@@ -102,21 +122,21 @@ class TimeTracker:
         self.dark_mode_button.pack(side=tk.RIGHT, padx=10)
         
         # Separator
-        ttk.Separator(self.main_container, orient='horizontal').pack(fill='x')
+        ttk.Separator(self.main_container, orient='horizontal', style=StyleManager.style("TSeparator")).pack(fill='x')
         
         # Center section for time display
-        center_frame = ttk.Frame(self.main_container, style="Main.TFrame")
+        center_frame = ttk.Frame(self.main_container, style=StyleManager.style("Main.TFrame"))
         center_frame.pack(expand=True, pady=40)
         
         self.time_label = ttk.Label(center_frame,
                                    text="0h 0m 0s",
-                                   style="Time.TLabel")
+                                   style=StyleManager.style("Time.TLabel"))
         self.time_label.pack()
         
         # Make time left label clickable
         self.time_left_label = ttk.Label(center_frame,
                                        text=f"{self.core.format_timedelta(self.core.total_time)} left",
-                                       style="Clickable.TLabel",
+                                       style=StyleManager.style("Clickable.TLabel"),
                                        cursor="hand2")
         self.time_left_label.pack()
         self.time_left_label.bind('<Button-1>', self.show_time_goal_dialog)
@@ -124,24 +144,32 @@ class TimeTracker:
         # Status display
         self.status_label = ttk.Label(center_frame,
                                      text=f"Status: {self.core.current_state.replace('_', ' ').title()}",
-                                     style="Status.TLabel")
+                                     style=StyleManager.style("Status.TLabel"))
         self.status_label.pack(pady=20)
         
         # Separator
-        ttk.Separator(self.main_container, orient='horizontal').pack(fill='x')
+        ttk.Separator(self.main_container, orient='horizontal', style=StyleManager.style("TSeparator")).pack(fill='x')
         
         # Bottom section for buttons
-        bottom_frame = ttk.Frame(self.main_container, style="ButtonFrame.TFrame")
+        bottom_frame = ttk.Frame(self.main_container, style=StyleManager.style("ButtonFrame.TFrame"))
         bottom_frame.pack(pady=40)
         
         # Create grid for buttons
         self.setup_buttons(bottom_frame)
         
-        # Weekly summary button at the bottom
-        self.summary_btn = MinimalButton(self.main_container,
+        # History buttons at the bottom
+        history_frame = ttk.Frame(self.main_container, style=StyleManager.style("Main.TFrame"))
+        history_frame.pack(pady=20)
+        
+        self.summary_btn = MinimalButton(history_frame,
                                        text="Weekly Summary",
                                        command=self.show_weekly_summary)
-        self.summary_btn.pack(pady=20)
+        self.summary_btn.pack(side=tk.LEFT, padx=10)
+        
+        self.heatmap_btn = MinimalButton(history_frame,
+                                       text="Heatmap",
+                                       command=self.show_heatmap)
+        self.heatmap_btn.pack(side=tk.LEFT, padx=10)
         
         self.update_button_states()
     
@@ -154,8 +182,9 @@ class TimeTracker:
             
             if dialog.result is not None:
                 if self.core.set_time_goal(dialog.result):
-                    self.time_left_label.config(
-                        text=f"{self.core.format_timedelta(self.core.total_time)} left"
+                    self.set_label_text(
+                        self.time_left_label,
+                        f"{self.core.format_timedelta(self.core.total_time)} left"
                     )
     
     def setup_buttons(self, button_frame):
@@ -182,18 +211,29 @@ class TimeTracker:
                                          command=self.break_out)
         self.break_out_btn.grid(row=1, column=1, padx=20, pady=20)
     
+    def set_label_text(self, label, text):
+        """Configure a label only when its text actually changes"""
+        if self.label_texts.get(label) != text:
+            label.config(text=text)
+            self.label_texts[label] = text
+    
     def update_time_display(self):
         """Update the time display and countdown"""
         worked_time, time_left = self.core.calculate_current_times()
         
-        self.time_label.config(text=self.core.format_timedelta(worked_time))
-        self.time_left_label.config(text=f"{self.core.format_timedelta(time_left)} left")
+        self.set_label_text(self.time_label, self.core.format_timedelta(worked_time))
+        self.set_label_text(self.time_left_label, f"{self.core.format_timedelta(time_left)} left")
         
         # Update status label
-        self.status_label.config(text=f"Status: {self.core.current_state.replace('_', ' ').title()}")
-        
-        # Schedule next update
-        self.root.after(1000, self.update_time_display)
+        self.set_label_text(self.status_label,
+                            f"Status: {self.core.current_state.replace('_', ' ').title()}")
+    
+    def on_state_changed(self, status_text):
+        """Refresh the window after a transition and start or stop ticking"""
+        self.update_time_display()
+        self.set_label_text(self.status_label, status_text)
+        self.update_button_states()
+        self.ticker.set_active(self.core.current_state == "clocked_in")
     
     def update_button_states(self):
         """Update button states based on current state"""
@@ -214,11 +254,20 @@ class TimeTracker:
         elif current_state == "break":
             self.break_out_btn["state"] = "normal"
     
+    def show_current_state(self):
+        """Refresh the window for a state set elsewhere"""
+        self.on_state_changed(f"Status: {self.core.current_state.replace('_', ' ').title()}")
+    
+    def on_focus(self, event):
+        if event.widget is self.root and self.core.refresh():
+            self.show_current_state()
+    
     def clock_in(self):
         """Handle clock in event"""
         if self.core.clock_in():
-            self.status_label.config(text="Status: Locked In")
-            self.update_button_states()
+            self.on_state_changed("Status: Locked In")
+        else:
+            self.show_current_state()  # Another process changed the state
     
     def clock_out(self):
         """Handle clock out event with confirmation"""
@@ -226,44 +275,60 @@ class TimeTracker:
         self.root.wait_window(dialog.dialog)
         
         if dialog.result:
+            clock_in_time = self.core.clock_in_time
             if self.core.clock_out():
-                self.status_label.config(text="Status: Locked Out")
-                self.time_label.config(text="0h 0m 0s")
-                self.time_left_label.config(
-                    text=f"{self.core.format_timedelta(self.core.total_time)} left"
-                )
-                self.update_button_states()
+                self.on_state_changed("Status: Locked Out")
+                if clock_in_time:
+                    # Only the cells of the days this session touched change
+                    first_day = self.core.local_time.local_date(int(clock_in_time.timestamp()))
+                    HeatmapWindow.days_changed(self.core, first_day, self.core.get_current_time().date())
+            else:
+                self.show_current_state()
     
     def break_in(self):
         """Handle break start event"""
         if self.core.break_in():
-            self.status_label.config(text="Status: On Break")
-            self.update_button_states()
+            self.on_state_changed("Status: On Break")
+        else:
+            self.show_current_state()
     
     def break_out(self):
         """Handle break end event"""
         if self.core.break_out():
-            self.status_label.config(text="Status: Locked In")
-            self.update_button_states()
+            self.on_state_changed("Status: Locked In")
+        else:
+            self.show_current_state()
     
     def show_weekly_summary(self):
         """Show weekly summary window"""
-        WeeklySummaryWindow(self.root, self.core.get_records(), self.core.get_current_time)
+        WeeklySummaryWindow(self.root, self.core)
+    
+    def show_heatmap(self):
+        """Show the calendar heatmap of worked hours"""
+        HeatmapWindow(self.root, self.core)
     
     def toggle_dark_mode(self):
         """Toggle between light and dark mode"""
         self.dark_mode = not self.dark_mode
-        StyleManager.toggle_dark_mode(self.dark_mode)
+        # Remaps the open windows to the other theme's styles, including
+        # the root background
+        StyleManager.toggle_dark_mode(self.root, self.dark_mode)
         
         # Update button text
         self.dark_mode_button.config(text="Light Mode" if self.dark_mode else "Dark Mode")
-        
-        # Update background of the root window
-        self.root.configure(bg='#2d2d2d' if self.dark_mode else 'white')
     
     def on_closing(self):
         """Handle window closing event"""
-        self.core.save_data()
+        try:
+            self.core.close()  # Drains the background writer
+        except Exception as e:
+            # Still close, but tell the user their last changes may not be saved
+            messagebox.showerror("Time Tracker", f"Saving the time records failed: {e}")
+        
+        # Leave a metrics dump behind when asked to
+        metrics_file = os.environ.get("TIMETRACKER_METRICS_FILE")
+        if metrics_file and metrics.registry.enabled:
+            metrics.registry.dump(metrics_file)
         self.root.destroy()
     
     def run(self):
@@ -1,90 +1,269 @@
-import json
-import os
-from datetime import datetime, timedelta
-import pytz
+import uuid
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from functools import wraps
+from clock import SystemClock
+from metrics import timed
+from records import (RECORD_SCHEMA, DailyTotalsIndex, RecordColumns, SessionHashTree,
+                     SessionIndex, clip_session, normalize_tags, preferred, session_from_record,
+                     tombstone, upgrade_record, work_intervals)
+from storage import open_storage
+from timezones import LocalTime, default_timezone_name
+
+def locked(method):
+    """Run a core method under the storage lock, after picking up writes
+    made by other processes, so concurrent writers never lose updates"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.storage.lock():
+            self.refresh()
+            return method(self, *args, **kwargs)
+    return wrapper
 
 class TimeTrackerCore:
-    def __init__(self):
-        self.data_file = "time_records.json"
+    # Transition -> states it may be taken from, mirroring the GUI buttons
+    TRANSITIONS = {
+        "clock_in": ("clocked_out",),
+        "clock_out": ("clocked_in",),
+        "break_in": ("clocked_in",),
+        "break_out": ("break",),
+    }
+
+    # Shorter ranges are totalled from their records until the totals index is needed
+    DIRECT_TOTALS_DAYS = 62
+
+    def __init__(self, data_file="time_records.json", storage=None, clock=None):
+        self.data_file = data_file
+        self.storage = storage or open_storage(data_file)
+        self.clock = clock or SystemClock()
+        self.timezone_setting = None  # Zone chosen with set_timezone(), stored with the state
+        self._local_time = None  # Resolved on first use, then cached
         
         # Initialize state variables with default values
         self.current_state = "clocked_out"
         self.clock_in_time = None
         self.break_start_time = None
         self.total_break_time = timedelta()
+        self.current_breaks = []  # [start, end] epoch seconds of this session's breaks
+        self.current_tags = []  # Tags given to this session's transitions so far
         self.today_worked_time = timedelta()
         self.total_time = timedelta(hours=16)  # Default total time
         self.time_left = self.total_time
         self.time_records = {}
+        self.sessions = {}
+        self.tags = None  # Inverted index from tag to sessions, kept by the backend
+        self.tombstones = {}  # Session id -> tombstone of a removed session
+        self._session_index = None  # Built on first use, then kept current
+        self._hash_tree = None  # Built on the first sync, then kept current
+        self._columns = None  # Columnar view, rebuilt when records change
+        self._totals_index = None  # Range sums over daily totals, built on first use
+        self._batch = None  # Events held back by batch()
         self.session_date = None  # Track the date of the current session
         
         # Load data and state
         self.load_data()
 
+    @timed("operation_seconds", op="load")
     def load_data(self):
-        """Load time records and current state from JSON file"""
-        if os.path.exists(self.data_file):
-            with open(self.data_file, 'r') as f:
-                data = json.load(f)
-                self.time_records = data.get('records', {})
-                
-                # Load state
-                state_data = data.get('current_state', {})
-                if state_data:
-                    self.current_state = state_data.get('state', 'clocked_out')
-                    
-                    # Convert stored times back to datetime objects
-                    clock_in_str = state_data.get('clock_in_time')
-                    self.clock_in_time = datetime.fromisoformat(clock_in_str) if clock_in_str else None
-                    
-                    break_start_str = state_data.get('break_start_time')
-                    self.break_start_time = datetime.fromisoformat(break_start_str) if break_start_str else None
-                    
-                    # Convert stored timedeltas back to timedelta objects
-                    total_break_seconds = state_data.get('total_break_time', 0)
-                    self.total_break_time = timedelta(seconds=total_break_seconds)
-                    
-                    total_time_seconds = state_data.get('total_time', 57600)  # Default to 16 hours in seconds
-                    self.total_time = timedelta(seconds=total_time_seconds)
-                    
-                    time_left_seconds = state_data.get('time_left', total_time_seconds)
-                    self.time_left = timedelta(seconds=time_left_seconds)
-                    
-                    # Load session date
-                    session_date = state_data.get('session_date')
-                    self.session_date = session_date if session_date else None
+        """Load time records and current state from the storage backend"""
+        self.time_records, state_data = self.storage.load()
+        self.sessions = self.storage.load_sessions()
+        self.tags = self.storage.load_tags()
+        self.tombstones = self.storage.load_tombstones()
+        self._session_index = None
+        self._hash_tree = None
+
+        # Load state
+        if state_data:
+            self._apply_state(state_data)
+
+        # One-time migration of records stored as formatted strings or
+        # saved before sessions were kept
+        if state_data.get('schema', 1) < RECORD_SCHEMA and len(self.time_records):
+            self._upgrade_records()
+
+        self._totals_index = None
+
+    def refresh(self):
+        """Reload state if another process changed the data file, return True if it did"""
+        changes = self.storage.refresh()
+        if changes is None:
+            return False
+        
+        state_data, changed_records, changed_sessions = changes
+        if state_data:
+            self._apply_state(state_data)
+        self._columns = None
+        if changed_sessions is None:
+            self._session_index = None
+            self._hash_tree = None
         else:
-            self.time_records = {}
+            for index in (self._session_index, self._hash_tree):
+                if index is not None:
+                    for session_id, session in changed_sessions.items():
+                        if session is None:
+                            index.remove(session_id)
+                    index.add(s for s in changed_sessions.values() if s)
+            if self._hash_tree is not None:
+                # Removed sessions leave tombstones, which sync compares too
+                self._hash_tree.add(self.tombstones[session_id] for session_id, session in changed_sessions.items()
+                                    if session is None and session_id in self.tombstones)
+        if changed_records is None:
+            self._totals_index = None
+        elif self._totals_index is not None:
+            for date_str, record in changed_records.items():
+                self._totals_index.set_day(date.fromisoformat(date_str),
+                                           record["total_time"], record["breaks"])
+        return True
 
-    def save_data(self):
-        """Save time records and current state to JSON file"""
-        # Prepare state data
-        state_data = {
+    def _upgrade_records(self):
+        """Rewrite legacy string records as integer seconds, with one session per day.
+
+        The records are then summed from the sessions, as set_timezone()
+        does, so a legacy day running past midnight books the hours after
+        it to the next day instead of counting them on both.
+        """
+        sessions = {}
+        for date_str, record in self.time_records.items():
+            session = session_from_record(date_str, upgrade_record(date_str, record, self.timezone))
+            sessions[session["id"]] = session
+
+        index = SessionIndex.from_sessions(sessions)
+        days = set()
+        for start, end in index.spans.values():
+            days.update(self._days_spanned(start, end))
+        records = {}
+        for day in sorted(days):
+            record = index.day_record(*self._day_bounds(day))
+            if record:
+                records[day.isoformat()] = record
+        self.storage.replace_all(records, self._state_data(), sessions)
+        self._columns = None
+
+    def _apply_state(self, state_data):
+        """Restore state variables from their stored form"""
+        self.current_state = state_data.get('state', 'clocked_out')
+        
+        # Stored times are UTC epoch seconds, older states kept local ISO strings
+        self.clock_in_time = self._stored_time(state_data, 'clock_in', 'clock_in_time')
+        self.break_start_time = self._stored_time(state_data, 'break_start', 'break_start_time')
+        
+        if state_data.get('timezone') != self.timezone_setting:
+            self.timezone_setting = state_data.get('timezone')
+            self._local_time = None
+        
+        # Convert stored timedeltas back to timedelta objects
+        total_break_seconds = state_data.get('total_break_time', 0)
+        self.total_break_time = timedelta(seconds=total_break_seconds)
+        self.current_breaks = [list(b) for b in state_data.get('breaks', [])]
+        self.current_tags = list(state_data.get('tags', []))
+        if total_break_seconds and not self.current_breaks and self.clock_in_time:
+            # Saved before breaks were kept as intervals, place them at the start
+            start = int(self.clock_in_time.timestamp())
+            self.current_breaks = [[start, start + int(total_break_seconds)]]
+        
+        total_time_seconds = state_data.get('total_time', 57600)  # Default to 16 hours in seconds
+        self.total_time = timedelta(seconds=total_time_seconds)
+        
+        time_left_seconds = state_data.get('time_left', total_time_seconds)
+        self.time_left = timedelta(seconds=time_left_seconds)
+        
+        # Load session date
+        session_date = state_data.get('session_date')
+        self.session_date = session_date if session_date else None
+
+    def _stored_time(self, state_data, key, legacy_key):
+        """Read a stored timestamp as an aware UTC datetime"""
+        epoch = state_data.get(key)
+        if epoch is None and state_data.get(legacy_key):
+            epoch = int(datetime.fromisoformat(state_data[legacy_key]).timestamp())
+        return datetime.fromtimestamp(epoch, timezone.utc) if epoch is not None else None
+
+    def _state_data(self):
+        """Current state in its stored form"""
+        return {
             'state': self.current_state,
-            'clock_in_time': self.clock_in_time.isoformat() if self.clock_in_time else None,
-            'break_start_time': self.break_start_time.isoformat() if self.break_start_time else None,
+            'clock_in': int(self.clock_in_time.timestamp()) if self.clock_in_time else None,
+            'break_start': int(self.break_start_time.timestamp()) if self.break_start_time else None,
             'total_break_time': self.total_break_time.total_seconds(),
+            'breaks': list(self.current_breaks),
+            'tags': list(self.current_tags),
             'total_time': self.total_time.total_seconds(),
             'time_left': self.time_left.total_seconds(),
-            'session_date': self.session_date
-        }
-        
-        # Combine records and state
-        data = {
-            'records': self.time_records,
-            'current_state': state_data
+            'session_date': self.session_date,
+            'timezone': self.timezone_setting,
+            'schema': RECORD_SCHEMA
         }
+
+    @timed("operation_seconds", op="save")
+    @locked
+    def save_data(self):
+        """Save current state and consolidate the storage backend"""
+        self.storage.checkpoint(self._state_data())
+
+    def close(self):
+        """Save state and release the storage backend"""
+        self.save_data()
+        self.storage.close()
+
+    def record_event(self, name, records=None, sessions=None, removed_sessions=None, tombstones=None):
+        """Persist a state transition and the records and sessions it produced.
+
+        Removed sessions leave a tombstone, so a sync removes them from
+        other replicas too. tombstones adds ones for sessions never held here.
+        """
+        event = {'event': name, 'state': self._state_data()}
+        tombstones = {t["id"]: t for t in tombstones or ()}
+        if removed_sessions:
+            event['removed_sessions'] = removed_sessions
+            for session_id in removed_sessions:
+                tombstones.setdefault(session_id, tombstone(self.sessions[session_id]))
+        if tombstones:
+            event['tombstones'] = tombstones
+        if sessions:
+            event['sessions'] = {session["id"]: session for session in sessions}
+        if self._hash_tree is not None:
+            for session_id in list(removed_sessions or ()) + list(tombstones):
+                self._hash_tree.remove(session_id)
+            self._hash_tree.add(sessions or ())
+            self._hash_tree.add(tombstones.values())
+        if records:
+            event['records'] = records
+            self._columns = None
+            if self._totals_index is not None:
+                for date_str, record in records.items():
+                    self._totals_index.set_day(date.fromisoformat(date_str),
+                                               record["total_time"], record["breaks"])
         
-        # Save to file
-        with open(self.data_file, 'w') as f:
-            json.dump(data, f, indent=4)
+        if self._batch is not None:
+            self.storage.apply(event)
+            self._batch.append(event)
+        else:
+            self.storage.append(event)
+
+    @contextmanager
+    def batch(self):
+        """Group the events recorded inside the block into a single write"""
+        if self._batch is not None:
+            yield  # Already batching, the outer block writes
+            return
+        with self.storage.lock():
+            self.refresh()
+            self._batch = []
+            try:
+                yield
+            finally:
+                events, self._batch = self._batch, None
+                self.storage.write(events)
 
+    @timed("operation_seconds", op="set_time_goal")
+    @locked
     def set_time_goal(self, hours):
         """Set new time goal in hours"""
         if self.current_state == "clocked_out":
             self.total_time = timedelta(hours=hours)
             self.time_left = self.total_time
-            self.save_data()
+            self.record_event('set_time_goal')
             return True
         return False
 
@@ -100,59 +279,145 @@ class TimeTrackerCore:
         seconds = total_seconds % 60
         return f"{hours}h {minutes}m {seconds}s"
 
+    def format_seconds(self, seconds):
+        """Format a stored duration in seconds for display"""
+        return self.format_timedelta(timedelta(seconds=seconds))
+
+    def format_clock_time(self, epoch_seconds):
+        """Format a stored epoch timestamp as local wall-clock time"""
+        return self.local_time.format_time(epoch_seconds)
+
+    @property
+    def local_time(self):
+        """Conversions to the configured timezone, resolved once"""
+        if self._local_time is None:
+            self._local_time = LocalTime(self.timezone_setting or default_timezone_name())
+        return self._local_time
+
+    @property
+    def timezone(self):
+        """Timezone of clock times"""
+        return self.local_time.tz
+
+    @timed("operation_seconds", op="set_timezone")
+    @locked
+    def set_timezone(self, name):
+        """Cut days at midnight in another timezone, re-summing every day from the sessions"""
+        if self.current_state != "clocked_out":
+            return False
+        local_time = LocalTime(name)  # ValueError for an unknown zone
+        self.timezone_setting = name
+        self._local_time = local_time
+
+        index = self.session_index
+        days = set()
+        for start, end in index.spans.values():
+            days.update(local_time.days_spanned(start, end))
+        records = {}
+        for day in sorted(days):
+            record = index.day_record(*self._day_bounds(day))
+            if record:
+                records[day.isoformat()] = record
+        self.storage.replace_all(records, self._state_data(), self.sessions)
+        self._totals_index = None
+        self._columns = None
+        return True
+
     def get_current_time(self):
-        """Get current time in EET timezone"""
-        return datetime.now(pytz.timezone('EET'))
+        """Get current time in the configured timezone"""
+        return datetime.fromtimestamp(self.clock.now(), self.timezone)
+
+    def can(self, transition):
+        """Check whether a transition is allowed from the current state"""
+        return self.current_state in self.TRANSITIONS[transition]
 
-    def clock_in(self):
-        """Handle clock in event"""
+    @timed("operation_seconds", op="clock_in")
+    @locked
+    def clock_in(self, tags=None, at=None):
+        """Handle clock in event, tags (e.g. project or client) label the session.
+        `at` is an aware datetime for a transition that already happened, default now."""
+        if not self.can("clock_in"):
+            return False
+        if at is None:
+            self.clock.resync()  # Durations within the session follow the monotonic clock
         self.current_state = "clocked_in"
-        self.clock_in_time = self.get_current_time()
+        self.clock_in_time = (at or self.get_current_time()).replace(microsecond=0)
         self.total_break_time = timedelta()
+        self.current_breaks = []
+        self.current_tags = normalize_tags(tags)
         self.time_left = self.total_time
         # Set the session date to the clock-in date
         self.session_date = self.clock_in_time.strftime("%Y-%m-%d")
-        self.save_data()
+        self.record_event('clock_in')
         return True
 
-    def clock_out(self):
+    @timed("operation_seconds", op="clock_out")
+    @locked
+    def clock_out(self, at=None):
         """Handle clock out event"""
-        if self.clock_in_time and self.session_date:
-            current_time = self.get_current_time()
-            worked_time = current_time - self.clock_in_time - self.total_break_time
-            
-            # Save to records using the session date
-            self.time_records[self.session_date] = {
-                "total_time": self.format_timedelta(worked_time),
-                "breaks": self.format_timedelta(self.total_break_time),
-                "clock_in": self.clock_in_time.strftime("%H:%M"),
-                "clock_out": current_time.strftime("%H:%M")
+        if not self.can("clock_out"):
+            return False
+        new_records = {}
+        sessions = []
+        if self.clock_in_time:
+            current_time = at or self.get_current_time()
+            session = {
+                "id": uuid.uuid4().hex,
+                "start": int(self.clock_in_time.timestamp()),
+                "end": int(current_time.timestamp()),
+                "breaks": self.current_breaks
             }
+            if self.current_tags:
+                session["tags"] = self.current_tags
+            sessions.append(session)
+            
+            # Re-sum every day the session touched, earlier sessions included
+            days = self._days_spanned(session["start"], session["end"])
+            index = self._index_around(self._day_bounds(days[0])[0], self._day_bounds(days[-1])[1])
+            index.add(sessions)
+            for day in days:
+                record = index.day_record(*self._day_bounds(day))
+                if record:
+                    new_records[day.isoformat()] = record
         
         # Reset state
         self.current_state = "clocked_out"
         self.clock_in_time = None
         self.total_break_time = timedelta()
+        self.current_breaks = []
+        self.current_tags = []
         self.session_date = None  # Clear the session date
-        self.save_data()
+        self.record_event('clock_out', new_records, sessions)
         return True
 
-    def break_in(self):
-        """Handle break start event"""
+    @timed("operation_seconds", op="break_in")
+    @locked
+    def break_in(self, tags=None, at=None):
+        """Handle break start event, tags are added to the session's"""
+        if not self.can("break_in"):
+            return False
         self.current_state = "break"
-        self.break_start_time = self.get_current_time()
-        self.save_data()
+        self.break_start_time = (at or self.get_current_time()).replace(microsecond=0)
+        self.current_tags = normalize_tags(self.current_tags + normalize_tags(tags))
+        self.record_event('break_in')
         return True
 
-    def break_out(self):
-        """Handle break end event"""
+    @timed("operation_seconds", op="break_out")
+    @locked
+    def break_out(self, tags=None, at=None):
+        """Handle break end event, tags are added to the session's"""
+        if not self.can("break_out"):
+            return False
+        self.current_tags = normalize_tags(self.current_tags + normalize_tags(tags))
         if self.break_start_time:
-            current_time = self.get_current_time()
+            current_time = at or self.get_current_time()
             self.total_break_time += current_time - self.break_start_time
+            self.current_breaks.append([int(self.break_start_time.timestamp()),
+                                        int(current_time.timestamp())])
         
         self.current_state = "clocked_in"
         self.break_start_time = None
-        self.save_data()
+        self.record_event('break_out')
         return True
 
     def calculate_current_times(self):
@@ -173,4 +438,226 @@ class TimeTrackerCore:
 
     def get_records(self):
         """Get time records"""
-        return self.time_records
\ No newline at end of file
+        return self.time_records
+
+    def get_records_between(self, start_date, end_date):
+        """Get time records for dates from start_date to end_date inclusive"""
+        return self.storage.get_records_between(start_date, end_date)
+
+    @locked
+    def edit_record(self, date_str, worked_seconds, break_seconds, clock_in, clock_out):
+        """Replace the record of a past day"""
+        if date_str == self.session_date:
+            return False  # The running session owns this day
+        records = {date_str: {
+            "total_time": int(worked_seconds),
+            "breaks": int(break_seconds),
+            "clock_in": int(clock_in),
+            "clock_out": int(clock_out)
+        }}
+        self.record_event('edit_record', *self._replace_day_sessions(records))
+        return True
+
+    @locked
+    def import_records(self, records):
+        """Add or replace records of past days in one event"""
+        if records:
+            self.record_event('import', *self._replace_day_sessions(records))
+
+    def _replace_day_sessions(self, records):
+        """Swap the sessions on each day for one session matching its record.
+
+        Sessions running over midnight into or out of the day are split,
+        the parts outside it are kept as new sessions so the neighbouring
+        days keep their time. Returns (records, new sessions, ids of
+        removed sessions).
+        """
+        index = self.session_index
+        removed = []
+        pieces = {}  # Parts of split sessions, by their new id
+        for date_str in sorted(records):
+            day_start, day_end = self._day_bounds(date.fromisoformat(date_str))
+            for session_id in index.sessions_touching(day_start, day_end):
+                session = pieces.pop(session_id, None)
+                if session is None:
+                    session = self.sessions[session_id]
+                    removed.append(session_id)
+                index.remove(session_id)
+                parts = []
+                if session["start"] < day_start:
+                    parts.append(clip_session(session, session["start"], day_start, uuid.uuid4().hex))
+                if session["end"] > day_end:
+                    parts.append(clip_session(session, day_end, session["end"], uuid.uuid4().hex))
+                index.add(parts)
+                pieces.update((part["id"], part) for part in parts)
+        sessions = list(pieces.values())
+        # Fresh ids, a removed id must not come back once other replicas hold its tombstone
+        sessions.extend(session_from_record(date_str, record, uuid.uuid4().hex)
+                        for date_str, record in records.items())
+        index.add(sessions[len(pieces):])
+        return dict(records), sessions, removed
+
+    def _resum_day(self, day):
+        """Record of a day summed from the session index, zeroed if no session is left on it"""
+        day_start, day_end = self._day_bounds(day)
+        return self.session_index.day_record(day_start, day_end) or {
+            "total_time": 0, "breaks": 0, "clock_in": day_start, "clock_out": day_start}
+
+    @locked
+    def merge_sessions(self, sessions):
+        """Add sessions from another replica, replacing those with the same id.
+
+        Tombstones among them remove the session here, and sessions removed
+        here are not added back. Of two different sessions overlapping in
+        time, the preferred one is kept and the other one removed, the
+        same way on every replica. Every day the old and new versions
+        touch is re-summed.
+        """
+        if not sessions:
+            return
+        index = self.session_index
+        days = set()
+        removed = []
+        tombstones = []
+        for session in sessions:
+            if session.get("removed"):
+                tombstones.append(session)
+                if session["id"] in index.spans:
+                    days.update(self._days_spanned(*index.spans[session["id"]]))
+                    index.remove(session["id"])
+                    removed.append(session["id"])
+
+        added = {}  # Id -> session taken from the other replica
+        for session in sessions:
+            session_id = session["id"]
+            if session.get("removed") or session_id in self.tombstones or session_id in removed:
+                continue
+            rivals = [added.get(other) or self.sessions[other]
+                      for other in index.sessions_touching(session["start"], max(session["end"], session["start"] + 1))
+                      if other != session_id]
+            if any(preferred(session, rival) is rival for rival in rivals):
+                tombstones.append(tombstone(session))
+                continue
+            for rival in rivals:
+                days.update(self._days_spanned(rival["start"], rival["end"]))
+                index.remove(rival["id"])
+                added.pop(rival["id"], None)
+                if rival["id"] in self.sessions:
+                    removed.append(rival["id"])
+                else:
+                    tombstones.append(tombstone(rival))
+            if session_id in index.spans:
+                days.update(self._days_spanned(*index.spans[session_id]))
+            days.update(self._days_spanned(session["start"], session["end"]))
+            index.add([session])
+            added[session_id] = session
+        records = {day.isoformat(): self._resum_day(day) for day in sorted(days)}
+        self.record_event('sync', records, list(added.values()), removed, tombstones)
+
+    @property
+    def hash_tree(self):
+        """Per day, month and year hashes of the sessions, built on first use"""
+        if self._hash_tree is None:
+            self._hash_tree = SessionHashTree.from_sessions(self.sessions)
+            self._hash_tree.add(self.tombstones.values())
+        return self._hash_tree
+
+    @property
+    def session_index(self):
+        """Interval index over all sessions, built on first use"""
+        if self._session_index is None:
+            self._session_index = SessionIndex.from_sessions(self.sessions)
+        return self._session_index
+
+    def _index_around(self, start, end):
+        """Session index good for [start, end). Backends that can fetch just
+        the sessions there save building the index over the whole history."""
+        if self._session_index is None:
+            nearby = self.storage.sessions_overlapping(start, end)
+            if nearby is not None:
+                return SessionIndex.from_sessions({s["id"]: s for s in nearby})
+        return self.session_index
+
+    @property
+    def totals_index(self):
+        """Range sums over the daily totals, built on first use"""
+        if self._totals_index is None:
+            self._totals_index = DailyTotalsIndex.from_records(self.time_records)
+        return self._totals_index
+
+    def _day_bounds(self, day):
+        """Epoch seconds of local midnight starting and ending a day"""
+        return self.local_time.midnight(day), self.local_time.midnight(day + timedelta(days=1))
+
+    def _days_spanned(self, start, end):
+        """Local dates touched by [start, end), one per calendar day"""
+        return self.local_time.days_spanned(start, end)
+
+    def _epoch(self, moment):
+        return int(moment.timestamp()) if isinstance(moment, datetime) else int(moment)
+
+    def get_worked_between(self, start, end):
+        """Get seconds worked in closed sessions between two datetimes or epoch seconds"""
+        return self.session_index.worked_between(self._epoch(start), self._epoch(end))
+
+    def get_sessions_between(self, start, end):
+        """Get the sessions overlapping a time range, in time order"""
+        ids = self.session_index.sessions_between(self._epoch(start), self._epoch(end))
+        return [self.sessions[session_id] for session_id in ids]
+
+    def overlaps_session(self, start, end):
+        """Check whether a time range overlaps work of any recorded session"""
+        return self.session_index.worked_between(self._epoch(start), self._epoch(end)) > 0
+
+    def get_tags(self):
+        """Get every tag given to a recorded session"""
+        return self.tags.names()
+
+    def get_tag_sessions(self, tag, start_date=None, end_date=None):
+        """Get the sessions with a tag, overlapping start_date to end_date inclusive when given"""
+        start = self._day_bounds(start_date)[0] if start_date else float('-inf')
+        end = self._day_bounds(end_date)[1] if end_date else float('inf')
+        matches = [(entry[0], session_id) for session_id, entry in self.tags.sessions(tag).items()
+                   if entry[0] < end and entry[1] > start]
+        return [self.sessions[session_id] for _, session_id in sorted(matches)]
+
+    def get_tag_totals(self, tag, start_date, end_date):
+        """Get (worked, break) seconds of the sessions with a tag, from start_date to end_date inclusive"""
+        start, end = self._day_bounds(start_date)[0], self._day_bounds(end_date)[1]
+        worked = breaks = 0
+        for session_id, entry in self.tags.sessions(tag).items():
+            session_start, session_end, session_worked, session_breaks = entry
+            if start <= session_start and session_end <= end:
+                worked += session_worked
+                breaks += session_breaks
+            elif session_start < end and session_end > start:
+                # Cut by an end of the range, only these sessions are read
+                session = self.sessions[session_id]
+                worked += sum(max(0, min(e, end) - max(s, start)) for s, e in work_intervals(session))
+                breaks += sum(max(0, min(e, end) - max(s, start)) for s, e in session.get("breaks", []))
+        return worked, breaks
+
+    def get_totals_between(self, start_date, end_date):
+        """Get (worked, break) seconds from start_date to end_date inclusive"""
+        if self._totals_index is None and (end_date - start_date).days < self.DIRECT_TOTALS_DAYS:
+            # A few weeks are summed directly, sparing the index over everything
+            records = self.get_records_between(start_date, end_date).values()
+            return sum(r["total_time"] for r in records), sum(r["breaks"] for r in records)
+        return self.totals_index.totals_between(start_date, end_date)
+
+    def get_history_bounds(self):
+        """Get (first, last) dates of the history, spanning at least today"""
+        today = self.get_current_time().date()
+        bounds = self._totals_index is None and self.storage.date_bounds()
+        if bounds:
+            first, last = (date.fromisoformat(date_str) for date_str in bounds)
+        else:
+            first = self.totals_index.first_date()
+            last = self.totals_index.last_date()
+        return (min(first, today) if first else today), (max(last, today) if last else today)
+
+    def get_columns(self):
+        """Get the columnar view of the records (dates, worked and break seconds)"""
+        if self._columns is None:
+            self._columns = RecordColumns.from_records(self.time_records)
+        return self._columns
\ No newline at end of file
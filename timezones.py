@@ -0,0 +1,89 @@
+"""Local time on top of UTC epoch seconds.
+
+Everything is stored as UTC epoch seconds. Local time is only needed to
+display clock times and to cut the history into days at local midnight.
+LocalTime resolves the configured zone once and caches its UTC offset
+per UTC day, so converting millions of timestamps costs one dict lookup
+each and an offset lookup per day touched, not a tz database call each.
+"""
+import os
+from bisect import bisect_right
+from datetime import date, datetime
+
+DEFAULT_TIMEZONE = "EET"
+DAY = 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+def default_timezone_name():
+    """Zone to use when none was configured, overridable with TIMETRACKER_TIMEZONE"""
+    return os.environ.get("TIMETRACKER_TIMEZONE") or DEFAULT_TIMEZONE
+
+class LocalTime:
+    """A timezone with per-day UTC offsets precomputed on first use"""
+
+    def __init__(self, name):
+        import pytz  # Deferred so headless commands start fast
+        try:
+            self.tz = pytz.timezone(name)
+        except pytz.UnknownTimeZoneError:
+            raise ValueError(f"unknown timezone: {name}")
+        self.name = name
+        self.day_offsets = {}  # UTC day number -> offset, None when it changes that day
+
+        # pytz keeps a zone's offset changes in a table, bisecting it is far
+        # cheaper than a conversion; other zones are asked directly
+        self.transitions = None
+        if getattr(self.tz, '_utc_transition_times', None):
+            epoch = datetime(1970, 1, 1)
+            self.transitions = [int((t - epoch).total_seconds()) for t in self.tz._utc_transition_times]
+            self.transition_offsets = [int(info[0].total_seconds()) for info in self.tz._transition_info]
+
+    def _offset_at(self, epoch):
+        if self.transitions is not None:
+            return self.transition_offsets[max(bisect_right(self.transitions, epoch) - 1, 0)]
+        return int(datetime.fromtimestamp(epoch, self.tz).utcoffset().total_seconds())
+
+    def offset(self, epoch):
+        """UTC offset in seconds at an epoch"""
+        day = epoch // DAY
+        try:
+            offset = self.day_offsets[day]
+        except KeyError:
+            start = self._offset_at(day * DAY)
+            offset = start if start == self._offset_at(day * DAY + DAY - 1) else None
+            self.day_offsets[day] = offset
+        if offset is None:
+            return self._offset_at(epoch)  # A DST change falls on this day
+        return offset
+
+    def wall_seconds(self, epoch):
+        """Local wall-clock time as seconds since 1970-01-01 00:00 local"""
+        return epoch + self.offset(epoch)
+
+    def local_date(self, epoch):
+        """Local calendar date of an epoch"""
+        return date.fromordinal(EPOCH_ORDINAL + self.wall_seconds(epoch) // DAY)
+
+    def to_datetime(self, epoch):
+        """Aware local datetime of an epoch"""
+        return datetime.fromtimestamp(epoch, self.tz)
+
+    def format_time(self, epoch):
+        """Local wall-clock time of an epoch as HH:MM:SS"""
+        seconds = self.wall_seconds(epoch) % DAY
+        return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+    def midnight(self, day):
+        """Epoch seconds of the local midnight starting a day"""
+        wall = (day.toordinal() - EPOCH_ORDINAL) * DAY
+        epoch = wall - self.offset(wall)
+        if self.wall_seconds(epoch) != wall:
+            # Offset differs across the guess, let the tz database resolve it
+            epoch = int(self.tz.localize(datetime(day.year, day.month, day.day)).timestamp())
+        return epoch
+
+    def days_spanned(self, start, end):
+        """Local dates touched by [start, end), one per calendar day"""
+        first = self.local_date(start).toordinal()
+        last = self.local_date(max(start, end - 1)).toordinal()
+        return [date.fromordinal(day) for day in range(first, last + 1)]
\ No newline at end of file
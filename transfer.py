@@ -0,0 +1,118 @@
+"""Streaming export and import of time records as CSV or JSON Lines.
+
+Rows carry the stored values unchanged: the date, clock in and clock out
+as epoch seconds, and worked and break time in seconds. Export walks the
+history one window of days at a time, and import reads and validates
+rows lazily, so neither keeps a second copy of the history in memory.
+"""
+import csv
+import json
+from datetime import date, timedelta
+from records import parse_duration
+
+FIELDS = ("date", "clock_in", "clock_out", "total_time", "breaks")
+
+def iter_records(core, start_date=None, end_date=None, window_days=31):
+    """Yield (date_str, record) in date order, fetching one window at a time"""
+    first, last = core.get_history_bounds()
+    start = max(start_date or first, first)
+    end = min(end_date or last, last)
+    while start <= end:
+        window_end = min(start + timedelta(days=window_days - 1), end)
+        window = core.get_records_between(start, window_end)
+        for date_str in sorted(window):
+            yield date_str, window[date_str]
+        start = window_end + timedelta(days=1)
+
+def export_csv(core, out_file, start_date=None, end_date=None):
+    """Write records as CSV, returning the number of rows"""
+    writer = csv.writer(out_file)
+    writer.writerow(FIELDS)
+    count = 0
+    for date_str, record in iter_records(core, start_date, end_date):
+        writer.writerow((date_str, record["clock_in"], record["clock_out"],
+                         record["total_time"], record["breaks"]))
+        count += 1
+    return count
+
+def export_jsonl(core, out_file, start_date=None, end_date=None):
+    """Write records as one JSON object per line, returning the number of rows"""
+    count = 0
+    for date_str, record in iter_records(core, start_date, end_date):
+        out_file.write(json.dumps({"date": date_str, **record}) + "\n")
+        count += 1
+    return count
+
+def _seconds(value, field):
+    """Accept integer seconds or a legacy "7h 32m 10s" string"""
+    if isinstance(value, str):
+        value = value.strip()
+        if value and not value.lstrip('-').isdigit():
+            return parse_duration(value)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} is not a number of seconds: {value!r}")
+
+def validate_row(row):
+    """Turn a raw row into (date_str, record) or raise ValueError"""
+    if not isinstance(row, dict):
+        raise ValueError(f"not a record: {str(row).strip()[:60]!r}")
+    try:
+        date_str = date.fromisoformat(str(row["date"]).strip()).isoformat()
+    except (KeyError, ValueError):
+        raise ValueError(f"bad or missing date: {row.get('date')!r}")
+
+    try:
+        record = {field: _seconds(row[field], field) for field in FIELDS[1:]}
+    except KeyError as e:
+        raise ValueError(f"missing field {e.args[0]}")
+
+    if record["total_time"] < 0 or record["breaks"] < 0:
+        raise ValueError("durations must not be negative")
+    if record["clock_out"] < record["clock_in"]:
+        raise ValueError("clock_out is before clock_in")
+    if record["total_time"] + record["breaks"] > record["clock_out"] - record["clock_in"] + 60:
+        raise ValueError("worked plus break time is longer than the session")
+    return date_str, record
+
+def read_csv(in_file):
+    """Yield raw rows from a CSV file with a header line"""
+    return csv.DictReader(in_file)
+
+def read_jsonl(in_file):
+    """Yield raw rows from a JSON Lines file, skipping blank lines"""
+    for line in in_file:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield line  # Reported by validate_row
+
+def import_rows(core, rows, batch_size=1000):
+    """Validate rows and add them to the core, persisting once at the end.
+
+    Valid rows are handed to the core in batches of batch_size. Invalid
+    rows are skipped and returned as (row number, error) pairs.
+    Returns (imported count, errors).
+    """
+    errors = []
+    count = 0
+    batch = {}
+    with core.batch():
+        for number, row in enumerate(rows, start=1):
+            try:
+                date_str, record = validate_row(row)
+            except ValueError as e:
+                errors.append((number, str(e)))
+                continue
+
+            batch[date_str] = record
+            if len(batch) >= batch_size:
+                core.import_records(batch)
+                count += len(batch)
+                batch = {}
+
+        core.import_records(batch)
+        count += len(batch)
+    return count, errors
\ No newline at end of file
@@ -1,145 +1,238 @@
+import time
 import tkinter as tk
-from tkinter import ttk
-from datetime import timedelta
+from tkinter import filedialog, ttk
+import metrics
+from collections import OrderedDict
+from datetime import date as date_type, datetime, timedelta
 
 class MinimalButton(ttk.Button):
     def __init__(self, master, **kwargs):
-        style = ttk.Style()
-        style.configure("Minimal.TButton",
-                       padding=(30, 20),
-                       font=('Helvetica', 12),
-                       background='white',
-                       foreground='black')
-        
-        style.map("Minimal.TButton",
-                 background=[('active', '#f8f8f8')],
-                 foreground=[('active', 'black')])
-        
-        super().__init__(master, style="Minimal.TButton", **kwargs)
-        self.bind('<Enter>', lambda e: self.configure(cursor='hand2'))
+        # Styles are registered by StyleManager, only pick the theme's name
+        kwargs.setdefault('cursor', 'hand2')
+        super().__init__(master, style=StyleManager.style("Minimal.TButton"), **kwargs)
+
+class TickScheduler:
+    """Calls a function on wall-clock second boundaries while it is needed.
+
+    Each tick is scheduled from the current time instead of a fixed
+    1000 ms delay, so ticks neither drift nor jitter. Ticking stops while
+    the owner has it inactive or while the window is iconified or hidden.
+    """
+
+    def __init__(self, root, callback):
+        self.root = root
+        self.callback = callback
+        self.after_id = None
+        self.active = False
+        self.visible = True
+        
+        self.root.bind('<Map>', self._on_map, add='+')
+        self.root.bind('<Unmap>', self._on_unmap, add='+')
+
+    def set_active(self, active):
+        """Start or stop ticking, e.g. on a state change"""
+        self.active = active
+        self._reschedule()
+
+    def _on_map(self, event):
+        # Child widgets inherit the root's bindings, only react to the root
+        if event.widget is self.root:
+            self.visible = True
+            self._reschedule()
+
+    def _on_unmap(self, event):
+        if event.widget is self.root:
+            self.visible = False
+            self._reschedule()
+
+    def _reschedule(self):
+        running = self.active and self.visible
+        if running and self.after_id is None:
+            self.callback()  # Catch up right away after being stopped
+            self._schedule()
+        elif not running and self.after_id is not None:
+            self.root.after_cancel(self.after_id)
+            self.after_id = None
+
+    def _schedule(self):
+        # Land just after the next whole second
+        now_ms = int(time.time() * 1000)
+        delay = 1000 - now_ms % 1000 + 1
+        self.target = (now_ms + delay) / 1000
+        self.after_id = self.root.after(delay, self._tick)
+
+    def _tick(self):
+        self.after_id = None
+        if metrics.registry.enabled:
+            metrics.observe("tick_lateness_seconds", max(0.0, time.time() - self.target))
+        self.callback()
+        if self.active and self.visible:
+            self._schedule()
 
 class StyleManager:
+    """Theme engine: every style is configured once per theme, up front.
+
+    Each theme registers its own copy of every style, e.g. "Light.Title.TLabel"
+    and "Dark.Title.TLabel". Widgets are created with style(), which only picks
+    the current theme's name, and switching themes swaps that prefix on the
+    existing widgets instead of reconfiguring the styles.
+    """
+
+    THEMES = {
+        "Light": {
+            "background": "white",
+            "foreground": "black",
+            "muted": "#333333",
+            "link": "#0066cc",
+            "separator": "#e0e0e0",
+            "selected": "#f0f0f0",
+            "selected_foreground": "black",
+            "heatmap": ("#ebedf0", "#9be9a8", "#40c463", "#30a14e", "#216e39"),
+        },
+        "Dark": {
+            "background": "#2d2d2d",
+            "foreground": "white",
+            "muted": "#cccccc",
+            "link": "#4dabf7",
+            "separator": "#444444",
+            "selected": "#444444",
+            "selected_foreground": "white",
+            "heatmap": ("#3a3a3a", "#0e4429", "#006d32", "#26a641", "#39d353"),
+        },
+    }
+
+    theme = "Light"
+    registered_for = None  # Tcl interpreter the styles were registered in
+
+    @staticmethod
+    def style(name):
+        """Style name of the current theme, e.g. "Dark.Status.TLabel" """
+        return f"{StyleManager.theme}.{name}"
+
+    @staticmethod
+    def color(key):
+        """A colour of the current theme, for plain tk widgets"""
+        return StyleManager.THEMES[StyleManager.theme][key]
+
     @staticmethod
     def setup_styles():
+        """Register the styles of every theme, once per Tk interpreter"""
         style = ttk.Style()
-        
-        # Light mode styles (default)
+        if StyleManager.registered_for is style.tk:
+            return
+        StyleManager.registered_for = style.tk
+
+        for theme, colors in StyleManager.THEMES.items():
+            background = colors["background"]
+            foreground = colors["foreground"]
+
+            style.configure(f"{theme}.Title.TLabel",
+                           font=('Helvetica', 36, 'bold'),
+                           background=background,
+                           foreground=foreground,
+                           padding=20)
+
+            style.configure(f"{theme}.Status.TLabel",
+                           font=('Helvetica', 14),
+                           background=background,
+                           foreground=foreground,
+                           padding=10)
+
+            style.configure(f"{theme}.Time.TLabel",
+                           font=('Helvetica', 72, 'bold'),
+                           background=background,
+                           foreground=foreground,
+                           padding=20)
+
+            style.configure(f"{theme}.Remaining.TLabel",
+                           font=('Helvetica', 24),
+                           background=background,
+                           foreground=colors["muted"],
+                           padding=10)
+
+            style.configure(f"{theme}.Clickable.TLabel",
+                           font=('Helvetica', 24),
+                           background=background,
+                           foreground=colors["link"],
+                           padding=10)
+
+            style.configure(f"{theme}.Main.TFrame",
+                           background=background)
+
+            style.configure(f"{theme}.ButtonFrame.TFrame",
+                           background=background,
+                           padding=20)
+
+            style.configure(f"{theme}.TSeparator",
+                           background=colors["separator"])
+
+            style.configure(f"{theme}.Minimal.Treeview",
+                           background=background,
+                           foreground=foreground,
+                           rowheight=50,
+                           fieldbackground=background,
+                           font=('Helvetica', 12))
+
+            style.configure(f"{theme}.Minimal.Treeview.Heading",
+                           background=background,
+                           foreground=foreground,
+                           font=('Helvetica', 14, 'bold'),
+                           padding=15)
+
+            style.map(f"{theme}.Minimal.Treeview",
+                     background=[('selected', colors["selected"])],
+                     foreground=[('selected', colors["selected_foreground"])])
+
+            # Buttons stay light in both themes
+            style.configure(f"{theme}.Minimal.TButton",
+                           padding=(30, 20),
+                           font=('Helvetica', 12),
+                           background='white',
+                           foreground='black')
+
+            style.map(f"{theme}.Minimal.TButton",
+                     background=[('active', '#f8f8f8')],
+                     foreground=[('active', 'black')])
+
+        StyleManager._configure_root_style(style)
+
+    @staticmethod
+    def _configure_root_style(style):
+        # Defaults for widgets created without a style, e.g. entries
         style.configure(".",
                        font=('Helvetica', 12),
-                       background='white',
-                       foreground='black')
-        
-        style.configure("Title.TLabel",
-                       font=('Helvetica', 36, 'bold'),
-                       background='white',
-                       foreground='black',
-                       padding=20)
-        
-        style.configure("Status.TLabel",
-                       font=('Helvetica', 14),
-                       background='white',
-                       foreground='black',
-                       padding=10)
-        
-        style.configure("Time.TLabel",
-                       font=('Helvetica', 72, 'bold'),
-                       background='white',
-                       foreground='black',
-                       padding=20)
-        
-        style.configure("Remaining.TLabel",
-                       font=('Helvetica', 24),
-                       background='white',
-                       foreground='#333333',
-                       padding=10)
-        
-        style.configure("Clickable.TLabel",
-                       font=('Helvetica', 24),
-                       background='white',
-                       foreground='#0066cc',
-                       padding=10)
-        
-        style.configure("Main.TFrame",
-                       background='white')
-        
-        style.configure("ButtonFrame.TFrame",
-                       background='white',
-                       padding=20)
-        
-        style.configure("TSeparator",
-                       background='#e0e0e0')
-        
-        style.configure("Minimal.Treeview",
-                       background="white",
-                       foreground="black",
-                       rowheight=50,
-                       fieldbackground="white",
-                       font=('Helvetica', 12))
-        
-        style.configure("Minimal.Treeview.Heading",
-                       background="white",
-                       foreground="black",
-                       font=('Helvetica', 14, 'bold'),
-                       padding=15)
-        
-        style.map("Minimal.Treeview",
-                 background=[('selected', '#f0f0f0')],
-                 foreground=[('selected', 'black')])
-    
+                       background=StyleManager.color("background"),
+                       foreground=StyleManager.color("foreground"))
+
     @staticmethod
-    def toggle_dark_mode(enable_dark_mode):
-        style = ttk.Style()
-        
-        if enable_dark_mode:
-            # Dark mode styles
-            style.configure(".",
-                           background='#2d2d2d',
-                           foreground='white')
-            
-            style.configure("Title.TLabel",
-                           background='#2d2d2d',
-                           foreground='white')
-            
-            style.configure("Status.TLabel",
-                           background='#2d2d2d',
-                           foreground='white')
-            
-            style.configure("Time.TLabel",
-                           background='#2d2d2d',
-                           foreground='white')
-            
-            style.configure("Remaining.TLabel",
-                           background='#2d2d2d',
-                           foreground='#cccccc')
-            
-            style.configure("Clickable.TLabel",
-                           background='#2d2d2d',
-                           foreground='#4dabf7')
-            
-            style.configure("Main.TFrame",
-                           background='#2d2d2d')
-            
-            style.configure("ButtonFrame.TFrame",
-                           background='#2d2d2d')
-            
-            style.configure("TSeparator",
-                           background='#444444')
-            
-            style.configure("Minimal.Treeview",
-                           background="#2d2d2d",
-                           foreground="white",
-                           fieldbackground="#2d2d2d")
-            
-            style.configure("Minimal.Treeview.Heading",
-                           background="#2d2d2d",
-                           foreground="white")
-            
-            style.map("Minimal.Treeview",
-                     background=[('selected', '#444444')],
-                     foreground=[('selected', 'white')])
-        else:
-            # Revert to light mode
-            StyleManager.setup_styles()
+    def set_theme(root, theme):
+        """Switch every open window to a registered theme"""
+        old_prefix = StyleManager.theme + "."
+        if theme == StyleManager.theme:
+            return
+        StyleManager.theme = theme
+        StyleManager._configure_root_style(ttk.Style())
+        background = StyleManager.color("background")
+
+        # Remap the style names of existing widgets, no style is reconfigured
+        widgets = [root]
+        while widgets:
+            widget = widgets.pop()
+            widgets.extend(widget.winfo_children())
+            if isinstance(widget, ttk.Widget):
+                name = widget.cget("style")
+                if name.startswith(old_prefix):
+                    widget.configure(style=f"{theme}.{name[len(old_prefix):]}")
+            elif isinstance(widget, (tk.Tk, tk.Toplevel)):
+                widget.configure(bg=background)
+            elif isinstance(widget, tk.Canvas):
+                # Canvases draw in theme colours themselves
+                widget.configure(bg=background)
+                widget.event_generate("<<ThemeChanged>>")
+
+    @staticmethod
+    def toggle_dark_mode(root, enable_dark_mode):
+        StyleManager.set_theme(root, "Dark" if enable_dark_mode else "Light")
 
 class TimeGoalDialog:
     def __init__(self, parent, current_hours):
@@ -154,7 +247,7 @@ class TimeGoalDialog:
         x = (screen_width - window_width) // 2
         y = (screen_height - window_height) // 2
         self.dialog.geometry(f"{window_width}x{window_height}+{x}+{y}")
-        self.dialog.configure(bg='white')
+        self.dialog.configure(bg=StyleManager.color("background"))
         
         # Make dialog modal
         self.dialog.transient(parent)
@@ -166,7 +259,7 @@ class TimeGoalDialog:
         # Create message
         message = ttk.Label(self.dialog,
                           text="Set daily time goal (hours):",
-                          style="Status.TLabel")
+                          style=StyleManager.style("Status.TLabel"))
         message.pack(pady=20)
         
         # Entry for hours
@@ -178,7 +271,7 @@ class TimeGoalDialog:
         self.entry.pack(pady=10)
         
         # Button frame
-        button_frame = ttk.Frame(self.dialog, style="Main.TFrame")
+        button_frame = ttk.Frame(self.dialog, style=StyleManager.style("Main.TFrame"))
         button_frame.pack(pady=20)
         
         # Save button
@@ -207,8 +300,76 @@ class TimeGoalDialog:
     def _on_cancel(self):
         self.dialog.destroy()
 
+class MetricsPanel:
+    """Debug window showing the instrumentation dump in Prometheus format"""
+
+    def __init__(self, parent):
+        self.window = tk.Toplevel(parent)
+        self.window.title("Metrics")
+        self.window.geometry("900x600")
+        self.window.configure(bg=StyleManager.color("background"))
+        
+        main_frame = ttk.Frame(self.window, style=StyleManager.style("Main.TFrame"))
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        
+        button_frame = ttk.Frame(main_frame, style=StyleManager.style("Main.TFrame"))
+        button_frame.pack(side="bottom", pady=10)
+        
+        self.toggle_button = MinimalButton(button_frame,
+                                         text="",
+                                         command=self.toggle)
+        self.toggle_button.pack(side=tk.LEFT, padx=10)
+        MinimalButton(button_frame,
+                      text="Refresh",
+                      command=self.refresh).pack(side=tk.LEFT, padx=10)
+        MinimalButton(button_frame,
+                      text="Save",
+                      command=self.save).pack(side=tk.LEFT, padx=10)
+        MinimalButton(button_frame,
+                      text="Close",
+                      command=self.window.destroy).pack(side=tk.LEFT, padx=10)
+        
+        self.text = tk.Text(main_frame, font=('Courier', 10), wrap="none")
+        self.text.pack(fill=tk.BOTH, expand=True)
+        
+        self.refresh()
+    
+    def refresh(self):
+        enabled = metrics.registry.enabled
+        self.toggle_button.config(text="Disable" if enabled else "Enable")
+        dump = metrics.registry.render()
+        if not enabled and not metrics.registry.histograms:
+            dump = "Metrics are disabled. Enable them here or start with TIMETRACKER_METRICS=1.\n"
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", dump)
+    
+    def toggle(self):
+        if metrics.registry.enabled:
+            metrics.disable()
+        else:
+            metrics.enable()
+        self.refresh()
+    
+    def save(self):
+        path = filedialog.asksaveasfilename(parent=self.window,
+                                            defaultextension=".prom",
+                                            initialfile="metrics.prom")
+        if path:
+            metrics.registry.dump(path)
+
 class WeeklySummaryWindow:
-    def __init__(self, parent, time_records, get_current_time):
+    """History browser that opens on the current week.
+
+    Only the rows visible in the Treeview exist as items. Scrolling
+    rewrites their values from pages of records fetched lazily from the
+    core, so opening and scrolling cost the same for any history size.
+    """
+
+    ROW_HEIGHT = 50
+    PAGE_DAYS = 56
+    MAX_CACHED_PAGES = 16
+
+    def __init__(self, parent, core):
         self.window = tk.Toplevel(parent)
         self.window.title("Weekly Summary")
         
@@ -216,32 +377,77 @@ class WeeklySummaryWindow:
         screen_width = self.window.winfo_screenwidth()
         screen_height = self.window.winfo_screenheight()
         self.window.geometry(f"{screen_width}x{screen_height}")
-        self.window.configure(bg='white')
+        self.window.configure(bg=StyleManager.color("background"))
+        
+        self.core = core
         
-        self.time_records = time_records
-        self.get_current_time = get_current_time
+        # One row per day from the first record up to today
+        self.first_date, self.last_date = self.core.get_history_bounds()
+        self.total_rows = (self.last_date - self.first_date).days + 1
+        self.top_row = 0
+        self.row_ids = []
+        self.pages = OrderedDict()  # Page number -> records, least recently used first
         
         self.setup_ui()
+        
+        current_date = self.core.get_current_time().date()
+        self.jump_to(current_date - timedelta(days=current_date.weekday()))
     
     def setup_ui(self):
         # Main container with padding
-        main_frame = ttk.Frame(self.window, style="Main.TFrame")
+        main_frame = ttk.Frame(self.window, style=StyleManager.style("Main.TFrame"))
         main_frame.pack(fill=tk.BOTH, expand=True, padx=50, pady=50)
         
         # Title
         title = ttk.Label(main_frame,
                          text="Weekly Summary",
-                         style="Title.TLabel")
+                         style=StyleManager.style("Title.TLabel"))
         title.pack(pady=(0, 30))
         
+        # Jump controls: a date, a month (YYYY-MM) or an ISO week (YYYY-Www)
+        jump_frame = ttk.Frame(main_frame, style=StyleManager.style("Main.TFrame"))
+        jump_frame.pack(pady=(0, 10))
+        
+        self.jump_var = tk.StringVar()
+        jump_entry = ttk.Entry(jump_frame,
+                             textvariable=self.jump_var,
+                             justify='center',
+                             font=('Helvetica', 14))
+        jump_entry.pack(side=tk.LEFT, padx=10)
+        jump_entry.bind('<Return>', lambda e: self.on_jump())
+        
+        MinimalButton(jump_frame,
+                      text="Go",
+                      command=self.on_jump).pack(side=tk.LEFT, padx=10)
+        MinimalButton(jump_frame,
+                      text="Previous Week",
+                      command=lambda: self.scroll_to(self.top_row - 7)).pack(side=tk.LEFT, padx=10)
+        MinimalButton(jump_frame,
+                      text="Next Week",
+                      command=lambda: self.scroll_to(self.top_row + 7)).pack(side=tk.LEFT, padx=10)
+        
         # Separator
-        ttk.Separator(main_frame, orient='horizontal').pack(fill='x', pady=20)
+        ttk.Separator(main_frame, orient='horizontal', style=StyleManager.style("TSeparator")).pack(fill='x', pady=20)
+        
+        # Totals for the rows currently shown
+        self.totals_label = ttk.Label(main_frame,
+                                     text="",
+                                     style=StyleManager.style("Status.TLabel"))
+        self.totals_label.pack()
+        
+        # Add close button at the bottom
+        close_button = MinimalButton(main_frame,
+                                   text="Close Summary",
+                                   command=self.window.destroy)
+        close_button.pack(side="bottom", pady=30)
         
         # Create Treeview with custom style
         self.tree = ttk.Treeview(main_frame,
                                 columns=("Date", "Total Time", "Breaks", "Clock In", "Clock Out"),
                                 show="headings",
-                                style="Minimal.Treeview")
+                                height=7,
+                                selectmode="none",
+                                style=StyleManager.style("Minimal.Treeview"))
         
         # Configure columns
         column_widths = {
@@ -256,48 +462,353 @@ class WeeklySummaryWindow:
             self.tree.heading(col, text=col)
             self.tree.column(col, width=width, anchor="center")
         
-        self.populate_data()
-        
-        # Add scrollbar
-        scrollbar = ttk.Scrollbar(main_frame,
-                                orient="vertical",
-                                command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        # The scrollbar spans the whole history, not the materialized rows
+        self.scrollbar = ttk.Scrollbar(main_frame,
+                                     orient="vertical",
+                                     command=self.on_scrollbar)
         
         # Pack everything
         self.tree.pack(side="left", fill=tk.BOTH, expand=True)
-        scrollbar.pack(side="right", fill="y")
+        self.scrollbar.pack(side="right", fill="y")
         
-        # Add close button at the bottom
-        close_button = MinimalButton(main_frame,
-                                   text="Close Summary",
-                                   command=self.window.destroy)
-        close_button.pack(pady=30)
-
+        self._set_visible_rows(7)
+        self.tree.bind('<Configure>', self.on_resize)
+        self.tree.bind('<MouseWheel>', self.on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self.scroll_to(self.top_row - 3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll_to(self.top_row + 3))
+    
+    def _set_visible_rows(self, count):
+        """Keep exactly count row items in the Treeview"""
+        while len(self.row_ids) < count:
+            self.row_ids.append(self.tree.insert("", "end", values=()))
+        while len(self.row_ids) > count:
+            self.tree.delete(self.row_ids.pop())
+    
+    def _get_page(self, page):
+        """Records of one page of days, fetched from the core on first use"""
+        if page in self.pages:
+            self.pages.move_to_end(page)
+            return self.pages[page]
+        
+        start = self.first_date + timedelta(days=page * self.PAGE_DAYS)
+        records = self.core.get_records_between(start, start + timedelta(days=self.PAGE_DAYS - 1))
+        self.pages[page] = records
+        if len(self.pages) > self.MAX_CACHED_PAGES:
+            self.pages.popitem(last=False)
+        return records
+    
+    def _row_values(self, row):
+        day = self.first_date + timedelta(days=row)
+        date_str = day.strftime("%Y-%m-%d")
+        record = self._get_page(row // self.PAGE_DAYS).get(date_str)
+        
+        if record is None:
+            return (date_str, "0h 0m 0s", "0h 0m 0s", "-", "-")
+        
+        # Records hold raw seconds, format only for display
+        return (
+            date_str,
+            self.core.format_seconds(record["total_time"]),
+            self.core.format_seconds(record["breaks"]),
+            self.core.format_clock_time(record["clock_in"]),
+            self.core.format_clock_time(record["clock_out"])
+        )
+    
     def populate_data(self):
-        from datetime import timedelta
-        
-        current_date = self.get_current_time().date()
-        start_of_week = current_date - timedelta(days=current_date.weekday())
-        
-        for i in range(7):
-            date = start_of_week + timedelta(days=i)
-            date_str = date.strftime("%Y-%m-%d")
-            
-            if date_str in self.time_records:
-                record = self.time_records[date_str]
-                self.tree.insert("", "end", values=(
-                    date_str,
-                    record["total_time"],
-                    record["breaks"],
-                    record["clock_in"],
-                    record["clock_out"]
-                ))
+        """Fill the materialized rows from top_row downwards"""
+        for i, row_id in enumerate(self.row_ids):
+            row = self.top_row + i
+            values = self._row_values(row) if row < self.total_rows else ("", "", "", "", "")
+            self.tree.item(row_id, values=values)
+        
+        shown = min(len(self.row_ids), self.total_rows - self.top_row)
+        self.scrollbar.set(self.top_row / self.total_rows,
+                           (self.top_row + shown) / self.total_rows)
+        
+        # Totals of the shown days come from the core's range index
+        start = self.first_date + timedelta(days=self.top_row)
+        end = start + timedelta(days=shown - 1)
+        worked, breaks = self.core.get_totals_between(start, end)
+        self.totals_label.config(
+            text=f"{start:%Y-%m-%d} to {end:%Y-%m-%d}: "
+                 f"{self.core.format_seconds(worked)} worked, "
+                 f"{self.core.format_seconds(breaks)} breaks"
+        )
+    
+    def scroll_to(self, row):
+        """Show the history starting at the given row"""
+        self.top_row = max(0, min(row, self.total_rows - len(self.row_ids)))
+        self.populate_data()
+    
+    def jump_to(self, day):
+        self.scroll_to((day - self.first_date).days)
+    
+    def on_jump(self):
+        """Jump to a date, a month (YYYY-MM) or an ISO week (YYYY-Www)"""
+        text = self.jump_var.get().strip()
+        try:
+            if "-W" in text:
+                year, week = text.split("-W")
+                target = date_type.fromisocalendar(int(year), int(week), 1)
+            elif len(text) == 7:
+                target = datetime.strptime(text, "%Y-%m").date()
             else:
-                self.tree.insert("", "end", values=(
-                    date_str,
-                    "0h 0m 0s",
-                    "0h 0m 0s",
-                    "-",
-                    "-"
-                ))
\ No newline at end of file
+                target = datetime.strptime(text, "%Y-%m-%d").date()
+        except ValueError:
+            return
+        self.jump_to(target)
+    
+    def on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * self.total_rows))
+        elif args[0] == "scroll":
+            step = len(self.row_ids) if args[2] == "pages" else 1
+            self.scroll_to(self.top_row + int(args[1]) * step)
+    
+    def on_mousewheel(self, event):
+        self.scroll_to(self.top_row - (3 if event.delta > 0 else -3))
+    
+    def on_resize(self, event):
+        """Materialize only as many rows as fit in the Treeview"""
+        rows = max(1, event.height // self.ROW_HEIGHT - 1)  # Minus the heading
+        if rows != len(self.row_ids):
+            self.tree.configure(height=rows)
+            self._set_visible_rows(rows)
+            self.scroll_to(self.top_row)
+
+def heat_level(worked_seconds):
+    """Heatmap shade of a day: none, then one step per two hours worked up to 6h+"""
+    if worked_seconds <= 0:
+        return 0
+    return min(4, 1 + worked_seconds // 7200)
+
+class HeatmapTile:
+    """One year of day cells painted into a PhotoImage, weeks as columns.
+
+    The tile is drawn once from a one-pixel-per-day image zoomed to cell
+    size, after that single cells are repainted as their days change.
+    """
+
+    CELL = 12
+    GAP = 2
+
+    def __init__(self, year, levels, colors, background):
+        self.year = year
+        self.colors = colors
+        jan1 = date_type(year, 1, 1)
+        self.start = jan1.toordinal()
+        self.end = date_type(year, 12, 31).toordinal()
+        self.first = self.start - jan1.weekday()  # Monday of the first column
+        self.weeks = (self.end - self.first) // 7 + 1
+        self.levels = levels  # Day ordinal -> level painted, empty days left out
+
+        rows = []
+        for weekday in range(7):
+            row = []
+            for week in range(self.weeks):
+                day = self.first + week * 7 + weekday
+                in_year = self.start <= day <= self.end
+                row.append(colors[levels.get(day, 0)] if in_year else background)
+            rows.append("{" + " ".join(row) + "}")
+        days = tk.PhotoImage(width=self.weeks, height=7)
+        days.put(" ".join(rows))
+        self.image = days.zoom(self.CELL, self.CELL)
+
+        # Cut the blocks into cells
+        height = 7 * self.CELL
+        for week in range(self.weeks):
+            x = (week + 1) * self.CELL
+            self.image.put(background, to=(x - self.GAP, 0, x, height))
+        for weekday in range(7):
+            y = (weekday + 1) * self.CELL
+            self.image.put(background, to=(0, y - self.GAP, self.weeks * self.CELL, y))
+
+    def day_at(self, x, y):
+        """Day ordinal of the cell under a point of the image, or None"""
+        week, weekday = int(x) // self.CELL, int(y) // self.CELL
+        day = self.first + week * 7 + weekday
+        if 0 <= week < self.weeks and 0 <= weekday < 7 and self.start <= day <= self.end:
+            return day
+        return None
+
+    def set_level(self, day, level):
+        """Repaint one day's cell if its level changed"""
+        if self.levels.get(day, 0) == level:
+            return False
+        if level:
+            self.levels[day] = level
+        else:
+            self.levels.pop(day, None)
+        offset = day - self.first
+        x, y = offset // 7 * self.CELL, offset % 7 * self.CELL
+        self.image.put(self.colors[level], to=(x, y, x + self.CELL - self.GAP, y + self.CELL - self.GAP))
+        return True
+
+    def update(self, levels):
+        """Repaint the cells that differ from the given levels, returning how many"""
+        changed = [day for day in self.levels.keys() | levels.keys()
+                   if self.levels.get(day, 0) != levels.get(day, 0)]
+        for day in changed:
+            self.set_level(day, levels.get(day, 0))
+        return len(changed)
+
+class HeatmapWindow:
+    """Calendar heatmap of worked hours, a row of day cells per year.
+
+    Everything is drawn on one Canvas, each year being a single image
+    item, and years are only drawn once scrolled into view. Year tiles
+    are cached per theme across windows and brought up to date by
+    repainting only the cells whose level changed, so opening ten years
+    costs a pass over their daily totals and a few canvas items.
+    """
+
+    LEFT = 70  # Margin for the year labels
+    RIGHT = 100  # Margin for the year totals
+    TOP = 20
+    BAND = 7 * HeatmapTile.CELL + 28
+
+    tiles = {}  # (theme, year) -> HeatmapTile
+    tiles_for = None  # Tcl interpreter the tile images belong to
+    open_windows = []
+
+    def __init__(self, parent, core):
+        self.window = tk.Toplevel(parent)
+        self.window.title("Heatmap")
+        self.window.configure(bg=StyleManager.color("background"))
+        self.core = core
+
+        if HeatmapWindow.tiles_for is not self.window.tk:
+            HeatmapWindow.tiles = {}
+            HeatmapWindow.tiles_for = self.window.tk
+
+        first, last = self.core.get_history_bounds()
+        self.years = list(range(last.year, first.year - 1, -1))  # Newest first
+        self.total_items = {}  # Year -> canvas text item of its total, for the years drawn
+
+        self.setup_ui()
+        self.draw()
+        HeatmapWindow.open_windows.append(self)
+
+    def setup_ui(self):
+        width = self.LEFT + 54 * HeatmapTile.CELL + self.RIGHT
+        height = self.TOP + len(self.years) * self.BAND
+        visible = min(height, self.window.winfo_screenheight() - 200)
+        main_frame = ttk.Frame(self.window, style=StyleManager.style("Main.TFrame"))
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+
+        self.status_label = ttk.Label(main_frame, text="", style=StyleManager.style("Status.TLabel"))
+        self.status_label.pack(side="bottom")
+
+        self.canvas = tk.Canvas(main_frame, width=width, height=visible, highlightthickness=0,
+                                bg=StyleManager.color("background"),
+                                scrollregion=(0, 0, width, height))
+        self.scrollbar = ttk.Scrollbar(main_frame, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self.on_scroll)
+        self.canvas.pack(side="left", fill=tk.BOTH, expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.canvas.bind('<<ThemeChanged>>', lambda e: self.draw())
+        self.canvas.bind('<Motion>', self.on_motion)
+        self.canvas.bind('<MouseWheel>', lambda e: self.canvas.yview_scroll(-1 if e.delta > 0 else 1, "units"))
+        self.canvas.bind('<Button-4>', lambda e: self.canvas.yview_scroll(-1, "units"))
+        self.canvas.bind('<Button-5>', lambda e: self.canvas.yview_scroll(1, "units"))
+        self.window.bind('<Destroy>', self.on_destroy)
+
+    def _year_levels(self, year):
+        """Levels of a year's worked days and its total worked seconds.
+        Only that year's records are read, as the weekly summary pages."""
+        records = self.core.get_records_between(date_type(year, 1, 1), date_type(year, 12, 31))
+        levels = {}
+        total = 0
+        for date_str, record in records.items():
+            total += record["total_time"]
+            level = heat_level(record["total_time"])
+            if level:
+                levels[date_type.fromisoformat(date_str).toordinal()] = level
+        return levels, total
+
+    def _tile(self, year, levels):
+        key = (StyleManager.theme, year)
+        tile = HeatmapWindow.tiles.get(key)
+        if tile is None:
+            tile = HeatmapWindow.tiles[key] = HeatmapTile(
+                year, levels, StyleManager.color("heatmap"), StyleManager.color("background"))
+        else:
+            tile.update(levels)
+        return tile
+
+    def _band_top(self, index):
+        return self.TOP + index * self.BAND
+
+    def draw(self):
+        """Start over, e.g. in another theme, reusing the cached tiles"""
+        self.canvas.delete("all")
+        self.canvas.configure(bg=StyleManager.color("background"))
+        self.total_items = {}
+        self.draw_visible()
+
+    def draw_visible(self):
+        """Draw the years scrolled into view that are not drawn yet"""
+        height = max(self.canvas.winfo_height(), int(self.canvas.cget("height")))
+        top = self.canvas.canvasy(0)
+        first = max(0, int(top - self.TOP) // self.BAND)
+        last = min(len(self.years) - 1, int(top + height - self.TOP) // self.BAND)
+        foreground = StyleManager.color("foreground")
+        for index in range(first, last + 1):
+            year = self.years[index]
+            if year in self.total_items:
+                continue
+            band_top = self._band_top(index)
+            levels, worked = self._year_levels(year)
+            tile = self._tile(year, levels)
+            middle = band_top + 7 * HeatmapTile.CELL // 2
+            self.canvas.create_text(10, middle, text=str(year), anchor="w",
+                                    fill=foreground, font=('Helvetica', 14, 'bold'))
+            self.canvas.create_image(self.LEFT, band_top, image=tile.image, anchor="nw")
+            self.total_items[year] = self.canvas.create_text(
+                self.LEFT + tile.weeks * HeatmapTile.CELL + 10, middle, anchor="w",
+                text=f"{worked // 3600}h", fill=foreground, font=('Helvetica', 12))
+
+    def update_days(self, start_date, end_date):
+        """Repaint the cells of days that changed, e.g. after a clock out"""
+        records = self.core.get_records_between(start_date, end_date)
+        day = start_date
+        while day <= end_date:
+            tile = HeatmapWindow.tiles.get((StyleManager.theme, day.year))
+            if tile is not None:
+                record = records.get(day.isoformat())
+                tile.set_level(day.toordinal(), heat_level(record["total_time"]) if record else 0)
+            day += timedelta(days=1)
+        for year in range(start_date.year, end_date.year + 1):
+            if year in self.total_items:
+                worked, _ = self.core.get_totals_between(date_type(year, 1, 1), date_type(year, 12, 31))
+                self.canvas.itemconfigure(self.total_items[year], text=f"{worked // 3600}h")
+
+    def on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.draw_visible()
+
+    @classmethod
+    def days_changed(cls, core, start_date, end_date):
+        """Update the open heatmaps of a core, closed ones catch up when opened"""
+        for window in cls.open_windows:
+            if window.core is core:
+                window.update_days(start_date, end_date)
+
+    def on_motion(self, event):
+        x, y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+        index = int(y - self.TOP) // self.BAND
+        text = ""
+        if y >= self.TOP and index < len(self.years):
+            tile = HeatmapWindow.tiles.get((StyleManager.theme, self.years[index]))
+            day = tile and tile.day_at(x - self.LEFT, y - self._band_top(index))
+            if day:
+                day = date_type.fromordinal(day)
+                record = self.core.get_records_between(day, day).get(day.isoformat())
+                worked = record["total_time"] if record else 0
+                text = f"{day:%a %Y-%m-%d}: {self.core.format_seconds(worked)} worked"
+        self.status_label.config(text=text)
+
+    def on_destroy(self, event):
+        if event.widget is self.window and self in HeatmapWindow.open_windows:
+            HeatmapWindow.open_windows.remove(self)
\ No newline at end of file